@@ -1,32 +1,261 @@
+import json
 import time
 import random
 
+from ChessBitboards import iterBits
+from ChessEngine import PIECES, PIECE_VALUES, SQUARES_MASK, EMPTY_CODE, PROMOTION_FLAG
+from ChessTransposition import TranspositionTable, EXACT, LOWER, UPPER, FLIPPED_BOUND
+
+# move ordering keys: table and PV moves, captures by MVV-LVA, promotions, killers, then history
+PV_ORDER = 1 << 30
+HASH_ORDER = 1 << 29
+CAPTURE_ORDER = 1 << 24
+PROMOTION_ORDER = 1 << 23
+KILLER_ORDER = (1 << 22, 1 << 21)
+# victim and attacker values by Move piece code, the king attacks last among equal victims
+ORDER_VALUES = [PIECE_VALUES[piece[1]] or 1000 for piece in PIECES] + [0]
+MAX_PLY = 64
+# a side mated at ply p from the root scores -(MATE_SCORE + MAX_PLY - p), so nearer mates score higher
+MATE_SCORE = 10000
+# score of a tablebase win, below every mate the search finds itself
+TB_WIN = 9000
+
+# worth of one square of mobility per piece: minor pieces gain most from activity, pawn pushes
+# and king steps are left out
+MOBILITY_WEIGHTS = {'P': 0, 'N': 4, 'B': 5, 'R': 3, 'Q': 2, 'K': 0}
+
+# quiescence skips captures that cannot lift the static score to within this much of alpha
+DELTA_MARGIN = 200
+
+# methods timed per search when a searcher is built with profile=True
+PROFILED_SEARCHER = ('evaluatePosition', 'orderMoves')
+PROFILED_GAMESTATE = ('getValidMoves', 'makeMove', 'undoMove')
+
 def getRandomMove(gs):
     """Return a random move from the valid moves in the GameState gs."""
     validMoves = gs.getValidMoves()
     return random.choice(validMoves) if validMoves else None
 
+def mateScore(ply):
+    """Score of the side to move when it is mated ply plies from the root."""
+    return -(MATE_SCORE + MAX_PLY - ply)
+
+def scoreToTable(score, ply):
+    # mate scores go into the table as distance from the node, so they hold wherever it transposes to
+    if score >= MATE_SCORE:
+        return score + ply
+    if score <= -MATE_SCORE:
+        return score - ply
+    return score
+
+def scoreFromTable(score, ply):
+    if score >= MATE_SCORE:
+        return score - ply
+    if score <= -MATE_SCORE:
+        return score + ply
+    return score
+
+def probeTable(tt, key, depth, alpha, beta, maximizing_player, ply=0):
+    """Look key up in tt; return (score or None, alpha, beta, hash move id).
+
+    The table holds scores from the side to move, min nodes negate them back
+    into the root player's view. ply is the node's distance from the root."""
+    entry = tt.probe(key)
+    if entry is None:
+        return None, alpha, beta, None
+    entryDepth, flag, score, hashMove = entry
+    score = scoreFromTable(score, ply)
+    if not maximizing_player:
+        score = -score
+        flag = FLIPPED_BOUND[flag]
+    if entryDepth >= depth:
+        if flag == EXACT:
+            return score, alpha, beta, hashMove
+        if flag == LOWER:
+            alpha = max(alpha, score)
+        else:
+            beta = min(beta, score)
+        if alpha >= beta:
+            return score, alpha, beta, hashMove
+    return None, alpha, beta, hashMove
+
+def moveIDSquares(moveID):
+    """The start and end square bits of Move.code for a Move.moveID."""
+    return (moveID // 1000 * 8 + moveID // 100 % 10) | (moveID // 10 % 10 * 8 + moveID % 10) << 6
+
+def hashMoveFirst(moves, hashMove):
+    for i, move in enumerate(moves):
+        if move.moveID == hashMove:
+            return [move] + moves[:i] + moves[i + 1:]
+    return moves
+
+def storeTable(tt, key, depth, score, alpha, beta, move, maximizing_player, ply=0):
+    if score <= alpha:
+        flag = UPPER
+    elif score >= beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    if not maximizing_player:
+        score = -score
+        flag = FLIPPED_BOUND[flag]
+    tt.store(key, depth, flag, scoreToTable(score, ply), move.moveID)
+
+def captureGains(gs, moves):
+    """(SEE gain, move) for the captures and promotions in moves that do not lose material, best first."""
+    gains = []
+    for move in moves:
+        if move.pieceCaptured != "--" or move.isPawnPromotion:
+            gain = gs.staticExchange(move)
+            if gain >= 0:
+                gains.append((gain, move))
+    gains.sort(key=lambda item: item[0], reverse=True)
+    return gains
+
+class Profiler:
+    """Calls and wall time per method, counted by wrappers installed on objects for one search.
+
+    Times are inclusive, so a getValidMoves made inside evaluatePosition counts in both."""
+    def __init__(self):
+        self.calls = {}
+        self.seconds = {}
+        self.installed = []
+
+    def install(self, obj, names):
+        for name in names:
+            if not hasattr(obj, name):
+                continue
+            self.calls.setdefault(name, 0)
+            self.seconds.setdefault(name, 0.0)
+            setattr(obj, name, self.timed(name, getattr(obj, name)))
+            self.installed.append((obj, name))
+
+    def timed(self, name, method):
+        calls, seconds, clock = self.calls, self.seconds, time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                seconds[name] += clock() - start
+                calls[name] += 1
+        return wrapper
+
+    def remove(self):
+        for obj, name in self.installed:
+            delattr(obj, name)  # the class method shows through again
+        self.installed = []
+
+    def report(self):
+        return {name: {'calls': self.calls[name], 'seconds': self.seconds[name]} for name in self.calls}
+
+def searchStats(searcher, gs, move, seconds, tt_probes, tt_hits, cache_hits=0, cache_misses=0, profiler=None):
+    """The statistics of the search that just returned move from gs, as a JSON-ready dict.
+
+    tt_probes, tt_hits and the cache counters are the transposition table and
+    gs.moveCache counts before the search; the searcher's
+    iterations give the nodes, time and effective branching factor of each depth."""
+    nodes = searcher.nodes_evaluated
+    cutoffs = getattr(searcher, 'cutoffs', 0)
+    probes = searcher.tt.probes - tt_probes
+    hits = searcher.tt.hits - tt_hits
+    iterations = []
+    previous_total = previous_nodes = 0
+    for depth, _, _, total, elapsed in getattr(searcher, 'iterations', []):
+        depth_nodes = total - previous_total
+        iterations.append({'depth': depth, 'nodes': depth_nodes, 'seconds': elapsed,
+                           'ebf': depth_nodes / previous_nodes if previous_nodes else None})
+        previous_total, previous_nodes = total, depth_nodes
+    stats = {
+        'engine': type(searcher).__name__,
+        'ply': len(gs.movelog),
+        'move': move.getchessnotion() if move is not None else None,
+        'score': getattr(searcher, 'best_score', None),
+        'depth': getattr(searcher, 'completed_depth', None),
+        'seconds': seconds,
+        'nodes': nodes,
+        'qnodes': getattr(searcher, 'qnodes', 0),
+        'nps': nodes / seconds if seconds else 0.0,
+        'cutoffs': cutoffs,
+        'first_move_cutoffs': getattr(searcher, 'first_move_cutoffs', 0),
+        'cutoff_rate': getattr(searcher, 'first_move_cutoffs', 0) / cutoffs if cutoffs else 0.0,
+        'tt_probes': probes,
+        'tt_hits': hits,
+        'tt_hit_rate': hits / probes if probes else 0.0,
+        'move_cache_hits': gs.moveCache.hits - cache_hits,
+        'move_cache_misses': gs.moveCache.misses - cache_misses,
+        'iterations': iterations,
+    }
+    if profiler is not None:
+        stats['timings'] = profiler.report()
+    return stats
+
+def runSearch(searcher, gs, validMoves):
+    """searcher.search(gs, validMoves), with its statistics kept in searcher.last_stats.
+
+    With profile set the game state and searcher methods are timed for the search;
+    with stats_out set the statistics are written there as a JSON line."""
+    tt_probes, tt_hits = searcher.tt.probes, searcher.tt.hits
+    cache_hits, cache_misses = gs.moveCache.hits, gs.moveCache.misses
+    profiler = None
+    if searcher.profile:
+        profiler = Profiler()
+        profiler.install(gs, PROFILED_GAMESTATE)
+        profiler.install(searcher, PROFILED_SEARCHER)
+    start = time.perf_counter()
+    try:
+        move = searcher.search(gs, validMoves)
+    finally:
+        if profiler is not None:
+            profiler.remove()
+    searcher.last_stats = searchStats(searcher, gs, move, time.perf_counter() - start,
+                                      tt_probes, tt_hits, cache_hits, cache_misses, profiler)
+    if searcher.stats_out is not None:
+        searcher.stats_out.write(json.dumps(searcher.last_stats) + "\n")
+        searcher.stats_out.flush()
+    return move
+
 class getSimpleAlphaBetaMove:
-    def __init__(self, depth=3, time_limit=2.0):
+    def __init__(self, depth=3, time_limit=2.0, hash_mb=16, tt=None, book=None, profile=False,
+                 stats_out=None):
         self.max_depth = depth
         self.time_limit = time_limit
         self.nodes_evaluated = 0
+        self.qnodes = 0
         self.piece_values = {'P': 100, 'N': 300, 'B': 300, 'R': 500, 'Q': 900, 'K': 10000}
         self.start_time = 0
+        self.timed_out = False
+        self.tt = tt if tt is not None else TranspositionTable(hash_mb)
+        self.book = book  # an OpeningBook consulted before searching
+        self.stop_event = None  # a threading.Event that cuts the search short when set
+        self.profile = profile  # time move generation, evaluation and ordering in each search
+        self.stats_out = stats_out  # a stream that gets each search's statistics as a JSON line
+        self.last_stats = None
 
     def __call__(self, gs, validMoves):
+        return runSearch(self, gs, validMoves)
+
+    def search(self, gs, validMoves):
         self.nodes_evaluated = 0
+        self.qnodes = 0
         self.start_time = time.time()
+        self.timed_out = False
+        self.tt.newSearch()
+        if self.book is not None:
+            book_move = self.book.chooseMove(gs, validMoves)
+            if book_move is not None:
+                return book_move
 
         best_move = None
         best_score = float('-inf')
         alpha, beta = float('-inf'), float('inf')
 
         for move in validMoves:
-            if time.time() - self.start_time > self.time_limit:
+            if self.timeUp():
                 break
             gs.makeMove(move)
-            score = -self.alpha_beta(gs, self.max_depth - 1, -beta, -alpha, False)
+            score = self.alpha_beta(gs, self.max_depth - 1, alpha, beta, False)
             gs.undoMove()
             if score > best_score or best_move is None:
                 best_score = score
@@ -34,34 +263,52 @@ class getSimpleAlphaBetaMove:
             alpha = max(alpha, score)
         return best_move
 
+    def timeUp(self):
+        if self.stop_event is not None and self.stop_event.is_set():
+            return True
+        return time.time() - self.start_time > self.time_limit
+
     def alpha_beta(self, gs, depth, alpha, beta, maximizing_player):
+        # scores are from the point of view of the player to move at the root
         self.nodes_evaluated += 1
-        if time.time() - self.start_time > self.time_limit:
-            return self.evaluatePosition(gs)
+        if self.timeUp():
+            self.timed_out = True
+            depth = 0
 
-        if gs.checkmate:
-            return -1000 - depth if maximizing_player else 1000 + depth
-        if gs.stalemate:
-            return 0
         if depth == 0:
-            return self.evaluatePosition(gs)
+            if maximizing_player:
+                return self.quiescence(gs, alpha, beta)
+            return -self.quiescence(gs, -beta, -alpha)
+
+        key = gs.zobristKey
+        score, alpha, beta, hashMove = probeTable(self.tt, key, depth, alpha, beta, maximizing_player)
+        if score is not None:
+            return score
+        alpha_orig, beta_orig = alpha, beta
 
         moves = gs.getValidMoves()
         if not moves:
-            if gs.inCheck():
-                return -1000 - depth
+            if gs.checkmate:
+                return -1000 - depth if maximizing_player else 1000 + depth
             return 0
+        if hashMove is not None:
+            moves = hashMoveFirst(moves, hashMove)
 
+        best_move = None
         if maximizing_player:
             max_eval = float('-inf')
             for move in moves:
                 gs.makeMove(move)
                 eval_score = self.alpha_beta(gs, depth - 1, alpha, beta, False)
                 gs.undoMove()
-                max_eval = max(max_eval, eval_score)
+                if eval_score > max_eval:
+                    max_eval = eval_score
+                    best_move = move
                 alpha = max(alpha, eval_score)
                 if beta <= alpha:
                     break
+            if not self.timed_out:
+                storeTable(self.tt, key, depth, max_eval, alpha_orig, beta_orig, best_move, True)
             return max_eval
         else:
             min_eval = float('inf')
@@ -69,147 +316,487 @@ class getSimpleAlphaBetaMove:
                 gs.makeMove(move)
                 eval_score = self.alpha_beta(gs, depth - 1, alpha, beta, True)
                 gs.undoMove()
-                min_eval = min(min_eval, eval_score)
+                if eval_score < min_eval:
+                    min_eval = eval_score
+                    best_move = move
                 beta = min(beta, eval_score)
                 if beta <= alpha:
                     break
+            if not self.timed_out:
+                storeTable(self.tt, key, depth, min_eval, alpha_orig, beta_orig, best_move, False)
             return min_eval
 
+    def quiescence(self, gs, alpha, beta):
+        # captures only until the position is quiet, scores from the side to move
+        self.nodes_evaluated += 1
+        self.qnodes += 1
+        in_check = gs.inCheck()
+        if in_check:
+            best = float('-inf')  # no standing pat in check, every evasion is searched
+        else:
+            best = self.evaluatePosition(gs)
+            if best >= beta:
+                return best
+            alpha = max(alpha, best)
+
+        moves = gs.getValidMoves()
+        if not moves:
+            return -1000 if gs.checkmate else 0
+        for gain, move in ([(0, move) for move in moves] if in_check else captureGains(gs, moves)):
+            if not in_check and best + gain + DELTA_MARGIN <= alpha:
+                break  # delta pruning, the remaining captures gain even less
+            gs.makeMove(move)
+            score = -self.quiescence(gs, -beta, -alpha)
+            gs.undoMove()
+            if score > best:
+                best = score
+                if score >= beta:
+                    break
+                alpha = max(alpha, score)
+        return best
+
     def evaluatePosition(self, gs):
+        # material from the piece counts in the bitboards, kings cancel out
         score = 0
-        for r in range(8):
-            for c in range(8):
-                piece = gs.board[r][c]
-                if piece != "--":
-                    value = self.piece_values.get(piece[1], 0)
-                    if piece[0] == 'w':
-                        score += value
-                    else:
-                        score -= value
+        bitboards = gs.bitboards
+        for piece in 'PNBRQ':
+            count = bitboards['w' + piece].bit_count() - bitboards['b' + piece].bit_count()
+            score += self.piece_values[piece] * count
         # Score from perspective of player to move
         return score if gs.whiteToMove else -score
 
+class SearchAborted(Exception):
+    """Raised inside a search when its time or node budget runs out."""
+
 class getAlphaBetaMove:
-    def __init__(self, depth=4, time_limit=3.0):
+    def __init__(self, depth=4, time_limit=3.0, hash_mb=16, tt=None, soft_time_limit=None,
+                 node_limit=None, check_interval=1024, book=None, tablebases=None, profile=False,
+                 stats_out=None):
         self.max_depth = depth
-        self.time_limit = time_limit
+        self.time_limit = time_limit  # hard budget, the search is abandoned mid-iteration
+        # soft budget, no new iteration is started after it
+        self.soft_time_limit = soft_time_limit if soft_time_limit is not None else time_limit / 2
+        self.node_limit = node_limit
+        self.check_interval = check_interval  # nodes between clock checks
         self.nodes_evaluated = 0
+        self.qnodes = 0  # of nodes_evaluated, those in quiescence
         self.piece_values = {'P': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 20000}
         self.start_time = 0
+        self.next_check = 0
+        self.completed_depth = 0
+        self.best_score = 0
+        self.pv = []
+        self.pvMoves = {}
+        self.iterations = []  # (depth, best move, score, nodes, seconds) per completed iteration
+        self.tt = tt if tt is not None else TranspositionTable(hash_mb)
+        self.book = book  # an OpeningBook consulted before searching
+        self.stop_event = None  # a threading.Event that aborts the search when set
+        self.on_iteration = None  # called with the searcher after each completed iteration
+        self.profile = profile  # time move generation, evaluation and ordering in each search
+        self.stats_out = stats_out  # a stream that gets each search's statistics as a JSON line
+        self.last_stats = None
+        self.tablebases = tablebases  # Tablebases probed at the root and in the tree
+        self.root_ply = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY)]  # two quiet cutoff moves per ply
+        self.history = {'w': [0] * 4096, 'b': [0] * 4096}  # quiet cutoffs by start and end square
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
 
     def __call__(self, gs, validMoves):
+        return runSearch(self, gs, validMoves)
+
+    def search(self, gs, validMoves):
         self.nodes_evaluated = 0
+        self.qnodes = 0
         self.start_time = time.time()
+        self.next_check = self.check_interval
+        self.completed_depth = 0
+        self.pv = []
+        self.pvMoves = {}
+        self.iterations = []
+        self.tt.newSearch()
+        self.newOrdering()
+        self.root_ply = len(gs.movelog)
+        if self.book is not None:
+            book_move = self.book.chooseMove(gs, validMoves)
+            if book_move is not None:
+                return book_move
+        if self.tablebases is not None:
+            tb_move = self.tablebases.bestMove(gs, validMoves)
+            if tb_move is not None:
+                return tb_move
+
+        root_moves = self.orderMoves(gs, validMoves)
+        if not root_moves:
+            return None
+        best_move = root_moves[0]
+        for depth in range(1, self.max_depth + 1):
+            try:
+                move, score = self.searchRoot(gs, root_moves, depth)
+            except SearchAborted:
+                while len(gs.movelog) > self.root_ply:
+                    gs.undoMove()
+                break
+            best_move, self.best_score, self.completed_depth = move, score, depth
+            self.iterations.append((depth, move, score, self.nodes_evaluated, time.time() - self.start_time))
+            # the best move leads the next iteration, the rest of its line is tried first below the root
+            root_moves.remove(move)
+            root_moves.insert(0, move)
+            self.pv = self.extractPV(gs, depth)
+            self.pvMoves = {}
+            for pv_move in self.pv:
+                self.pvMoves[gs.zobristKey] = pv_move.moveID
+                gs.makeMove(pv_move)
+            for pv_move in self.pv:
+                gs.undoMove()
+            if self.on_iteration is not None:
+                self.on_iteration(self)
+            if abs(score) >= MATE_SCORE or time.time() - self.start_time > self.soft_time_limit:
+                break
+        return best_move
 
-        ordered_moves = self.orderMoves(gs, validMoves)
+    def searchRoot(self, gs, moves, depth):
         best_move = None
         best_score = float('-inf')
         alpha, beta = float('-inf'), float('inf')
-
-        for move in ordered_moves:
-            if time.time() - self.start_time > self.time_limit:
-                break
+        for move in moves:
             gs.makeMove(move)
-            score = -self.alpha_beta(gs, self.max_depth - 1, -beta, -alpha, False)
+            score = self.alpha_beta(gs, depth - 1, alpha, beta, False)
             gs.undoMove()
             if score > best_score or best_move is None:
                 best_score = score
                 best_move = move
             alpha = max(alpha, score)
+        storeTable(self.tt, gs.zobristKey, depth, best_score, float('-inf'), float('inf'), best_move, True)
+        return best_move, best_score
 
-        return best_move
+    def newOrdering(self):
+        # killers belong to the last search, history is kept but decays
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        for table in self.history.values():
+            for i, value in enumerate(table):
+                if value:
+                    table[i] = value >> 1
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def cutoffRate(self):
+        """Share of beta cutoffs made by the first move searched, a measure of ordering quality."""
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def recordCutoff(self, gs, move, index, depth):
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+        code = move.code
+        if (code >> 16) & 15 != EMPTY_CODE or code & PROMOTION_FLAG:
+            return
+        ply = len(gs.zobristLog) - self.root_ply  # the zobrist log also counts null moves
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != code:
+                killers[1] = killers[0]
+                killers[0] = code
+        self.history['w' if gs.whiteToMove else 'b'][code & SQUARES_MASK] += depth * depth
+
+    def extractPV(self, gs, depth):
+        # follow the best moves stored in the table from the root
+        pv = []
+        for _ in range(depth):
+            moveID = self.tt.getMove(gs.zobristKey)
+            move = next((m for m in gs.getValidMoves() if m.moveID == moveID), None)
+            if move is None:
+                break
+            pv.append(move)
+            gs.makeMove(move)
+        for _ in pv:
+            gs.undoMove()
+        return pv
+
+    def checkLimits(self):
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise SearchAborted()
+        if self.node_limit is not None and self.nodes_evaluated >= self.node_limit:
+            raise SearchAborted()
+        if time.time() - self.start_time > self.time_limit:
+            raise SearchAborted()
+        self.next_check = self.nodes_evaluated + self.check_interval
+        if self.node_limit is not None:
+            self.next_check = min(self.next_check, self.node_limit)
 
     def alpha_beta(self, gs, depth, alpha, beta, maximizing_player):
+        # scores are from the point of view of the player to move at the root
         self.nodes_evaluated += 1
-        if time.time() - self.start_time > self.time_limit:
-            return self.evaluatePosition(gs)
+        if self.nodes_evaluated >= self.next_check:
+            self.checkLimits()
+
+        if self.tablebases is not None:
+            wdl = self.tablebases.probeWDL(gs)
+            if wdl is not None:
+                return wdl * TB_WIN if maximizing_player else -wdl * TB_WIN
 
-        if gs.checkmate:
-            return -10000 - depth if maximizing_player else 10000 + depth
-        if gs.stalemate:
-            return 0
         if depth == 0:
-            return self.evaluatePosition(gs)
+            if maximizing_player:
+                return self.quiescence(gs, alpha, beta)
+            return -self.quiescence(gs, -beta, -alpha)
+
+        key = gs.zobristKey
+        ply = len(gs.zobristLog) - self.root_ply
+        score, alpha, beta, hashMove = probeTable(self.tt, key, depth, alpha, beta, maximizing_player, ply)
+        if score is not None:
+            return score
+        alpha_orig, beta_orig = alpha, beta
 
         moves = gs.getValidMoves()
         if not moves:
-            if gs.inCheck():
-                return -10000 - depth
+            if gs.checkmate:
+                return mateScore(ply) if maximizing_player else -mateScore(ply)
             return 0
 
-        moves = self.orderMoves(gs, moves)
+        moves = self.orderMoves(gs, moves, hashMove, self.pvMoves.get(key))
 
+        best_move = None
         if maximizing_player:
             max_eval = float('-inf')
-            for move in moves:
+            for index, move in enumerate(moves):
                 gs.makeMove(move)
                 eval_score = self.alpha_beta(gs, depth - 1, alpha, beta, False)
                 gs.undoMove()
-                max_eval = max(max_eval, eval_score)
+                if eval_score > max_eval:
+                    max_eval = eval_score
+                    best_move = move
                 alpha = max(alpha, eval_score)
                 if beta <= alpha:
+                    self.recordCutoff(gs, move, index, depth)
                     break
+            storeTable(self.tt, key, depth, max_eval, alpha_orig, beta_orig, best_move, True, ply)
             return max_eval
         else:
             min_eval = float('inf')
-            for move in moves:
+            for index, move in enumerate(moves):
                 gs.makeMove(move)
                 eval_score = self.alpha_beta(gs, depth - 1, alpha, beta, True)
                 gs.undoMove()
-                min_eval = min(min_eval, eval_score)
+                if eval_score < min_eval:
+                    min_eval = eval_score
+                    best_move = move
                 beta = min(beta, eval_score)
                 if beta <= alpha:
+                    self.recordCutoff(gs, move, index, depth)
                     break
+            storeTable(self.tt, key, depth, min_eval, alpha_orig, beta_orig, best_move, False, ply)
             return min_eval
 
+    def quiescence(self, gs, alpha, beta):
+        # captures only until the position is quiet, scores from the side to move
+        self.nodes_evaluated += 1
+        self.qnodes += 1
+        if self.nodes_evaluated >= self.next_check:
+            self.checkLimits()
+        in_check = gs.inCheck()
+        if in_check:
+            best = float('-inf')  # no standing pat in check, every evasion is searched
+        else:
+            best = self.evaluatePosition(gs)
+            if best >= beta:
+                return best
+            alpha = max(alpha, best)
+
+        moves = gs.getValidMoves()
+        if not moves:
+            return mateScore(len(gs.zobristLog) - self.root_ply) if gs.checkmate else 0
+        for gain, move in ([(0, move) for move in moves] if in_check else captureGains(gs, moves)):
+            if not in_check and best + gain + DELTA_MARGIN <= alpha:
+                break  # delta pruning, the remaining captures gain even less
+            gs.makeMove(move)
+            score = -self.quiescence(gs, -beta, -alpha)
+            gs.undoMove()
+            if score > best:
+                best = score
+                if score >= beta:
+                    break
+                alpha = max(alpha, score)
+        return best
+
     def evaluatePosition(self, gs):
-        white_material = 0
-        black_material = 0
-        for r in range(8):
-            for c in range(8):
-                piece = gs.board[r][c]
-                if piece != "--":
-                    value = self.piece_values.get(piece[1], 0)
-                    if piece[0] == 'w':
-                        white_material += value
-                    else:
-                        black_material += value
-        score = white_material - black_material
+        # material and piece-square scores are maintained by makeMove/undoMove
+        white_material = gs.material['w']
+        black_material = gs.material['b']
+        score = white_material - black_material + gs.pstScore['w'] - gs.pstScore['b']
+        if not gs.whiteToMove:
+            score = -score
 
         material_diff = abs(white_material - black_material)
         if material_diff > 500:
-            enemy_color = 'b' if gs.whiteToMove else 'w'
-            try:
-                enemy_king = gs.blackKingLocation if enemy_color == 'b' else gs.whiteKingLocation
-                my_king = gs.whiteKingLocation if gs.whiteToMove else gs.blackKingLocation
-                king_dist = abs(my_king[0] - enemy_king[0]) + abs(my_king[1] - enemy_king[1])
-                edge_dist = min(enemy_king[0], 7 - enemy_king[0], enemy_king[1], 7 - enemy_king[1])
-                score += (10 - king_dist) * 30
-                score += (4 - edge_dist) * 50
-                for r in range(8):
-                    for c in range(8):
-                        piece = gs.board[r][c]
-                        if piece != "--" and piece[0] == ('w' if gs.whiteToMove else 'b') and piece[1] == 'Q':
-                            q_dist = abs(r - enemy_king[0]) + abs(c - enemy_king[1])
-                            score += (8 - q_dist) * 40
-            except:
-                pass
-        score += len(gs.getValidMoves()) * 5
-        return score if gs.whiteToMove else -score
+            # the side ahead drives the enemy king to the edge and closes in on it
+            strong = 'w' if white_material > black_material else 'b'
+            enemy_king = gs.blackKingLocation if strong == 'w' else gs.whiteKingLocation
+            my_king = gs.whiteKingLocation if strong == 'w' else gs.blackKingLocation
+            king_dist = abs(my_king[0] - enemy_king[0]) + abs(my_king[1] - enemy_king[1])
+            edge_dist = min(enemy_king[0], 7 - enemy_king[0], enemy_king[1], 7 - enemy_king[1])
+            bonus = (10 - king_dist) * 30 + (4 - edge_dist) * 50
+            for sq in iterBits(gs.bitboards[strong + 'Q']):
+                q_dist = abs((sq >> 3) - enemy_king[0]) + abs((sq & 7) - enemy_king[1])
+                bonus += (8 - q_dist) * 40
+            score += bonus if strong == ('w' if gs.whiteToMove else 'b') else -bonus
+        white_mobility, black_mobility = gs.mobility(MOBILITY_WEIGHTS)
+        score += white_mobility - black_mobility if gs.whiteToMove else black_mobility - white_mobility
+        return score
+
+    def orderMoves(self, gs, moves, hashMove=None, pvMove=None):
+        # scored from the move codes alone, no move is made
+        ply = len(gs.zobristLog) - self.root_ply  # the zobrist log also counts null moves
+        killer1, killer2 = self.killers[ply] if ply < MAX_PLY else (None, None)
+        history = self.history['w' if gs.whiteToMove else 'b']
+        hashSquares = moveIDSquares(hashMove) if hashMove is not None else -1
+        pvSquares = moveIDSquares(pvMove) if pvMove is not None else -1
 
-    def orderMoves(self, gs, moves):
         def move_score(move):
+            code = move.code
+            squares = code & SQUARES_MASK
+            if squares == pvSquares:
+                return PV_ORDER
+            if squares == hashSquares:
+                return HASH_ORDER
             score = 0
-            if move.pieceCaptured != "--":
-                score += self.piece_values.get(move.pieceCaptured[1], 0) * 10
-            if move.isPawnPromotion:
-                score += 800
-            gs.makeMove(move)
-            if gs.inCheck():
-                score += 100
-                if len(gs.getValidMoves()) == 0:
-                    score += 50000
-            gs.undoMove()
-            return score
+            captured = (code >> 16) & 15
+            if captured != EMPTY_CODE:
+                score = CAPTURE_ORDER + ORDER_VALUES[captured] * 16 - ORDER_VALUES[(code >> 12) & 15]
+            if code & PROMOTION_FLAG:
+                score += PROMOTION_ORDER
+            if score:
+                return score
+            if code == killer1:
+                return KILLER_ORDER[0]
+            if code == killer2:
+                return KILLER_ORDER[1]
+            return min(history[squares], KILLER_ORDER[1] - 1)
 
         return sorted(moves, key=move_score, reverse=True)
+
+class getPVSMove(getAlphaBetaMove):
+    """Negamax principal variation search with null-move pruning, late move reductions and check extensions.
+
+    Scores are from the side to move at every node. Ordering, quiescence, evaluation and the
+    iterative deepening loop are those of getAlphaBetaMove."""
+    def __init__(self, depth=8, time_limit=3.0, hash_mb=16, tt=None, soft_time_limit=None,
+                 node_limit=None, check_interval=1024, book=None, tablebases=None, null_move=True,
+                 reductions=True, profile=False, stats_out=None):
+        super().__init__(depth, time_limit, hash_mb=hash_mb, tt=tt, soft_time_limit=soft_time_limit,
+                         node_limit=node_limit, check_interval=check_interval, book=book,
+                         tablebases=tablebases, profile=profile, stats_out=stats_out)
+        self.null_move = null_move
+        self.reductions = reductions
+        self.search_depth = 0
+
+    def searchRoot(self, gs, moves, depth):
+        self.search_depth = depth
+        best_move = None
+        alpha, beta = float('-inf'), float('inf')
+        for index, move in enumerate(moves):
+            gs.makeMove(move)
+            try:
+                if index == 0:
+                    score = -self.negamax(gs, depth - 1, -beta, -alpha, 1)
+                else:
+                    score = -self.negamax(gs, depth - 1, -alpha - 1, -alpha, 1)
+                    if score > alpha:
+                        score = -self.negamax(gs, depth - 1, -beta, -alpha, 1)
+            finally:
+                gs.undoMove()
+            if score > alpha or best_move is None:
+                best_move = move
+                alpha = score
+        self.tt.store(gs.zobristKey, depth, EXACT, alpha, best_move.moveID)
+        return best_move, alpha
+
+    def negamax(self, gs, depth, alpha, beta, ply, allow_null=True):
+        # moves are undone in finally blocks so an aborted search leaves gs, null moves included, as it was
+        self.nodes_evaluated += 1
+        if self.nodes_evaluated >= self.next_check:
+            self.checkLimits()
+
+        if self.tablebases is not None:
+            wdl = self.tablebases.probeWDL(gs)
+            if wdl is not None:
+                return wdl * TB_WIN
+
+        in_check = gs.inCheck()
+        if in_check and ply < 2 * self.search_depth:
+            depth += 1  # check extension, bounded so perpetual checks cannot extend forever
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(gs, alpha, beta)
+
+        key = gs.zobristKey
+        pv_node = beta - alpha > 1
+        hashMove = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            entryDepth, flag, score, hashMove = entry
+            score = scoreFromTable(score, ply)
+            if not pv_node and entryDepth >= depth and (
+                    flag == EXACT or (flag == LOWER and score >= beta) or (flag == UPPER and score <= alpha)):
+                return score
+
+        moves = gs.getValidMoves()
+        if not moves:
+            return mateScore(ply) if gs.checkmate else 0
+
+        if (allow_null and self.null_move and not pv_node and not in_check and depth >= 3
+                and self.hasNonPawnMaterial(gs) and self.evaluatePosition(gs) >= beta):
+            # passing is safe to test only when the side to move has pieces, in king and pawn
+            # endings zugzwang makes the null move a poor lower bound
+            reduction = 3 if depth >= 6 else 2
+            gs.makeNullMove()
+            try:
+                score = -self.negamax(gs, depth - 1 - reduction, -beta, -beta + 1, ply + 1, False)
+            finally:
+                gs.undoNullMove()
+            if score >= beta:
+                return beta if score >= MATE_SCORE else score
+
+        moves = self.orderMoves(gs, moves, hashMove, self.pvMoves.get(key))
+        alpha_orig = alpha
+        best = float('-inf')
+        best_move = None
+        for index, move in enumerate(moves):
+            code = move.code
+            quiet = (code >> 16) & 15 == EMPTY_CODE and not code & PROMOTION_FLAG
+            gs.makeMove(move)
+            try:
+                if index == 0:
+                    score = -self.negamax(gs, depth - 1, -beta, -alpha, ply + 1)
+                else:
+                    # late quiet moves that do not give check are searched shallower first
+                    reduction = 0
+                    if (self.reductions and quiet and index >= 3 and depth >= 3
+                            and not in_check and not gs.inCheck()):
+                        reduction = 1 if index < 6 else 2
+                    score = -self.negamax(gs, depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                    if score > alpha and reduction:
+                        score = -self.negamax(gs, depth - 1, -alpha - 1, -alpha, ply + 1)
+                    if alpha < score < beta:
+                        score = -self.negamax(gs, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                gs.undoMove()
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.recordCutoff(gs, move, index, depth)
+                        break
+
+        if best <= alpha_orig:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.tt.store(key, depth, flag, scoreToTable(best, ply), best_move.moveID)
+        return best
+
+    def hasNonPawnMaterial(self, gs):
+        color = 'w' if gs.whiteToMove else 'b'
+        return gs.material[color] > PIECE_VALUES['P'] * gs.bitboards[color + 'P'].bit_count()
@@ -0,0 +1,330 @@
+"""Append-only binary game archive, memory-mapped for random access to any game.
+
+Games go into two files. The data file is an 8-byte magic followed by one
+record per game: a 5-byte header (plies: u16, result: u8, tag bytes: u16),
+the tags as 'name<TAB>value' lines in UTF-8, then two bytes per move. The
+index file (the data path plus .idx) is an 8-byte magic followed by a fixed
+11-byte entry per game (data offset: u64, plies: u16, result: u8), so game N
+is one seek away and the results and lengths of millions of games can be
+scanned without touching the moves. Everything is little endian.
+
+A move is packed into a u16: the low 12 bits of Move.code (start square | end
+square << 6), then en passant, promotion and capture flags. That is enough to
+rebuild the full Move on the board it was played on without generating moves.
+Games start from the initial position unless they carry a FEN tag.
+
+    python ChessArchive.py import games.pgn -o games.chs
+    python ChessArchive.py export games.chs -o out.pgn --first 100 --count 10
+    python ChessArchive.py info games.chs
+
+recordsFromPGN and pgnRecords are the streaming converters between
+ChessPGN.readGames/writeGames and ArchiveWriter/GameArchive.
+"""
+import argparse
+import array
+import mmap
+import os
+import struct
+import sys
+
+import ChessEngine
+from ChessEngine import SQUARES_MASK, SQUARE_COORDS
+from ChessPGN import parseMove, readGames, toSAN, writeGames
+
+MAGIC = b"CHSGAME1"
+INDEX_MAGIC = b"CHSGIDX1"
+RECORD = struct.Struct("<HBH")
+INDEX = struct.Struct("<QHB")
+RESULTS = ('*', '1-0', '0-1', '1/2-1/2')
+RESULT_CODES = {result: code for code, result in enumerate(RESULTS)}
+PACKED_EN_PASSANT = 1 << 12
+PACKED_PROMOTION = 1 << 13
+PACKED_CAPTURE = 1 << 14
+
+
+def packMove(move):
+    packed = move.code & SQUARES_MASK
+    if move.isEnPassantMove:
+        packed |= PACKED_EN_PASSANT
+    if move.isPawnPromotion:
+        packed |= PACKED_PROMOTION
+    if move.pieceCaptured != "--":
+        packed |= PACKED_CAPTURE
+    return packed
+
+
+def unpackMove(packed, board):
+    """The Move a packed u16 stands for on board, the position it was played from."""
+    return ChessEngine.Move(SQUARE_COORDS[packed & 63], SQUARE_COORDS[(packed >> 6) & 63], board,
+                            isEnPassantMove=bool(packed & PACKED_EN_PASSANT))
+
+
+def packTags(tags):
+    text = "".join(f"{name}\t{value}\n" for name, value in tags.items()
+                   if "\t" not in name and "\n" not in name and "\n" not in str(value))
+    data = text.encode("utf-8")
+    if len(data) > 0xFFFF:
+        raise ValueError("tags take more than 64 KB")
+    return data
+
+
+def unpackTags(data):
+    tags = {}
+    for line in data.decode("utf-8").splitlines():
+        name, _, value = line.partition("\t")
+        tags[name] = value
+    return tags
+
+
+def startPosition(tags):
+    return ChessEngine.GameState.fromFEN(tags["FEN"]) if "FEN" in tags else ChessEngine.GameState()
+
+
+class ArchiveWriter:
+    """Appends games to an archive, creating it if needed.
+
+    A record is written to the data file before its index entry, so a crash leaves
+    at most data the index has not caught up with; opening the archive again indexes
+    complete records and drops a torn one at the end."""
+
+    def __init__(self, path):
+        self.path = path
+        self.data = open(path, "ab+")
+        self.index = open(path + ".idx", "ab+")
+        if self.data.seek(0, 2) == 0:
+            self.data.write(MAGIC)
+        if self.index.seek(0, 2) == 0:
+            self.index.write(INDEX_MAGIC)
+        self.data.seek(0)
+        self.index.seek(0)
+        if self.data.read(len(MAGIC)) != MAGIC or self.index.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a game archive")
+        self.count = (self.index.seek(0, 2) - len(INDEX_MAGIC)) // INDEX.size
+        self.recover()
+
+    def recover(self):
+        # index whatever complete records follow the last indexed one
+        end = len(MAGIC)
+        if self.count:
+            self.index.seek(len(INDEX_MAGIC) + (self.count - 1) * INDEX.size)
+            offset, plies, _ = INDEX.unpack(self.index.read(INDEX.size))
+            self.data.seek(offset)
+            _, _, tagBytes = RECORD.unpack(self.data.read(RECORD.size))
+            end = offset + RECORD.size + tagBytes + 2 * plies
+        self.index.truncate(len(INDEX_MAGIC) + self.count * INDEX.size)
+        size = self.data.seek(0, 2)
+        while end + RECORD.size <= size:
+            self.data.seek(end)
+            plies, result, tagBytes = RECORD.unpack(self.data.read(RECORD.size))
+            length = RECORD.size + tagBytes + 2 * plies
+            if end + length > size:
+                break
+            self.index.seek(0, 2)
+            self.index.write(INDEX.pack(end, plies, result))
+            self.count += 1
+            end += length
+        if end < size:
+            self.data.truncate(end)
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, moves, result='*', tags=None):
+        """Add a game given as Moves (a GameState.movelog) and return its number.
+
+        Put the start position in a FEN tag if it is not the initial one."""
+        if len(moves) > 0xFFFF:
+            raise ValueError("a game has at most 65535 plies")
+        tagData = packTags(tags or {})
+        packed = array.array('H', (packMove(move) for move in moves))
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        offset = self.data.seek(0, 2)
+        self.data.write(RECORD.pack(len(packed), RESULT_CODES[result], len(tagData)) + tagData + packed.tobytes())
+        self.index.seek(0, 2)
+        self.index.write(INDEX.pack(offset, len(packed), RESULT_CODES[result]))
+        self.count += 1
+        return self.count - 1
+
+    def extend(self, games):
+        """Append (tags, moves, result) games, as recordsFromPGN yields them; return how many."""
+        added = 0
+        for tags, moves, result in games:
+            self.append(moves, result, tags)
+            added += 1
+        return added
+
+    def flush(self):
+        self.data.flush()
+        self.index.flush()
+
+
+class GameArchive:
+    """Read-only, memory-mapped view of the games in an archive when it was opened."""
+
+    def __init__(self, path):
+        self.path = path
+        self.dataFile = open(path, "rb")
+        self.indexFile = open(path + ".idx", "rb")
+        if self.dataFile.read(len(MAGIC)) != MAGIC or self.indexFile.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a game archive")
+        self.count = (os.fstat(self.indexFile.fileno()).st_size - len(INDEX_MAGIC)) // INDEX.size
+        self.data = mmap.mmap(self.dataFile.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+        self.index = mmap.mmap(self.indexFile.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+
+    def close(self):
+        for mapped in (getattr(self, 'data', None), getattr(self, 'index', None)):
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+        self.dataFile.close()
+        self.indexFile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, number):
+        """(data offset, plies, result) of game number, from the index alone."""
+        if not 0 <= number < self.count:
+            raise IndexError(f"game {number} not in an archive of {self.count}")
+        offset, plies, result = INDEX.unpack_from(self.index, len(INDEX_MAGIC) + number * INDEX.size)
+        return offset, plies, RESULTS[result]
+
+    def packedMoves(self, number):
+        """The packed u16 moves of game number as an array('H')."""
+        offset, plies, _ = self.entry(number)
+        _, _, tagBytes = RECORD.unpack_from(self.data, offset)
+        start = offset + RECORD.size + tagBytes
+        packed = array.array('H', self.data[start:start + 2 * plies])
+        if sys.byteorder == 'big':
+            packed.byteswap()
+        return packed
+
+    def tags(self, number):
+        offset, _, _ = self.entry(number)
+        _, _, tagBytes = RECORD.unpack_from(self.data, offset)
+        return unpackTags(self.data[offset + RECORD.size:offset + RECORD.size + tagBytes])
+
+    def game(self, number):
+        """(tags, [Move], result) of game number, replayed from its start position."""
+        tags = self.tags(number)
+        gs = startPosition(tags)
+        moves = []
+        for packed in self.packedMoves(number):
+            move = unpackMove(packed, gs.board)
+            gs.makeMove(move)
+            moves.append(move)
+        return tags, moves, self.entry(number)[2]
+
+    def __getitem__(self, number):
+        return self.game(number)
+
+    def __iter__(self):
+        for number in range(self.count):
+            yield self.game(number)
+
+
+def recordsFromPGN(stream):
+    """Yield (tags, [Move], result) for each game of a PGN text stream.
+
+    A game is cut at the first move the engine cannot play, such as castling, as
+    ChessBook.buildBook does; games with a FEN tag it cannot read are skipped."""
+    for tags, tokens, result in readGames(stream):
+        try:
+            gs = startPosition(tags)
+        except (ValueError, KeyError, IndexError):
+            continue
+        moves = []
+        for token in tokens:
+            move = parseMove(gs, token)
+            if move is None:
+                break
+            gs.makeMove(move)
+            moves.append(move)
+        yield tags, moves, result if result in RESULT_CODES else '*'
+
+
+def pgnRecords(archive, numbers=None):
+    """Yield (tags, SAN tokens, result) for games of an archive, in order, for ChessPGN.writeGames."""
+    for number in numbers if numbers is not None else range(len(archive)):
+        tags = archive.tags(number)
+        gs = startPosition(tags)
+        tokens = []
+        for packed in archive.packedMoves(number):
+            move = unpackMove(packed, gs.board)
+            tokens.append(toSAN(gs, move))
+            gs.makeMove(move)
+        yield tags, tokens, archive.entry(number)[2]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build, export or summarise a binary game archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importCommand = commands.add_parser("import", help="append the games of PGN files")
+    importCommand.add_argument("files", nargs="+", help="PGN files, - for stdin")
+    importCommand.add_argument("-o", "--out", default="games.chs")
+    exportCommand = commands.add_parser("export", help="write games as PGN")
+    exportCommand.add_argument("archive")
+    exportCommand.add_argument("-o", "--out", help="PGN file, stdout if not given")
+    exportCommand.add_argument("--first", type=int, default=0, help="number of the first game")
+    exportCommand.add_argument("--count", type=int, help="games to write (default: all from --first)")
+    infoCommand = commands.add_parser("info", help="count games, plies and results from the index")
+    infoCommand.add_argument("archive")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        with ArchiveWriter(args.out) as writer:
+            before = len(writer)
+            for path in args.files:
+                stream = sys.stdin if path == '-' else open(path)
+                try:
+                    writer.extend(recordsFromPGN(stream))
+                finally:
+                    if stream is not sys.stdin:
+                        stream.close()
+            print(f"{args.out}: {len(writer) - before} games added, {len(writer)} in all")
+        return 0
+
+    with GameArchive(args.archive) as archive:
+        if args.command == "export":
+            last = len(archive) if args.count is None else min(len(archive), args.first + args.count)
+            out = open(args.out, "w") if args.out else sys.stdout
+            try:
+                writeGames(out, pgnRecords(archive, range(args.first, last)))
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            return 0
+
+        results = dict.fromkeys(RESULTS, 0)
+        plies = 0
+        for number in range(len(archive)):
+            _, length, result = archive.entry(number)
+            plies += length
+            results[result] += 1
+        size = os.path.getsize(args.archive) + os.path.getsize(args.archive + ".idx")
+        print(f"{len(archive)} games, {plies} plies, {size} bytes "
+              f"({size / plies if plies else 0:.2f} bytes per ply with tags and index)")
+        print("  ".join(f"{result} {count}" for result, count in results.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""Searches that run on a background thread so the pygame loop keeps drawing.
+
+A BackgroundSearch copies the position before it starts, so the caller's
+GameState can change while the search runs, and can be cancelled at any time.
+The copy shares the caller's MoveCache: entries are keyed by zobrist key, so
+the moves the search generates serve the game and the next search.
+With a ponder move it searches the position after that move with no time
+limit; ponderHit turns it into a normal timed search when the move is played,
+keeping everything it has found so far.
+"""
+import threading
+import time
+
+import ChessEngine
+
+
+class BackgroundSearch:
+    def __init__(self, searcher, gs, ponderMove=None):
+        self.searcher = searcher
+        self.position = ChessEngine.GameState.fromCompact(gs.toCompact())
+        self.position.moveCache = gs.moveCache
+        self.ponderMove = ponderMove
+        if ponderMove is not None:
+            self.position.makeMove(ponderMove)
+        self.result = None
+        self.error = None
+        self.stopEvent = threading.Event()
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.limits = None  # the searcher's own time limits while pondering
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.searcher.stop_event = self.stopEvent
+        if self.ponderMove is not None and hasattr(self.searcher, 'soft_time_limit'):
+            self.limits = (self.searcher.time_limit, self.searcher.soft_time_limit)
+            self.searcher.time_limit = self.searcher.soft_time_limit = float('inf')
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            self.result = self.searcher(self.position, self.position.getValidMoves())
+        except Exception as error:  # handed to the UI thread through self.error
+            self.error = error
+        finally:
+            self.restoreLimits()
+            self.searcher.stop_event = None
+            self.finished.set()
+
+    def restoreLimits(self):
+        with self.lock:
+            if self.limits is not None:
+                self.searcher.time_limit, self.searcher.soft_time_limit = self.limits
+                self.limits = None
+
+    def ponderHit(self):
+        """The predicted move was played: from now on the search keeps to its normal budget."""
+        with self.lock:
+            if self.limits is not None:
+                elapsed = time.time() - self.searcher.start_time
+                time_limit, soft_time_limit = self.limits
+                self.searcher.soft_time_limit = elapsed + soft_time_limit
+                self.searcher.time_limit = elapsed + time_limit
+            self.ponderMove = None
+
+    def done(self):
+        return self.finished.is_set()
+
+    def cancel(self):
+        """Stop the search and wait for the thread to let go of the searcher."""
+        self.stopEvent.set()
+        self.thread.join()
+
+    def move(self):
+        """The move found, re-raising any error from the search thread."""
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def predictedReply(self):
+        """The opponent's expected answer to the move found, from the searcher's principal variation."""
+        pv = getattr(self.searcher, 'pv', [])
+        return pv[1] if len(pv) > 1 and pv[0] == self.result else None
+
+    def info(self):
+        """Live progress: depth completed, nodes and the best line so far."""
+        searcher = self.searcher
+        pv = getattr(searcher, 'pv', [])
+        return {
+            'depth': getattr(searcher, 'completed_depth', 0),
+            'nodes': searcher.nodes_evaluated,
+            'pv': ' '.join(move.getchessnotion() for move in pv),
+            'pondering': self.ponderMove is not None,
+        }
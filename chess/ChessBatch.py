@@ -0,0 +1,241 @@
+"""Score many positions at once with NumPy.
+
+A position is encoded as the 66 bytes of GameState.toCompact: a piece code per
+square (ChessEngine.PIECES order, EMPTY_CODE for an empty square), the side to
+move and the en passant square. encode stacks positions into an (N, 66) uint8
+array; planes expands it into the usual (N, 12, 64) one-hot tensor and
+bitboards into the (12, N) uint64 piece bitboards GameState keeps.
+
+evaluate scores a whole array in one call with the terms of
+getAlphaBetaMove.evaluatePosition, and the same results: material,
+piece-square tables, the mop-up bonus for the side ahead, and the
+GameState.mobility difference under MOBILITY_WEIGHTS. Use it to score the
+children of a node or a quiescence frontier together, or to score position
+files offline:
+
+    python ChessBatch.py positions.epd -o scores.txt --batch 4096
+
+NumPy is optional: the rest of the engine never imports this module, and
+here every entry point raises ImportError if NumPy is missing.
+"""
+import argparse
+import sys
+import time
+
+try:
+    import numpy as np
+except ImportError:  # the engine and the searchers work without it
+    np = None
+
+import ChessEngine
+from ChessAi import MOBILITY_WEIGHTS
+from ChessEngine import PIECES, PIECE_VALUES, PIECE_SQUARE_VALUES, EMPTY_CODE
+from ChessBitboards import FULL, COL_MASKS
+
+MOP_UP_MARGIN = 500
+# (row step, col step) of the moves of each piece, white pawns step towards row 0
+ROOK_STEPS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_STEPS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_STEPS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_STEPS = ROOK_STEPS + BISHOP_STEPS
+PAWN_STEPS = {'w': (-1, ((-1, -1), (-1, 1))), 'b': (1, ((1, -1), (1, 1)))}  # push row, captures
+
+
+def requireNumpy():
+    if np is None:
+        raise ImportError("ChessBatch needs numpy (pip install numpy)")
+
+
+if np is not None:
+    SQUARES = np.arange(64)
+    # white-relative material plus piece-square value per piece code and square, zero for empty
+    VALUES = np.zeros((EMPTY_CODE + 1, 64), dtype=np.int32)
+    MATERIAL = np.zeros(EMPTY_CODE + 1, dtype=np.int32)
+    for code, piece in enumerate(PIECES):
+        sign = 1 if piece[0] == 'w' else -1
+        VALUES[code] = sign * (PIECE_VALUES[piece[1]] + np.array(PIECE_SQUARE_VALUES[piece]))
+        MATERIAL[code] = PIECE_VALUES[piece[1]]
+    ROWS = SQUARES >> 3
+    COLS = SQUARES & 7
+    MANHATTAN = np.abs(ROWS[:, None] - ROWS[None, :]) + np.abs(COLS[:, None] - COLS[None, :])
+    EDGE_DISTANCE = np.minimum(np.minimum(ROWS, 7 - ROWS), np.minimum(COLS, 7 - COLS))
+    # per column step, the columns a shifted bitboard may land on without wrapping round the board
+    WRAP_MASKS = {dc: np.uint64(FULL & ~sum((COL_MASKS[c] for c in range(8) if not 0 <= c - dc < 8), 0))
+                  for dc in range(-2, 3)}
+
+
+def encode(positions):
+    """(N, 66) uint8 array of GameStates, or of toCompact bytes, in order."""
+    requireNumpy()
+    data = b"".join(position if isinstance(position, bytes) else position.toCompact()
+                    for position in positions)
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, 66)
+
+
+def planes(encoded):
+    """(N, 12, 64) one-hot piece planes in PIECES order."""
+    requireNumpy()
+    return (encoded[:, None, :64] == np.arange(len(PIECES), dtype=np.uint8)[None, :, None]).astype(np.uint8)
+
+
+def bitboards(encoded):
+    """(12, N) uint64 bitboards in PIECES order, bit sq set for a piece on square sq as in GameState."""
+    requireNumpy()
+    boards = encoded[:, :64]
+    packed = [np.packbits(boards == code, axis=1, bitorder='little') for code in range(len(PIECES))]
+    return np.stack(packed).view('<u8')[:, :, 0]
+
+
+def popcount(bb):
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bb).astype(np.int32)
+    return np.unpackbits(bb.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1).astype(np.int32)
+
+
+def shift(bb, dr, dc):
+    """Every bitboard in bb moved dr rows and dc columns, dropping what leaves the board."""
+    delta = dr * 8 + dc
+    bb = bb << np.uint64(delta) if delta > 0 else bb >> np.uint64(-delta)
+    return bb & WRAP_MASKS[dc]
+
+
+def mobility(encoded, color, weights=None, pieceBoards=None):
+    """GameState.mobility of color in every position: weighted squares its pieces attack or can move to.
+
+    Each step is a shift of whole bitboards. The squares one step type reaches from
+    different pieces never coincide (and along a ray the nearer piece blocks the
+    other), so popcounts per step add up to the per-piece counts."""
+    requireNumpy()
+    weights = weights or dict.fromkeys('PNBRQK', 1)
+    if pieceBoards is None:
+        pieceBoards = bitboards(encoded)
+    base = 0 if color == 'w' else 6
+    own = np.bitwise_or.reduce(pieceBoards[base:base + 6])
+    enemy = np.bitwise_or.reduce(pieceBoards[6 - base:12 - base])
+    notOwn = ~own
+    empty = ~(own | enemy)
+    count = np.zeros(len(encoded), dtype=np.int32)
+
+    for letter, code, steps in (('N', 1, KNIGHT_STEPS), ('K', 5, KING_STEPS)):
+        if weights[letter]:
+            pieces = pieceBoards[base + code]
+            count += weights[letter] * sum(popcount(shift(pieces, dr, dc) & notOwn) for dr, dc in steps)
+
+    for letter, code, steps in (('B', 2, BISHOP_STEPS), ('R', 3, ROOK_STEPS),
+                                ('Q', 4, ROOK_STEPS + BISHOP_STEPS)):
+        pieces = pieceBoards[base + code]
+        if not weights[letter] or not pieces.any():
+            continue
+        for dr, dc in steps:
+            reached = shift(pieces, dr, dc)
+            for _ in range(7):
+                count += weights[letter] * popcount(reached & notOwn)
+                reached = shift(reached & empty, dr, dc)
+                if not reached.any():
+                    break
+
+    if weights['P']:
+        pawns = pieceBoards[base]
+        push, captures = PAWN_STEPS[color]
+        single = shift(pawns, push, 0) & empty
+        startRow = np.uint64(0xFF << (8 * (5 if color == 'w' else 2)))  # where a double push passes
+        moves = popcount(single) + popcount(shift(single & startRow, push, 0) & empty)
+        moves += sum(popcount(shift(pawns, dr, dc) & enemy) for dr, dc in captures)
+        count += weights['P'] * moves
+    return count
+
+
+def evaluate(encoded):
+    """int32 scores of every position, from the side to move, in getAlphaBetaMove.evaluatePosition units."""
+    requireNumpy()
+    boards = encoded[:, :64].astype(np.intp)
+    whiteToMove = encoded[:, 64] == 0
+    sign = np.where(whiteToMove, 1, -1)
+    score = VALUES[boards, SQUARES].sum(axis=1)
+
+    pieceMaterial = MATERIAL[boards]
+    whiteMaterial = np.where(boards < 6, pieceMaterial, 0).sum(axis=1)
+    blackMaterial = pieceMaterial.sum(axis=1) - whiteMaterial
+    # the side ahead drives the enemy king to the edge and closes in on it
+    whiteAhead = whiteMaterial > blackMaterial
+    whiteKing = (boards == 5).argmax(axis=1)
+    blackKing = (boards == 11).argmax(axis=1)
+    enemyKing = np.where(whiteAhead, blackKing, whiteKing)
+    myKing = np.where(whiteAhead, whiteKing, blackKing)
+    queens = boards == np.where(whiteAhead, 4, 10)[:, None]
+    bonus = (10 - MANHATTAN[myKing, enemyKing]) * 30 + (4 - EDGE_DISTANCE[enemyKing]) * 50
+    bonus += ((8 - MANHATTAN[enemyKing]) * queens).sum(axis=1) * 40
+    bonus = np.where(whiteAhead, bonus, -bonus)
+    score += np.where(np.abs(whiteMaterial - blackMaterial) > MOP_UP_MARGIN, bonus, 0)
+
+    pieceBoards = bitboards(encoded)
+    score += (mobility(encoded, 'w', MOBILITY_WEIGHTS, pieceBoards)
+              - mobility(encoded, 'b', MOBILITY_WEIGHTS, pieceBoards))
+    return (sign * score).astype(np.int32)
+
+
+def evaluateChildren(gs, moves):
+    """Scores of the positions after each move, from the point of view of the side to move in gs."""
+    requireNumpy()
+    children = []
+    for move in moves:
+        gs.makeMove(move)
+        children.append(gs.toCompact())
+        gs.undoMove()
+    if not children:
+        return np.zeros(0, dtype=np.int32)
+    return -evaluate(encode(children))
+
+
+def readPositions(stream):
+    """Yield (fen, GameState) for each FEN or EPD line; EPD operations and missing counters are ignored."""
+    for line in stream:
+        fields = line.split()
+        if len(fields) < 4 or line.startswith('#'):
+            continue
+        fen = ' '.join(fields[:4]) + ' 0 1'
+        yield fen, ChessEngine.GameState.fromFEN(fen)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a file of FEN/EPD positions in batches")
+    parser.add_argument("positions", help="FEN or EPD file, - for stdin")
+    parser.add_argument("-o", "--out", help="write 'score fen' lines here instead of stdout")
+    parser.add_argument("--batch", type=int, default=4096, help="positions per evaluate call")
+    args = parser.parse_args(argv)
+    requireNumpy()
+
+    stream = sys.stdin if args.positions == '-' else open(args.positions)
+    out = open(args.out, "w") if args.out else sys.stdout
+    total, seconds = 0, 0.0
+
+    def flush(batch):
+        nonlocal total, seconds
+        start = time.perf_counter()
+        scores = evaluate(encode(gs for _, gs in batch))
+        seconds += time.perf_counter() - start
+        total += len(batch)
+        for (fen, _), score in zip(batch, scores):
+            out.write(f"{int(score)} {fen}\n")
+
+    try:
+        batch = []
+        for position in readPositions(stream):
+            batch.append(position)
+            if len(batch) >= args.batch:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if out is not sys.stdout:
+            out.close()
+    print(f"{total} positions, {total / seconds if seconds else 0:.0f} positions/s evaluating",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Precomputed bitboard tables shared by the engine.
+
+Squares are numbered sq = row * 8 + col, using the same rows and columns as
+GameState.board, so bit 0 is a8 and bit 63 is h1. White pawns move towards
+lower square numbers.
+"""
+
+FULL = (1 << 64) - 1
+
+# (row, col) tuple for every square, reused by Move construction
+SQUARE_COORDS = [(sq >> 3, sq & 7) for sq in range(64)]
+SQUARE_BITS = [1 << sq for sq in range(64)]
+
+ROW_MASKS = [0xFF << (8 * r) for r in range(8)]
+COL_MASKS = [0x0101010101010101 << c for c in range(8)]
+
+
+def _stepAttacks(offsets):
+    table = []
+    for sq in range(64):
+        r, c = SQUARE_COORDS[sq]
+        bb = 0
+        for dr, dc in offsets:
+            nr, nc = r + dr, c + dc
+            if 0 <= nr < 8 and 0 <= nc < 8:
+                bb |= 1 << (nr * 8 + nc)
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _stepAttacks([(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                               (1, -2), (1, 2), (2, -1), (2, 1)])
+KING_ATTACKS = _stepAttacks([(-1, -1), (-1, 0), (-1, 1), (0, -1),
+                             (0, 1), (1, -1), (1, 0), (1, 1)])
+# squares attacked by a pawn of the given colour standing on sq
+PAWN_ATTACKS = {
+    'w': _stepAttacks([(-1, -1), (-1, 1)]),
+    'b': _stepAttacks([(1, -1), (1, 1)]),
+}
+
+
+def _rays(dr, dc):
+    table = []
+    for sq in range(64):
+        r, c = SQUARE_COORDS[sq]
+        bb = 0
+        r, c = r + dr, c + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            bb |= 1 << (r * 8 + c)
+            r, c = r + dr, c + dc
+        table.append(bb)
+    return table
+
+
+# Rays pointing to higher square numbers stop at the lowest blocker, rays
+# pointing to lower square numbers stop at the highest blocker.
+RAY_S, RAY_E, RAY_SE, RAY_SW = _rays(1, 0), _rays(0, 1), _rays(1, 1), _rays(1, -1)
+RAY_N, RAY_W, RAY_NW, RAY_NE = _rays(-1, 0), _rays(0, -1), _rays(-1, -1), _rays(-1, 1)
+
+ROOK_RAYS_POS = [(RAY_S[sq], RAY_S, RAY_E[sq], RAY_E) for sq in range(64)]
+ROOK_RAYS_NEG = [(RAY_N[sq], RAY_N, RAY_W[sq], RAY_W) for sq in range(64)]
+BISHOP_RAYS_POS = [(RAY_SE[sq], RAY_SE, RAY_SW[sq], RAY_SW) for sq in range(64)]
+BISHOP_RAYS_NEG = [(RAY_NW[sq], RAY_NW, RAY_NE[sq], RAY_NE) for sq in range(64)]
+
+ROOK_MASKS = [RAY_N[sq] | RAY_S[sq] | RAY_E[sq] | RAY_W[sq] for sq in range(64)]
+BISHOP_MASKS = [RAY_NE[sq] | RAY_NW[sq] | RAY_SE[sq] | RAY_SW[sq] for sq in range(64)]
+
+
+def rookAttacks(sq, occ):
+    a1, t1, a2, t2 = ROOK_RAYS_POS[sq]
+    b = a1 & occ
+    if b:
+        a1 ^= t1[(b & -b).bit_length() - 1]
+    b = a2 & occ
+    if b:
+        a2 ^= t2[(b & -b).bit_length() - 1]
+    attacks = a1 | a2
+    a1, t1, a2, t2 = ROOK_RAYS_NEG[sq]
+    b = a1 & occ
+    if b:
+        a1 ^= t1[b.bit_length() - 1]
+    b = a2 & occ
+    if b:
+        a2 ^= t2[b.bit_length() - 1]
+    return attacks | a1 | a2
+
+
+def bishopAttacks(sq, occ):
+    a1, t1, a2, t2 = BISHOP_RAYS_POS[sq]
+    b = a1 & occ
+    if b:
+        a1 ^= t1[(b & -b).bit_length() - 1]
+    b = a2 & occ
+    if b:
+        a2 ^= t2[(b & -b).bit_length() - 1]
+    attacks = a1 | a2
+    a1, t1, a2, t2 = BISHOP_RAYS_NEG[sq]
+    b = a1 & occ
+    if b:
+        a1 ^= t1[b.bit_length() - 1]
+    b = a2 & occ
+    if b:
+        a2 ^= t2[b.bit_length() - 1]
+    return attacks | a1 | a2
+
+
+def queenAttacks(sq, occ):
+    return rookAttacks(sq, occ) | bishopAttacks(sq, occ)
+
+
+def iterBits(bb):
+    """Yield the square index of every set bit, lowest first."""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _between(a, b):
+    ra, ca = SQUARE_COORDS[a]
+    rb, cb = SQUARE_COORDS[b]
+    dr, dc = rb - ra, cb - ca
+    if a == b or not (dr == 0 or dc == 0 or abs(dr) == abs(dc)):
+        return 0
+    dr, dc = (dr > 0) - (dr < 0), (dc > 0) - (dc < 0)
+    bb = 0
+    r, c = ra + dr, ca + dc
+    while (r, c) != (rb, cb):
+        bb |= 1 << (r * 8 + c)
+        r, c = r + dr, c + dc
+    return bb
+
+
+# squares strictly between two squares on a shared rank, file or diagonal, 0 otherwise
+BETWEEN = [[_between(a, b) for b in range(64)] for a in range(64)]
@@ -0,0 +1,162 @@
+"""Binary opening book, memory-mapped and searched by position hash.
+
+The file is an 8-byte magic followed by fixed 12-byte entries
+(zobrist key: u64, move squares: u16, weight: u16), little endian and sorted by
+key, so a lookup is a binary search over the mapped file and opening a book of
+millions of entries costs nothing up front. The move squares are the low 12
+bits of Move.code (start square | end square << 6).
+
+    python ChessBook.py build games.pgn more.pgn -o book.bin --plies 20
+    python ChessBook.py build lines.txt -o book.bin     # one game per line, SAN or e2e4 notation
+    python ChessBook.py probe book.bin -m e2e4 e7e5
+
+Keys are GameState.zobristKey values, which are seeded and stable between runs.
+"""
+import argparse
+import mmap
+import random
+import struct
+import sys
+
+import ChessEngine
+from ChessEngine import SQUARES_MASK
+from ChessPGN import parseMove, readGames
+
+MAGIC = b"CHSBOOK1"
+ENTRY = struct.Struct("<QHH")
+KEY = struct.Struct("<Q")
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not an opening book")
+        size = self.file.seek(0, 2)
+        self.count = (size - len(MAGIC)) // ENTRY.size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else b""
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, key):
+        """[(move squares, weight)] stored for key, empty if the position is not in the book."""
+        data, offset, size = self.data, len(MAGIC), ENTRY.size
+        low, high = 0, self.count
+        while low < high:  # first entry with a key >= key
+            mid = (low + high) // 2
+            if KEY.unpack_from(data, offset + mid * size)[0] < key:
+                low = mid + 1
+            else:
+                high = mid
+        entries = []
+        while low < self.count:
+            entryKey, squares, weight = ENTRY.unpack_from(data, offset + low * size)
+            if entryKey != key:
+                break
+            entries.append((squares, weight))
+            low += 1
+        return entries
+
+    def chooseMove(self, gs, validMoves, rng=random):
+        """A book move for gs picked with probability proportional to its weight, or None."""
+        entries = self.lookup(gs.zobristKey)
+        if not entries:
+            return None
+        bySquares = {move.code & SQUARES_MASK: move for move in validMoves}
+        candidates = [(bySquares[squares], weight) for squares, weight in entries if squares in bySquares]
+        if not candidates:
+            return None
+        pick = rng.uniform(0, sum(weight for _, weight in candidates))
+        for move, weight in candidates:
+            pick -= weight
+            if pick <= 0:
+                return move
+        return candidates[-1][0]
+
+
+def gamesFromFile(path):
+    """Yield the move tokens of each game in a PGN file, or of each line of a move-list file."""
+    with open(path) as stream:
+        if path.lower().endswith(".pgn"):
+            for _, tokens, _ in readGames(stream):
+                yield tokens
+        else:
+            for line in stream:
+                if line.strip():
+                    yield line.split()
+
+
+def buildBook(games, path, plies=20, min_count=1):
+    """Write a book of the first plies moves of games (iterables of move tokens); return the entry count.
+
+    A game is cut at the first move the engine cannot play, such as castling."""
+    counts = {}
+    for tokens in games:
+        gs = ChessEngine.GameState()
+        for token in tokens[:plies]:
+            move = parseMove(gs, token)
+            if move is None:
+                break
+            entry = (gs.zobristKey, move.code & SQUARES_MASK)
+            counts[entry] = counts.get(entry, 0) + 1
+            gs.makeMove(move)
+    entries = sorted((key, squares, min(count, 0xFFFF)) for (key, squares), count in counts.items()
+                     if count >= min_count)
+    with open(path, "wb") as out:
+        out.write(MAGIC)
+        for entry in entries:
+            out.write(ENTRY.pack(*entry))
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or probe an opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile PGN or move-list files into a book")
+    build.add_argument("files", nargs="+")
+    build.add_argument("-o", "--out", default="book.bin")
+    build.add_argument("--plies", type=int, default=20, help="moves per game that go into the book")
+    build.add_argument("--min-count", type=int, default=1, help="drop moves played fewer times than this")
+    probe = commands.add_parser("probe", help="list the book moves after a line")
+    probe.add_argument("book")
+    probe.add_argument("-m", "--moves", nargs="*", default=[])
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        games = (tokens for path in args.files for tokens in gamesFromFile(path))
+        count = buildBook(games, args.out, args.plies, args.min_count)
+        print(f"{args.out}: {count} entries")
+        return 0
+
+    gs = ChessEngine.GameState()
+    for token in args.moves:
+        move = parseMove(gs, token)
+        if move is None:
+            print(f"illegal move {token}", file=sys.stderr)
+            return 1
+        gs.makeMove(move)
+    with OpeningBook(args.book) as book:
+        entries = book.lookup(gs.zobristKey)
+    total = sum(weight for _, weight in entries)
+    for squares, weight in sorted(entries, key=lambda entry: -entry[1]):
+        move = ChessEngine.Move.fromCode(squares)
+        print(f"{move.getchessnotion()}  {weight:>6}  {weight / total:6.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""Run EPD test suites through the searchers on a process pool.
+
+Each line of an EPD file is a position (the first four FEN fields) followed by
+operations such as bm (best moves), am (moves to avoid) and id. Lines are read
+as a stream and handed to the workers a few at a time, so suites of any length
+start reporting at once:
+
+    python ChessEPD.py wac.epd -t 2 -w 8
+    python ChessEPD.py wac.epd -e pvs -d 6 -o results.jsonl
+
+A position is solved when the move played is one of bm and none of am. Its
+time and nodes to solution are those of the first completed iteration from
+which the searcher kept a correct move to the end. Positions whose solution is
+castling, or under-promotion, cannot be played by the engine and are skipped,
+as are lines that do not read as a legal position: they get a record with the
+reason, and the rest of the suite runs on.
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import re
+import sys
+import time
+
+import ChessEngine
+from ChessAi import getAlphaBetaMove, getPVSMove
+from ChessPGN import parseMove
+
+ENGINES = {'alphabeta': getAlphaBetaMove, 'pvs': getPVSMove}
+OPERATION = re.compile(r'(\w+)\s*((?:"[^"]*"|[^;])*);')
+
+_searcher = None
+
+
+def parseEPD(line):
+    """(fen, {opcode: [operands]}) for an EPD line."""
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"bad EPD line {line!r}")
+    fen = ' '.join(fields[:4]) + ' 0 1'
+    operations = {}
+    for opcode, operands in OPERATION.findall(fields[4] if len(fields) > 4 else ''):
+        operands = operands.strip()
+        operations[opcode] = [operands.strip('"')] if operands.startswith('"') else operands.split()
+    return fen, operations
+
+
+def initWorker(engine, depth, time_limit, hash_mb):
+    global _searcher
+    _searcher = ENGINES[engine](depth=depth, time_limit=time_limit, hash_mb=hash_mb)
+
+
+def solvePosition(number, line):
+    """Search one EPD line in a worker and return its result record."""
+    try:
+        fen, operations = parseEPD(line)
+    except ValueError as error:
+        return {'line': number, 'id': str(number), 'skipped': str(error)}
+    record = {'line': number, 'id': operations.get('id', [str(number)])[0], 'fen': fen,
+              'bm': operations.get('bm', []), 'am': operations.get('am', [])}
+    try:
+        gs = ChessEngine.GameState.fromFEN(fen)
+    except ValueError as error:
+        record['skipped'] = str(error)
+        return record
+    validMoves = gs.getValidMoves()
+    if not validMoves:
+        record['skipped'] = 'no legal moves'
+        return record
+    best = [parseMove(gs, san, validMoves) for san in record['bm']]
+    avoid = [parseMove(gs, san, validMoves) for san in record['am']]
+    if None in best or None in avoid or not (best or avoid):
+        record['skipped'] = 'no playable bm/am'
+        return record
+
+    def correct(move):
+        return (not best or move in best) and move not in avoid
+
+    _searcher.tt.clear()
+    start = time.perf_counter()
+    move = _searcher(gs, validMoves)
+    elapsed = time.perf_counter() - start
+    record.update(move=move.getchessnotion(), solved=correct(move), time=elapsed,
+                  nodes=_searcher.nodes_evaluated, depth=_searcher.completed_depth,
+                  time_to_solution=None, nodes_to_solution=None)
+    if record['solved']:
+        found = len(_searcher.iterations)
+        while found > 0 and correct(_searcher.iterations[found - 1][1]):
+            found -= 1
+        if found < len(_searcher.iterations):
+            _, _, _, nodes, seconds = _searcher.iterations[found]
+            record.update(time_to_solution=seconds, nodes_to_solution=nodes)
+        else:
+            record.update(time_to_solution=elapsed, nodes_to_solution=record['nodes'])
+    return record
+
+
+def runSuite(lines, engine='alphabeta', depth=64, time_limit=2.0, workers=None, hash_mb=16):
+    """Yield a result record per position as the workers finish them, reading lines lazily."""
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=initWorker,
+                                                initargs=(engine, depth, time_limit, hash_mb)) as pool:
+        pending = set()
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            pending.add(pool.submit(solvePosition, number, line))
+            if len(pending) >= 2 * workers:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an EPD test suite through a ChessAi searcher")
+    parser.add_argument("epd", help="EPD file, - for stdin")
+    parser.add_argument("-e", "--engine", choices=sorted(ENGINES), default='alphabeta')
+    parser.add_argument("-d", "--depth", type=int, default=64, help="maximum iterative deepening depth")
+    parser.add_argument("-t", "--time", type=float, default=2.0, help="seconds per position")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--hash", type=float, default=16, help="transposition table MB per worker")
+    parser.add_argument("-o", "--out", help="JSON-lines file for the per-position records")
+    args = parser.parse_args(argv)
+
+    stream = sys.stdin if args.epd == '-' else open(args.epd)
+    out = open(args.out, "a") if args.out else None
+    total = solved = skipped = nodes = 0
+    seconds = solution_time = 0.0
+    try:
+        for record in runSuite(stream, args.engine, args.depth, args.time, args.workers, args.hash):
+            if out is not None:
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+            if 'skipped' in record:
+                skipped += 1
+                print(f"{record['id']:<16} skipped: {record['skipped']}")
+                continue
+            total += 1
+            nodes += record['nodes']
+            seconds += record['time']
+            if record['solved']:
+                solved += 1
+                solution_time += record['time_to_solution']
+            status = f"ok  {record['time_to_solution']:.2f}s" if record['solved'] else "FAIL"
+            print(f"{record['id']:<16} {record['move']:<6} {status:<12} depth {record['depth']:>2}  "
+                  f"nodes {record['nodes']:>9}")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if out is not None:
+            out.close()
+    if total:
+        print(f"\nsolved {solved}/{total} ({solved / total:.1%}), skipped {skipped}, "
+              f"mean time to solution {solution_time / solved if solved else 0:.2f}s, "
+              f"nodes {nodes}, {nodes / seconds if seconds else 0:.0f} nps")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,142 @@
+import random
+from collections import OrderedDict
+
+from ChessBitboards import (FULL, SQUARE_COORDS, SQUARE_BITS, ROW_MASKS, COL_MASKS, KNIGHT_ATTACKS,
+                            KING_ATTACKS, PAWN_ATTACKS, ROOK_MASKS, BISHOP_MASKS, BETWEEN, rookAttacks,
+                            bishopAttacks)
+
+PIECES = ('wP', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bP', 'bN', 'bB', 'bR', 'bQ', 'bK')
+MOVE_PIECES = PIECES + ("--",)
+PIECE_CODES = {piece: i for i, piece in enumerate(MOVE_PIECES)}
+EMPTY_CODE = PIECE_CODES["--"]
+
+# Move.code layout: bits 0-5 start square, 6-11 end square, 12-15 piece moved,
+# 16-19 piece captured (12 for none), then the en passant and promotion flags
+SQUARES_MASK = 0xFFF
+EN_PASSANT_FLAG = 1 << 20
+PROMOTION_FLAG = 1 << 21
+
+newMove = object.__new__  # generators fill in Move.code directly instead of calling Move()
+
+# Zobrist keys, seeded so position hashes are stable between runs and processes
+_zobristRandom = random.Random(20240611)
+ZOBRIST_PIECES = {piece: [_zobristRandom.getrandbits(64) for _ in range(64)] for piece in PIECES}
+ZOBRIST_BLACK_TO_MOVE = _zobristRandom.getrandbits(64)
+ZOBRIST_EN_PASSANT = [_zobristRandom.getrandbits(64) for _ in range(8)]  # by file
+
+# material and piece-square values kept up to date by makeMove/undoMove
+PIECE_VALUES = {'P': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+# exchange values for staticExchange, the king may only take last
+EXCHANGE_VALUES = dict(PIECE_VALUES, K=20000)
+# from white's side, first row is rank 8 like GameState.board
+PIECE_SQUARE_TABLES = {
+    'P': [0, 0, 0, 0, 0, 0, 0, 0,
+          50, 50, 50, 50, 50, 50, 50, 50,
+          10, 10, 20, 30, 30, 20, 10, 10,
+          5, 5, 10, 25, 25, 10, 5, 5,
+          0, 0, 0, 20, 20, 0, 0, 0,
+          5, -5, -10, 0, 0, -10, -5, 5,
+          5, 10, 10, -20, -20, 10, 10, 5,
+          0, 0, 0, 0, 0, 0, 0, 0],
+    'N': [-50, -40, -30, -30, -30, -30, -40, -50,
+          -40, -20, 0, 0, 0, 0, -20, -40,
+          -30, 0, 10, 15, 15, 10, 0, -30,
+          -30, 5, 15, 20, 20, 15, 5, -30,
+          -30, 0, 15, 20, 20, 15, 0, -30,
+          -30, 5, 10, 15, 15, 10, 5, -30,
+          -40, -20, 0, 5, 5, 0, -20, -40,
+          -50, -40, -30, -30, -30, -30, -40, -50],
+    'B': [-20, -10, -10, -10, -10, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 10, 10, 5, 0, -10,
+          -10, 5, 5, 10, 10, 5, 5, -10,
+          -10, 0, 10, 10, 10, 10, 0, -10,
+          -10, 10, 10, 10, 10, 10, 10, -10,
+          -10, 5, 0, 0, 0, 0, 5, -10,
+          -20, -10, -10, -10, -10, -10, -10, -20],
+    'R': [0, 0, 0, 0, 0, 0, 0, 0,
+          5, 10, 10, 10, 10, 10, 10, 5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          0, 0, 0, 5, 5, 0, 0, 0],
+    'Q': [-20, -10, -10, -5, -5, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 5, 5, 5, 0, -10,
+          -5, 0, 5, 5, 5, 5, 0, -5,
+          0, 0, 5, 5, 5, 5, 0, -5,
+          -10, 5, 5, 5, 5, 5, 0, -10,
+          -10, 0, 5, 0, 0, 0, 0, -10,
+          -20, -10, -10, -5, -5, -10, -10, -20],
+    'K': [-30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -20, -30, -30, -40, -40, -30, -30, -20,
+          -10, -20, -20, -20, -20, -20, -20, -10,
+          20, 20, 0, 0, 0, 0, 20, 20,
+          20, 30, 10, 0, 0, 10, 30, 20],
+}
+# per piece and square, black reads the white table mirrored top to bottom
+PIECE_SQUARE_VALUES = {piece: [PIECE_SQUARE_TABLES[piece[1]][sq if piece[0] == 'w' else sq ^ 56]
+                               for sq in range(64)] for piece in PIECES}
+
+# positions whose legal moves a GameState remembers
+MOVE_CACHE_SIZE = 4096
+
+
+class MoveCache:
+    """Bounded LRU of (zobrist key, legal move codes, checkmate, stalemate) entries by key.
+
+    The moves of a position depend only on what the key covers (pieces, side to
+    move, en passant file; there is no castling), so entries stay valid whatever
+    line of play reaches the position again. Moves are kept as a tuple of
+    Move.code ints rather than Move objects, which the garbage collector would
+    otherwise have to scan on every collection. A cache may be shared by
+    GameStates on different threads, as ChessBackground does; the hit and miss
+    counts are then approximate."""
+    def __init__(self, size=MOVE_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        try:
+            self.entries.move_to_end(key)
+        except KeyError:
+            pass  # evicted meanwhile by a put on another thread sharing the cache, the entry is still good
+        self.hits += 1
+        return entry
+
+    def put(self, entry):
+        if self.size <= 0:
+            return
+        self.entries[entry[0]] = entry
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {'size': self.size, 'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
 class GameState():
     def __init__(self):
         #8x8 board 2d list 2 chars first: color, second:type of piece, --:blank space
+        #the board is a view kept in sync with the bitboards by makeMove/undoMove
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
             ["bP", "bP", "bP", "bP", "bP", "bP", "bP", "bP"],  
@@ -23,223 +159,685 @@ class GameState():
         self.movelog = []
         self.whiteKingLocation = (7, 4)
         self.blackKingLocation = (0, 4)
-        self.whitePieces = self.getAllPieces("w")
-        self.blackPieces = self.getAllPieces("b")
         self.checkmate = False
         self.stalemate = False
         self.enPassantPossible = ()  # coordinates for en passant
+        self.enPassantLog = []  # en passant square before each move in movelog
+        self.zobristLog = []  # zobrist key before each move in movelog
+        self.fenCounters = (0, 1)  # FEN halfmove clock and fullmove number before the first move in movelog
+        self.moveCache = MoveCache()
+        self.syncFromBoard()
 
-    def resetGame(self):
-        self.__init__()  # Reinitialize the game state
+    def resetGame(self, fen=None):
+        self.__init__()  # Reinitialize the game state, with an empty move cache
+        if fen is not None:
+            self.loadFEN(fen)
 
-    
-    def getAllPieces(self, color):
-        pieces = []
+    def syncFromBoard(self):
+        # rebuild everything makeMove/undoMove maintain incrementally from self.board
+        # one 64-bit integer per piece plus one occupancy integer per colour, bit r*8+c is board[r][c]
+        self.bitboards = {piece: 0 for piece in PIECES}
+        self.occupancy = {'w': 0, 'b': 0}
+        self.pieceSquares = {'w': {}, 'b': {}}  # square -> piece, per colour
+        self.material = {'w': 0, 'b': 0}
+        self.pstScore = {'w': 0, 'b': 0}
+        self.validMovesEntry = None  # last moveCache entry looked up, reused while the key matches
         for r in range(8):
             for c in range(8):
-                if self.board[r][c][0] == color:
-                    pieces.append((r, c, self.board[r][c]))
-        return pieces
+                piece = self.board[r][c]
+                if piece != "--":
+                    sq = r * 8 + c
+                    color = piece[0]
+                    self.bitboards[piece] |= SQUARE_BITS[sq]
+                    self.occupancy[color] |= SQUARE_BITS[sq]
+                    self.pieceSquares[color][sq] = piece
+                    self.material[color] += PIECE_VALUES[piece[1]]
+                    self.pstScore[color] += PIECE_SQUARE_VALUES[piece][sq]
+                    if piece == 'wK':
+                        self.whiteKingLocation = (r, c)
+                    elif piece == 'bK':
+                        self.blackKingLocation = (r, c)
+        self.zobristKey = self.computeZobristKey()
+
+    def toCompact(self):
+        # 66 bytes: piece code per square, side to move, en passant square (64 for none)
+        data = bytearray([EMPTY_CODE]) * 64
+        for color in ('w', 'b'):
+            for sq, piece in self.pieceSquares[color].items():
+                data[sq] = PIECE_CODES[piece]
+        data.append(0 if self.whiteToMove else 1)
+        data.append(self.enPassantPossible[0] * 8 + self.enPassantPossible[1] if self.enPassantPossible else 64)
+        return bytes(data)
+
+    @classmethod
+    def fromCompact(cls, data):
+        # a fresh GameState at the position written by toCompact, with an empty move log
+        gs = cls()
+        gs.board = [[MOVE_PIECES[data[r * 8 + c]] for c in range(8)] for r in range(8)]
+        gs.whiteToMove = data[64] == 0
+        gs.enPassantPossible = SQUARE_COORDS[data[65]] if data[65] < 64 else ()
+        gs.syncFromBoard()
+        return gs
+
+    @classmethod
+    def fromFEN(cls, fen):
+        gs = cls()
+        gs.loadFEN(fen)
+        return gs
+
+    def loadFEN(self, fen):
+        # castling rights are read and dropped, the engine has no castling
+        fields = fen.split()
+        if len(fields) < 2:
+            raise ValueError(f"bad FEN {fen!r}")
+        ranks = fields[0].split('/')
+        board = []
+        for rank in ranks:
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(["--"] * int(char))
+                elif char.upper() in 'PNBRQK':
+                    row.append(('w' if char.isupper() else 'b') + char.upper())
+                else:
+                    raise ValueError(f"bad FEN {fen!r}")
+            board.append(row)
+        if len(board) != 8 or any(len(row) != 8 for row in board) or fields[1] not in ('w', 'b'):
+            raise ValueError(f"bad FEN {fen!r}")
+        if sum(row.count('wK') for row in board) != 1 or sum(row.count('bK') for row in board) != 1:
+            raise ValueError(f"FEN needs one king per side: {fen!r}")
+        if 'wP' in board[0] + board[7] or 'bP' in board[0] + board[7]:
+            raise ValueError(f"FEN has a pawn on the first or last rank: {fen!r}")
+        whiteToMove = fields[1] == 'w'
+        enPassant = ()
+        if len(fields) > 3 and fields[3] != '-':
+            # the square behind a pawn that has just moved two, which the side to move may capture
+            square = fields[3]
+            if len(square) != 2 or square[0] not in Move.filesToCols or square[1] != ('6' if whiteToMove else '3'):
+                raise ValueError(f"bad en passant square in FEN {fen!r}")
+            enPassant = (Move.ranksToRows[square[1]], Move.filesToCols[square[0]])
+            pawnRow = enPassant[0] + (1 if whiteToMove else -1)
+            if board[enPassant[0]][enPassant[1]] != "--" or \
+                    board[pawnRow][enPassant[1]] != ('bP' if whiteToMove else 'wP'):
+                raise ValueError(f"no pawn to take en passant in FEN {fen!r}")
+        self.board = board
+        self.whiteToMove = whiteToMove
+        self.enPassantPossible = enPassant
+        self.fenCounters = (int(fields[4]) if len(fields) > 4 else 0, int(fields[5]) if len(fields) > 5 else 1)
+        self.movelog = []
+        self.enPassantLog = []
+        self.zobristLog = []
+        self.checkmate = False
+        self.stalemate = False
+        self.syncFromBoard()
+
+    def toFEN(self):
+        rows = []
+        for row in self.board:
+            text, empty = "", 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                text += piece[1] if piece[0] == 'w' else piece[1].lower()
+            rows.append(text + (str(empty) if empty else ""))
+        enPassant = "-"
+        if self.enPassantPossible:
+            enPassant = Move.colsToFiles[self.enPassantPossible[1]] + Move.rowsToRanks[self.enPassantPossible[0]]
+        halfmove, fullmove = self.fenCounters
+        for move in self.movelog:
+            halfmove = 0 if move.pieceCaptured != "--" or move.pieceMoved[1] == 'P' else halfmove + 1
+            if move.pieceMoved[0] == 'b':
+                fullmove += 1
+        return f"{'/'.join(rows)} {'w' if self.whiteToMove else 'b'} - {enPassant} {halfmove} {fullmove}"
+
+    def computeZobristKey(self):
+        # full recomputation, makeMove keeps self.zobristKey up to date incrementally
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                if self.board[r][c] != "--":
+                    key ^= ZOBRIST_PIECES[self.board[r][c]][r * 8 + c]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        if self.enPassantPossible:
+            key ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+        return key
+
+    def getAllPieces(self, color):
+        return [SQUARE_COORDS[sq] + (piece,) for sq, piece in sorted(self.pieceSquares[color].items())]
+
+    @property
+    def whitePieces(self):
+        return self.getAllPieces("w")
+
+    @property
+    def blackPieces(self):
+        return self.getAllPieces("b")
     
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        self.validMovesEntry = None
+        code = move.code
+        startSq = code & 63
+        endSq = (code >> 6) & 63
+        piece = MOVE_PIECES[(code >> 12) & 15]
+        captured = MOVE_PIECES[(code >> 16) & 15]
+        color = piece[0]
+        startRow, startCol = SQUARE_COORDS[startSq]
+        endRow, endCol = SQUARE_COORDS[endSq]
+        board = self.board
+        bitboards = self.bitboards
+        endBit = SQUARE_BITS[endSq]
+        moveBits = SQUARE_BITS[startSq] | endBit
+        board[startRow][startCol] = "--"
+        board[endRow][endCol] = piece
+        bitboards[piece] ^= moveBits
+        self.occupancy[color] ^= moveBits
         self.movelog.append(move)
+        self.enPassantLog.append(self.enPassantPossible)
+        self.zobristLog.append(self.zobristKey)
+        pieceKeys = ZOBRIST_PIECES[piece]
+        key = self.zobristKey ^ pieceKeys[startSq] ^ pieceKeys[endSq] ^ ZOBRIST_BLACK_TO_MOVE
+        if self.enPassantPossible:
+            key ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
         self.whiteToMove = not self.whiteToMove # switch turns
+        ownPieces = self.pieceSquares[color]
+        del ownPieces[startSq]
+        ownPieces[endSq] = piece
+        squareValues = PIECE_SQUARE_VALUES[piece]
+        self.pstScore[color] += squareValues[endSq] - squareValues[startSq]
+        if captured != "--":
+            capturedSq = startSq - startCol + endCol if code & EN_PASSANT_FLAG else endSq
+            enemy = captured[0]
+            del self.pieceSquares[enemy][capturedSq]
+            self.material[enemy] -= PIECE_VALUES[captured[1]]
+            self.pstScore[enemy] -= PIECE_SQUARE_VALUES[captured][capturedSq]
+            bitboards[captured] ^= SQUARE_BITS[capturedSq]
+            self.occupancy[enemy] ^= SQUARE_BITS[capturedSq]
+            key ^= ZOBRIST_PIECES[captured][capturedSq]
+            # En passant
+            if code & EN_PASSANT_FLAG:
+                # print("En passant triggered!")
+                board[startRow][endCol] = "--"
         #if king moves
-        if move.pieceMoved == 'wK':
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == 'bK':
-            self.blackKingLocation = (move.endRow, move.endCol)
+        if piece == 'wK':
+            self.whiteKingLocation = (endRow, endCol)
+        elif piece == 'bK':
+            self.blackKingLocation = (endRow, endCol)
         #if pawn promotion
-        if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'
-        # En passant
-        if move.isEnPassantMove:
-            # print("En passant triggered!")
-            self.board[move.startRow][move.endCol] = "--"
+        if code & PROMOTION_FLAG:
+            queen = color + 'Q'
+            board[endRow][endCol] = queen
+            ownPieces[endSq] = queen
+            self.material[color] += PIECE_VALUES['Q'] - PIECE_VALUES['P']
+            self.pstScore[color] += PIECE_SQUARE_VALUES[queen][endSq] - squareValues[endSq]
+            bitboards[piece] ^= endBit
+            bitboards[queen] ^= endBit
+            key ^= pieceKeys[endSq] ^ ZOBRIST_PIECES[queen][endSq]
        
-        if move.pieceMoved[1] == 'P' and abs(move.startRow - move.endRow) == 2:
-            self.enPassantPossible = ((move.endRow + move.startRow) // 2, move.endCol)  # set en passant square
+        if piece[1] == 'P' and abs(startSq - endSq) == 16:
+            self.enPassantPossible = ((endRow + startRow) // 2, endCol)  # set en passant square
+            key ^= ZOBRIST_EN_PASSANT[endCol]
         else:
             self.enPassantPossible = ()
+        self.zobristKey = key
 
 
     def undoMove(self):
         if len(self.movelog) != 0:
+            self.validMovesEntry = None
             move = self.movelog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            self.enPassantPossible = self.enPassantLog.pop()
+            self.zobristKey = self.zobristLog.pop()
+            code = move.code
+            startSq = code & 63
+            endSq = (code >> 6) & 63
+            piece = MOVE_PIECES[(code >> 12) & 15]
+            captured = MOVE_PIECES[(code >> 16) & 15]
+            color = piece[0]
+            startRow, startCol = SQUARE_COORDS[startSq]
+            endRow, endCol = SQUARE_COORDS[endSq]
+            board = self.board
+            bitboards = self.bitboards
+            endBit = SQUARE_BITS[endSq]
+            moveBits = SQUARE_BITS[startSq] | endBit
+            squareValues = PIECE_SQUARE_VALUES[piece]
+            if code & PROMOTION_FLAG:
+                queen = color + 'Q'
+                bitboards[piece] ^= endBit
+                bitboards[queen] ^= endBit
+                self.material[color] -= PIECE_VALUES['Q'] - PIECE_VALUES['P']
+                self.pstScore[color] -= PIECE_SQUARE_VALUES[queen][endSq] - squareValues[endSq]
+            board[startRow][startCol] = piece
+            board[endRow][endCol] = captured
+            bitboards[piece] ^= moveBits
+            self.occupancy[color] ^= moveBits
             self.whiteToMove = not self.whiteToMove
+            ownPieces = self.pieceSquares[color]
+            del ownPieces[endSq]
+            ownPieces[startSq] = piece
+            self.pstScore[color] -= squareValues[endSq] - squareValues[startSq]
 
             # update king location
-            if move.pieceMoved == "wK":
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == "bK":
-                self.blackKingLocation = (move.startRow, move.startCol)
+            if piece == "wK":
+                self.whiteKingLocation = (startRow, startCol)
+            elif piece == "bK":
+                self.blackKingLocation = (startRow, startCol)
 
-            # undo en passant
-            if move.isEnPassantMove:
-                self.board[move.endRow][move.endCol] = "--"
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
+            if captured != "--":
+                capturedSq = endSq
+                # undo en passant
+                if code & EN_PASSANT_FLAG:
+                    board[endRow][endCol] = "--"
+                    board[startRow][endCol] = captured
+                    capturedSq = startSq - startCol + endCol
+                enemy = captured[0]
+                self.pieceSquares[enemy][capturedSq] = captured
+                self.material[enemy] += PIECE_VALUES[captured[1]]
+                self.pstScore[enemy] += PIECE_SQUARE_VALUES[captured][capturedSq]
+                bitboards[captured] ^= SQUARE_BITS[capturedSq]
+                self.occupancy[enemy] ^= SQUARE_BITS[capturedSq]
 
+    def makeNullMove(self):
+        # passes the turn for null-move pruning, nothing goes into movelog; undo with undoNullMove
+        self.validMovesEntry = None
+        self.enPassantLog.append(self.enPassantPossible)
+        self.zobristLog.append(self.zobristKey)
+        key = self.zobristKey ^ ZOBRIST_BLACK_TO_MOVE
+        if self.enPassantPossible:
+            key ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+            self.enPassantPossible = ()
+        self.zobristKey = key
+        self.whiteToMove = not self.whiteToMove
 
+    def undoNullMove(self):
+        self.validMovesEntry = None
+        self.enPassantPossible = self.enPassantLog.pop()
+        self.zobristKey = self.zobristLog.pop()
+        self.whiteToMove = not self.whiteToMove
 
     def getValidMoves(self):
-        tempEnPassantPossible = self.enPassantPossible  # save current en passant state
-        # Get all possible moves
-        moves = self.getAllPossibleMoves()
-        #make the move
-        for i in range(len(moves)-1, -1, -1):
-            self.makeMove(moves[i])
-            #generate opp moves
-            #check for checks for every op 
-            self.whiteToMove = not self.whiteToMove
-            if self.inCheck():
-                #if in check -> not valid
-                moves.remove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()  # undo the move to restore the board state
+        # the legal moves of a position are generated once and then served from moveCache;
+        # every caller gets its own copy of the list
+        key = self.zobristKey
+        entry = self.validMovesEntry
+        if entry is not None and entry[0] == key:
+            self.moveCache.hits += 1
+        else:
+            cached = self.moveCache.get(key)
+            if cached is None:
+                moves = self.generateValidMoves()
+                entry = (key, moves, self.checkmate, self.stalemate)
+                self.moveCache.put((key, tuple([move.code for move in moves]), self.checkmate, self.stalemate))
+            else:
+                moves = []
+                for code in cached[1]:
+                    move = newMove(Move)
+                    move.code = code
+                    moves.append(move)
+                entry = (key, moves, cached[2], cached[3])
+            self.validMovesEntry = entry
+        _, moves, self.checkmate, self.stalemate = entry
+        return list(moves)
+
+    def generateValidMoves(self):
+        # checkers and pins are found once, then every piece only emits moves that keep the king safe
+        color, enemy = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        bitboards = self.bitboards
+        board = self.board
+        own = self.occupancy[color]
+        occ = own | self.occupancy[enemy]
+        kingBit = bitboards[color + 'K']
+        kingSq = kingBit.bit_length() - 1
+        checkers = self.attackersTo(kingSq, enemy, occ)
+        moves = []
+        if checkers & (checkers - 1):
+            # double check, only the king can move
+            self.addKingMoves(kingSq, own, occ, enemy, moves)
+        else:
+            if checkers:
+                # capture the checker or block the line to it
+                evasionMask = checkers | BETWEEN[kingSq][checkers.bit_length() - 1]
+            else:
+                evasionMask = -1
+            pins = self.getPins(kingSq, color, occ)
+            targetMask = ~own & evasionMask
+            pieces = own
+            while pieces:
+                low = pieces & -pieces
+                sq = low.bit_length() - 1
+                pieces ^= low
+                r, c = SQUARE_COORDS[sq]
+                piece = board[r][c][1]
+                if piece == 'K':
+                    self.addKingMoves(sq, own, occ, enemy, moves)
+                    continue
+                allowed = targetMask & pins[sq] if sq in pins else targetMask
+                if piece == 'P':
+                    self.addLegalPawnMoves(sq, allowed, occ, kingSq, enemy, moves)
+                    continue
+                if piece == 'N':
+                    targets = KNIGHT_ATTACKS[sq]
+                elif piece == 'B':
+                    targets = bishopAttacks(sq, occ)
+                elif piece == 'R':
+                    targets = rookAttacks(sq, occ)
+                else:
+                    targets = rookAttacks(sq, occ) | bishopAttacks(sq, occ)
+                self.addMoves(sq, targets & allowed, moves)
         if len(moves) == 0:
-            if self.inCheck():
+            if checkers:
                 self.checkmate = True
             else:
                 self.stalemate = True
         else:
             self.checkmate = False
             self.stalemate = False
-        self.enPassantPossible = tempEnPassantPossible  # restore en passant state
         return moves
 
+    def mobility(self, weights=None):
+        """(white, black) weighted count of the squares each piece attacks or can move to.
+
+        Read straight off the bitboards in one pass, with no Move objects and no
+        legality test: a piece counts every square it reaches that is not held by its
+        own side, a pawn its free pushes and the enemy pieces it attacks (no en
+        passant). weights maps a piece letter to the worth of one square, 1 each by
+        default; pieces weighted 0 are skipped."""
+        bitboards = self.bitboards
+        occupancy = self.occupancy
+        occ = occupancy['w'] | occupancy['b']
+        empty = ~occ & FULL
+        counts = []
+        for color, enemy in (('w', 'b'), ('b', 'w')):
+            notOwn = ~occupancy[color]
+            total = 0
+            for letter in 'NBRQK':
+                weight = 1 if weights is None else weights[letter]
+                bb = bitboards[color + letter]
+                if not weight or not bb:
+                    continue
+                count = 0
+                while bb:
+                    low = bb & -bb
+                    sq = low.bit_length() - 1
+                    if letter == 'N':
+                        targets = KNIGHT_ATTACKS[sq]
+                    elif letter == 'B':
+                        targets = bishopAttacks(sq, occ)
+                    elif letter == 'R':
+                        targets = rookAttacks(sq, occ)
+                    elif letter == 'Q':
+                        targets = rookAttacks(sq, occ) | bishopAttacks(sq, occ)
+                    else:
+                        targets = KING_ATTACKS[sq]
+                    count += (targets & notOwn).bit_count()
+                    bb ^= low
+                total += weight * count
+            weight = 1 if weights is None else weights['P']
+            pawns = bitboards[color + 'P']
+            if weight and pawns:
+                if color == 'w':  # towards lower squares
+                    single = pawns >> 8 & empty
+                    double = (single & ROW_MASKS[5]) >> 8 & empty
+                    left, right = (pawns & ~COL_MASKS[0]) >> 9, (pawns & ~COL_MASKS[7]) >> 7
+                else:
+                    single = pawns << 8 & empty
+                    double = (single & ROW_MASKS[2]) << 8 & empty
+                    left, right = (pawns & ~COL_MASKS[0]) << 7, (pawns & ~COL_MASKS[7]) << 9
+                targets = occupancy[enemy]
+                total += weight * (single.bit_count() + double.bit_count()
+                                   + (left & targets).bit_count() + (right & targets).bit_count())
+            counts.append(total)
+        return counts[0], counts[1]
+
+    def attackersTo(self, sq, color, occ):
+        # bitboard of the pieces of `color` that attack sq given occupancy occ
+        bitboards = self.bitboards
+        if color == 'w':
+            attackers = PAWN_ATTACKS['b'][sq] & bitboards['wP']
+            attackers |= KNIGHT_ATTACKS[sq] & bitboards['wN'] | KING_ATTACKS[sq] & bitboards['wK']
+            diagonal = bitboards['wB'] | bitboards['wQ']
+            straight = bitboards['wR'] | bitboards['wQ']
+        else:
+            attackers = PAWN_ATTACKS['w'][sq] & bitboards['bP']
+            attackers |= KNIGHT_ATTACKS[sq] & bitboards['bN'] | KING_ATTACKS[sq] & bitboards['bK']
+            diagonal = bitboards['bB'] | bitboards['bQ']
+            straight = bitboards['bR'] | bitboards['bQ']
+        if BISHOP_MASKS[sq] & diagonal:
+            attackers |= bishopAttacks(sq, occ) & diagonal
+        if ROOK_MASKS[sq] & straight:
+            attackers |= rookAttacks(sq, occ) & straight
+        return attackers
+
+    def getPins(self, kingSq, color, occ):
+        # {square of pinned piece: squares it may still move to along the pin}
+        bitboards = self.bitboards
+        enemy = 'b' if color == 'w' else 'w'
+        queens = bitboards[enemy + 'Q']
+        snipers = (ROOK_MASKS[kingSq] & (bitboards[enemy + 'R'] | queens)) | \
+                  (BISHOP_MASKS[kingSq] & (bitboards[enemy + 'B'] | queens))
+        pins = {}
+        own = self.occupancy[color]
+        between = BETWEEN[kingSq]
+        while snipers:
+            low = snipers & -snipers
+            line = between[low.bit_length() - 1]
+            blockers = line & occ
+            if blockers & own and not blockers & (blockers - 1):
+                pins[blockers.bit_length() - 1] = line | low
+            snipers ^= low
+        return pins
+
+    def addKingMoves(self, kingSq, own, occ, enemy, moves):
+        base = kingSq | PIECE_CODES['wK' if enemy == 'b' else 'bK'] << 12
+        board = self.board
+        occ ^= SQUARE_BITS[kingSq]  # the king must not hide behind itself from a slider
+        targets = KING_ATTACKS[kingSq] & ~own
+        while targets:
+            low = targets & -targets
+            sq = low.bit_length() - 1
+            if not self.isAttacked(sq, enemy, occ):
+                r, c = SQUARE_COORDS[sq]
+                move = newMove(Move)
+                move.code = base | sq << 6 | PIECE_CODES[board[r][c]] << 16
+                moves.append(move)
+            targets ^= low
+
+    def addLegalPawnMoves(self, sq, allowed, occ, kingSq, enemy, moves):
+        r, c = SQUARE_COORDS[sq]
+        if self.whiteToMove:
+            step, startRow, lastRankFrom, pawn, enemyPawn = -8, 6, 1, 'wP', 'bP'
+        else:
+            step, startRow, lastRankFrom, pawn, enemyPawn = 8, 1, 6, 'bP', 'wP'
+        base = sq | PIECE_CODES[pawn] << 12
+        if r == lastRankFrom:
+            base |= PROMOTION_FLAG
+        if not SQUARE_BITS[sq + step] & occ:  # move forward
+            if SQUARE_BITS[sq + step] & allowed:
+                move = newMove(Move)
+                move.code = base | (sq + step) << 6 | EMPTY_CODE << 16
+                moves.append(move)
+            if r == startRow and not SQUARE_BITS[sq + 2 * step] & occ \
+                    and SQUARE_BITS[sq + 2 * step] & allowed:
+                move = newMove(Move)
+                move.code = base | (sq + 2 * step) << 6 | EMPTY_CODE << 16  # double move
+                moves.append(move)
+        attacks = PAWN_ATTACKS[pawn[0]][sq]
+        self.addMoves(sq, attacks & self.occupancy[enemy] & allowed, moves, base)  # captures
+        if self.enPassantPossible:
+            epSq = self.enPassantPossible[0] * 8 + self.enPassantPossible[1]
+            if attacks & SQUARE_BITS[epSq]:
+                # two pawns leave the rank at once, so test the resulting occupancy directly
+                capturedBit = SQUARE_BITS[r * 8 + self.enPassantPossible[1]]
+                newOcc = occ ^ SQUARE_BITS[sq] ^ capturedBit | SQUARE_BITS[epSq]
+                if not self.isAttacked(kingSq, enemy, newOcc, ~capturedBit):
+                    move = newMove(Move)
+                    move.code = base | epSq << 6 | PIECE_CODES[enemyPawn] << 16 | EN_PASSANT_FLAG
+                    moves.append(move)
+
     def inCheck(self):
         if self.whiteToMove:
             return self.squareUnderAttack(*self.whiteKingLocation)
         else:
             return self.squareUnderAttack(*self.blackKingLocation)
 
-    def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c:
-                return True 
+    def squareUnderAttack(self, r, c, color=None):
+        # looks outward from (r, c) for attackers, by default those of the side not to move
+        if color is None:
+            color = 'b' if self.whiteToMove else 'w'
+        return self.isAttacked(r * 8 + c, color, self.occupancy['w'] | self.occupancy['b'])
+
+    def getAttackers(self, r, c, color=None):
+        # (row, col, piece) of every piece attacking (r, c), by default those of the side not to move
+        if color is None:
+            color = 'b' if self.whiteToMove else 'w'
+        attackers = self.attackersTo(r * 8 + c, color, self.occupancy['w'] | self.occupancy['b'])
+        pieces = []
+        while attackers:
+            low = attackers & -attackers
+            ar, ac = SQUARE_COORDS[low.bit_length() - 1]
+            pieces.append((ar, ac, self.board[ar][ac]))
+            attackers ^= low
+        return pieces
+
+    def staticExchange(self, move):
+        """Material won by `move` if both sides keep recapturing on its target with their least
+        valuable attacker and either may stop when continuing would lose; negative for losing captures."""
+        code = move.code
+        startSq, targetSq = code & 63, (code >> 6) & 63
+        bitboards = self.bitboards
+        occ = (self.occupancy['w'] | self.occupancy['b']) ^ SQUARE_BITS[startSq]
+        captured = MOVE_PIECES[(code >> 16) & 15]
+        if code & EN_PASSANT_FLAG:
+            occ ^= SQUARE_BITS[(startSq & ~7) | (targetSq & 7)]
+        gains = [EXCHANGE_VALUES[captured[1]] if captured != "--" else 0]
+        onTarget = EXCHANGE_VALUES[MOVE_PIECES[(code >> 12) & 15][1]]
+        if code & PROMOTION_FLAG:
+            gains[0] += EXCHANGE_VALUES['Q'] - EXCHANGE_VALUES['P']
+            onTarget = EXCHANGE_VALUES['Q']
+        color = 'b' if MOVE_PIECES[(code >> 12) & 15][0] == 'w' else 'w'
+        while True:
+            # sliders behind pieces that already took are found through the shrinking occupancy
+            attackers = self.attackersTo(targetSq, color, occ) & occ
+            if not attackers:
+                break
+            for kind in 'PNBRQK':
+                attacker = attackers & bitboards[color + kind]
+                if attacker:
+                    break
+            gains.append(onTarget - gains[-1])
+            if max(-gains[-2], gains[-1]) < 0:
+                gains.pop()  # neither side would go on: the capture is not made and must not count below
+                break
+            occ ^= attacker & -attacker
+            onTarget = EXCHANGE_VALUES[kind]
+            color = 'b' if color == 'w' else 'w'
+        while len(gains) > 1:
+            gain = gains.pop()
+            gains[-1] = -max(-gains[-1], gain)
+        return gains[0]
+
+    def isAttacked(self, sq, color, occ, keep=-1):
+        # True if a piece of `color` attacks sq given occupancy occ, pieces outside keep are ignored
+        bitboards = self.bitboards
+        if color == 'w':
+            if PAWN_ATTACKS['b'][sq] & bitboards['wP'] & keep:
+                return True
+            knights, king = bitboards['wN'], bitboards['wK']
+            diagonal = (bitboards['wB'] | bitboards['wQ']) & keep
+            straight = (bitboards['wR'] | bitboards['wQ']) & keep
+        else:
+            if PAWN_ATTACKS['w'][sq] & bitboards['bP'] & keep:
+                return True
+            knights, king = bitboards['bN'], bitboards['bK']
+            diagonal = (bitboards['bB'] | bitboards['bQ']) & keep
+            straight = (bitboards['bR'] | bitboards['bQ']) & keep
+        if KNIGHT_ATTACKS[sq] & knights & keep or KING_ATTACKS[sq] & king:
+            return True
+        if BISHOP_MASKS[sq] & diagonal and bishopAttacks(sq, occ) & diagonal:
+            return True
+        if ROOK_MASKS[sq] & straight and rookAttacks(sq, occ) & straight:
+            return True
         return False
 
     def getAllPossibleMoves(self):
         moves = []
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                turn = self.board[r][c][0]     
-                if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
-                    piece = self.board[r][c][1]  # get the piece type
-                    self.moveFunctions[piece](r, c, moves)
+        own = self.occupancy['w' if self.whiteToMove else 'b']
+        board = self.board
+        while own:
+            low = own & -own
+            r, c = SQUARE_COORDS[low.bit_length() - 1]
+            self.moveFunctions[board[r][c][1]](r, c, moves)
+            own ^= low
         return moves
 
+    def addMoves(self, sq, targets, moves, base=None):
+        # one Move per target bit, reading the captured piece off the board
+        board = self.board
+        if base is None:
+            r, c = SQUARE_COORDS[sq]
+            base = sq | PIECE_CODES[board[r][c]] << 12
+        while targets:
+            low = targets & -targets
+            end = low.bit_length() - 1
+            r, c = SQUARE_COORDS[end]
+            move = newMove(Move)
+            move.code = base | end << 6 | PIECE_CODES[board[r][c]] << 16
+            moves.append(move)
+            targets ^= low
+
     def getPawnMoves(self, r, c, moves):
+        sq = r * 8 + c
+        occ = self.occupancy['w'] | self.occupancy['b']
         if self.whiteToMove:
-            if self.board[r-1][c] == "--":  # move forward
-                moves.append(Move((r, c), (r-1, c), self.board))
-                if r == 6 and self.board[r-2][c] == "--":  
-                    moves.append(Move((r, c), (r-2, c), self.board))  # double move
-            if c-1 >= 0:
-                if self.board[r-1][c-1][0] == 'b':  # capture left
-                    moves.append(Move((r, c), (r-1, c-1), self.board))
-                elif (r-1, c-1) == self.enPassantPossible:  # en passant left
-                    moves.append(Move((r, c), (r-1, c-1), self.board, isEnPassantMove=True))
-            if c+1 < 8:
-                if self.board[r-1][c+1][0] == 'b':  # capture right
-                    moves.append(Move((r, c), (r-1, c+1), self.board))
-                elif (r-1, c+1) == self.enPassantPossible:  # en passant right
-                    moves.append(Move((r, c), (r-1, c+1), self.board, isEnPassantMove=True))
+            step, startRow, lastRankFrom, pawn, enemyPawn = -8, 6, 1, 'wP', 'bP'
         else:
-            if self.board[r+1][c] == "--":
-                moves.append(Move((r, c), (r+1, c), self.board))
-                if r == 1 and self.board[r+2][c] == "--":
-                    moves.append(Move((r, c), (r+2, c), self.board))
-            if c-1 >= 0:
-                if self.board[r+1][c-1][0] == 'w':  # capture left
-                    moves.append(Move((r, c), (r+1, c-1), self.board))
-                elif (r+1, c-1) == self.enPassantPossible:  # en passant left
-                    moves.append(Move((r, c), (r+1, c-1), self.board, isEnPassantMove=True))
-            if c+1 < 8:
-                if self.board[r+1][c+1][0] == 'w':  # capture right
-                    moves.append(Move((r, c), (r+1, c+1), self.board))
-                elif (r+1, c+1) == self.enPassantPossible:  # en passant right
-                    moves.append(Move((r, c), (r+1, c+1), self.board, isEnPassantMove=True))
+            step, startRow, lastRankFrom, pawn, enemyPawn = 8, 1, 6, 'bP', 'wP'
+        base = sq | PIECE_CODES[pawn] << 12
+        if r == lastRankFrom:
+            base |= PROMOTION_FLAG
+        if not SQUARE_BITS[sq + step] & occ:  # move forward
+            self.addMoves(sq, SQUARE_BITS[sq + step], moves, base)
+            if r == startRow and not SQUARE_BITS[sq + 2 * step] & occ:
+                self.addMoves(sq, SQUARE_BITS[sq + 2 * step], moves, base)  # double move
+        attacks = PAWN_ATTACKS[pawn[0]][sq]
+        self.addMoves(sq, attacks & self.occupancy[enemyPawn[0]], moves, base)  # captures
+        if self.enPassantPossible:
+            epSq = self.enPassantPossible[0] * 8 + self.enPassantPossible[1]
+            if attacks & SQUARE_BITS[epSq] & ~occ:
+                move = newMove(Move)
+                move.code = base | epSq << 6 | PIECE_CODES[enemyPawn] << 16 | EN_PASSANT_FLAG
+                moves.append(move)
 
     def getRookMoves(self, r, c, moves):
-        directions = [(-1, 0), (0, -1), (1, 0), (0, 1)]  # up, left, down, right
-        enemy_color = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):  # up to 7 squares in each direction
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:  # inside board
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece == "--":
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                    elif end_piece[0] == enemy_color:
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                        break  # capture and stop
-                    else:
-                        break  # blocked by own piece
-                else:
-                    break
+        own = self.occupancy['w' if self.whiteToMove else 'b']
+        occ = self.occupancy['w'] | self.occupancy['b']
+        self.addMoves(r * 8 + c, rookAttacks(r * 8 + c, occ) & ~own, moves)
 
     def getKnightMoves(self, r, c, moves):
-        knight_moves = [
-            (-2, -1), (-2, 1),
-            (-1, -2), (-1, 2),
-            (1, -2), (1, 2),
-            (2, -1), (2, 1)
-        ]
-        ally_color = "w" if self.whiteToMove else "b"
-        for m in knight_moves:
-            end_row = r + m[0]
-            end_col = c + m[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
+        own = self.occupancy['w' if self.whiteToMove else 'b']
+        self.addMoves(r * 8 + c, KNIGHT_ATTACKS[r * 8 + c] & ~own, moves)
 
     def getBishopMoves(self, r, c, moves):
-        directions = [(-1, -1), (-1, 1), (1, -1), (1, 1)]  # diagonal
-        enemy_color = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece == "--":
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                    elif end_piece[0] == enemy_color:
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                        break
-                    else:
-                        break
-                else:
-                    break
+        own = self.occupancy['w' if self.whiteToMove else 'b']
+        occ = self.occupancy['w'] | self.occupancy['b']
+        self.addMoves(r * 8 + c, bishopAttacks(r * 8 + c, occ) & ~own, moves)
    
     def getKingMoves(self, r, c, moves):
-        king_moves = [
-            (-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)
-        ]
-        ally_color = "w" if self.whiteToMove else "b"
-        for m in king_moves:
-            end_row = r + m[0]
-            end_col = c + m[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
+        own = self.occupancy['w' if self.whiteToMove else 'b']
+        self.addMoves(r * 8 + c, KING_ATTACKS[r * 8 + c] & ~own, moves)
 
     def getQueenMoves(self, r, c, moves):
         self.getRookMoves(r, c, moves)
         self.getBishopMoves(r, c, moves)
 
 class Move():
+    # a move is one packed int, see the Move.code layout above; the old fields are read from it
+    __slots__ = ('code',)
+
     ranksToRows = {"1": 7, "2": 6, "3": 5, "4": 4, "5": 3, "6": 2, "7": 1, "8": 0}
     rowsToRanks = {v: k for k, v in ranksToRows.items()} # reverse mapping
 
@@ -247,25 +845,72 @@ class Move():
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
     def __init__(self, startSq, endSq, board, isEnPassantMove=False):
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        self.isPawnPromotion = (self.pieceMoved[1] == 'P' and (self.endRow == 0 or self.endRow == 7))
-        self.isEnPassantMove = isEnPassantMove
-        if self.isEnPassantMove:
-            self.pieceCaptured = 'bP' if self.pieceMoved[0] == 'w' else 'wP'
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        pieceMoved = board[startSq[0]][startSq[1]]
+        code = startSq[0] * 8 + startSq[1] | (endSq[0] * 8 + endSq[1]) << 6 | PIECE_CODES[pieceMoved] << 12
+        if isEnPassantMove:
+            code |= PIECE_CODES['bP' if pieceMoved[0] == 'w' else 'wP'] << 16 | EN_PASSANT_FLAG
+        else:
+            code |= PIECE_CODES[board[endSq[0]][endSq[1]]] << 16
+        if pieceMoved[1] == 'P' and (endSq[0] == 0 or endSq[0] == 7):
+            code |= PROMOTION_FLAG
+        self.code = code
+
+    @classmethod
+    def fromCode(cls, code):
+        move = newMove(cls)
+        move.code = code
+        return move
+
+    @property
+    def startRow(self):
+        return (self.code >> 3) & 7
+
+    @property
+    def startCol(self):
+        return self.code & 7
+
+    @property
+    def endRow(self):
+        return (self.code >> 9) & 7
+
+    @property
+    def endCol(self):
+        return (self.code >> 6) & 7
+
+    @property
+    def pieceMoved(self):
+        return MOVE_PIECES[(self.code >> 12) & 15]
+
+    @property
+    def pieceCaptured(self):
+        return MOVE_PIECES[(self.code >> 16) & 15]
+
+    @property
+    def isPawnPromotion(self):
+        return bool(self.code & PROMOTION_FLAG)
+
+    @property
+    def isEnPassantMove(self):
+        return bool(self.code & EN_PASSANT_FLAG)
+
+    @property
+    def moveID(self):
+        code = self.code
+        return ((code >> 3) & 7) * 1000 + (code & 7) * 100 + ((code >> 9) & 7) * 10 + ((code >> 6) & 7)
 
     def __eq__(self, other):
         if isinstance(other, Move):
-            return self.moveID == other.moveID
+            return (self.code ^ other.code) & SQUARES_MASK == 0
         return False
 
+    def __hash__(self):
+        return self.code & SQUARES_MASK
+
+    def __repr__(self):
+        return f"Move({self.getchessnotion()})"
+
     def getchessnotion(self):
         return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
 
     def getRankFile(self, r, c):
-        return self.colsToFiles[c] + self.rowsToRanks[r]
\ No newline at end of file
+        return self.colsToFiles[c] + self.rowsToRanks[r]
@@ -1,13 +1,18 @@
 import pygame as p
 import ChessEngine
+import os
 import sys
 import time
 from ChessAi import getRandomMove, getSimpleAlphaBetaMove, getAlphaBetaMove
+from ChessBackground import BackgroundSearch
+from ChessBook import OpeningBook
+from ChessTablebase import Tablebases, DEFAULT_DIRECTORY
 
 WIDTH = HEIGHT = 512
 DIMENSION = 8
 SQ_SIZE = WIDTH // DIMENSION
 MAX_FPS = 15
+BOOK_PATH = "book.bin"  # built with ChessBook.py, the AIs search from move one without it
 IMAGES = {}
 
 def loadImages():
@@ -17,26 +22,18 @@ def loadImages():
         IMAGES[piece] = p.transform.scale(
             p.image.load(f"images/{piece}.png"), (SQ_SIZE, SQ_SIZE))
 
-def drawEndGameText(screen, text):
-    font = p.font.SysFont("Helvetica", 48, True, False)
-    textObject = font.render(text, 0, p.Color('Gray'))
-    textLocation = p.Rect(0, 0, WIDTH, HEIGHT).move(
-        WIDTH/2 - textObject.get_width()/2,
-        HEIGHT/2 - textObject.get_height()/2)
-    screen.blit(textObject, textLocation)
-    p.display.flip()
-
 def main():
     print("Choose a game mode:")
     print("1: Human vs Random AI")
     print("2: Random AI vs Simple Alpha-Beta AI")
     print("3: Simple Alpha-Beta AI vs Optimized Alpha-Beta AI")
-    mode = input("Enter mode number (1-3): ").strip()
-    while mode not in {'1', '2', '3'}:
-        mode = input("Please enter 1, 2, or 3: ").strip()
+    print("4: Human vs Optimized Alpha-Beta AI (thinks on your time)")
+    mode = input("Enter mode number (1-4): ").strip()
+    while mode not in {'1', '2', '3', '4'}:
+        mode = input("Please enter 1, 2, 3, or 4: ").strip()
     mode = int(mode)
 
-    humanIsWhite = True if mode == 1 else None
+    humanIsWhite = True if mode in (1, 4) else None
 
     p.init()
     screen = p.display.set_mode((WIDTH, HEIGHT))
@@ -45,14 +42,24 @@ def main():
     validMoves = gs.getValidMoves()
     moveMade = False
     loadImages()
+    renderer = BoardRenderer(screen)
+    caption = None
     running = True
     sqSelected = ()
     playerClicks = []
     gameOverReported = False
+    search = None  # the AI's move being searched on a background thread
+    ponder = None  # a search of the reply the AI expects, run while the human thinks
 
     # Instantiate AI objects
-    simple_ai = getSimpleAlphaBetaMove(depth=3, time_limit=2.0)
-    aggressive_ai = getAlphaBetaMove(depth=4, time_limit=3.0)
+    book = OpeningBook(BOOK_PATH) if os.path.exists(BOOK_PATH) else None
+    tablebases = Tablebases(DEFAULT_DIRECTORY)  # generated with ChessTablebase.py
+    simple_ai = getSimpleAlphaBetaMove(depth=3, time_limit=2.0, book=book)
+    aggressive_ai = getAlphaBetaMove(depth=4, time_limit=3.0, book=book,
+                                     tablebases=tablebases if tablebases.available else None)
+    # (white, black) per mode; None is the human, random moves are instant and need no thread
+    players = {1: (None, getRandomMove), 2: (getRandomMove, simple_ai),
+               3: (simple_ai, aggressive_ai), 4: (None, aggressive_ai)}[mode]
 
     while running:
         for e in p.event.get():
@@ -78,15 +85,30 @@ def main():
                             move = ChessEngine.Move(playerClicks[0], playerClicks[1], gs.board)
                             for i in range(len(validMoves)):
                                 if move == validMoves[i]:
-                                    gs.makeMove(move)
+                                    gs.makeMove(validMoves[i])
                                     moveMade = True
                                     sqSelected = ()
                                     playerClicks = []
+                                    if ponder is not None:
+                                        if ponder.ponderMove == validMoves[i]:
+                                            ponder.ponderHit()
+                                            search = ponder
+                                        else:
+                                            ponder.cancel()
+                                        ponder = None
                                     break
                             if not moveMade:
                                 playerClicks = [sqSelected]
 
+            elif e.type == p.VIDEOEXPOSE:  # the window was uncovered, its contents may be gone
+                renderer.invalidate()
+
             elif e.type == p.KEYDOWN:
+                if e.key in (p.K_z, p.K_r):
+                    for background in (search, ponder):
+                        if background is not None:
+                            background.cancel()
+                    search = ponder = None
                 if e.key == p.K_z:
                     gs.undoMove()
                     validMoves = gs.getValidMoves()
@@ -104,43 +126,39 @@ def main():
             validMoves = gs.getValidMoves()
             moveMade = False
 
-        # AI moves according to mode
-        if not gs.checkmate and not gs.stalemate:
-            if mode == 1:
-                if humanIsWhite and not gs.whiteToMove:
-                    aiValidMoves = gs.getValidMoves()
-                    if aiValidMoves:
-                        aiMove = getRandomMove(gs)
+        # AI moves according to mode, searched off the UI thread so the board keeps drawing
+        if not gs.checkmate and not gs.stalemate and validMoves:
+            player = players[0 if gs.whiteToMove else 1]
+            if player is getRandomMove:
+                gs.makeMove(getRandomMove(gs))
+                moveMade = True
+                sqSelected = ()
+                playerClicks = []
+            elif player is not None:
+                if search is None:
+                    search = BackgroundSearch(player, gs).start()
+                elif search.done():
+                    aiMove, reply = search.move(), search.predictedReply()
+                    search = None
+                    if aiMove in validMoves:
                         gs.makeMove(aiMove)
                         moveMade = True
                         sqSelected = ()
                         playerClicks = []
-
-            elif mode == 2:
-                aiValidMoves = gs.getValidMoves()
-                if aiValidMoves:
-                    if gs.whiteToMove:
-                        aiMove = getRandomMove(gs)
-                    else:
-                        aiMove = simple_ai(gs, aiValidMoves)
-                    gs.makeMove(aiMove)
-                    moveMade = True
-                    sqSelected = ()
-                    playerClicks = []
-
-            elif mode == 3:
-                aiValidMoves = gs.getValidMoves()
-                if aiValidMoves:
-                    if gs.whiteToMove:
-                        aiMove = simple_ai(gs, aiValidMoves)
-                    else:
-                        aiMove = aggressive_ai(gs, aiValidMoves)
-                    gs.makeMove(aiMove)
-                    moveMade = True
-                    sqSelected = ()
-                    playerClicks = []
-
-        drawGameState(gs, screen, validMoves, sqSelected)
+                        if mode == 4 and reply is not None:
+                            ponder = BackgroundSearch(player, gs, reply).start()
+        if search is not None:
+            info = search.info()
+            newCaption = f"Chess - thinking: depth {info['depth']}  nodes {info['nodes']}  {info['pv']}"
+        elif ponder is not None:
+            info = ponder.info()
+            newCaption = (f"Chess - pondering {ponder.ponderMove.getchessnotion()}: "
+                          f"depth {info['depth']}  nodes {info['nodes']}  {info['pv']}")
+        else:
+            newCaption = "Chess"
+        if newCaption != caption:
+            p.display.set_caption(newCaption)
+            caption = newCaption
 
         # End-game reporting printed once at overall end
         if (gs.checkmate or gs.stalemate) and not gameOverReported:
@@ -150,6 +168,8 @@ def main():
                     winner_agent = "Random AI" if winner == "White" else "Simple Alpha-Beta AI"
                 elif mode == 3:
                     winner_agent = "Simple Alpha-Beta AI" if winner == "White" else "Optimized Alpha-Beta AI"
+                elif mode == 4:
+                    winner_agent = "Human" if winner == "White" else "Optimized Alpha-Beta AI"
                 else:
                     winner_agent = winner  # For mode 1 or others
 
@@ -158,45 +178,84 @@ def main():
                 print("Stalemate! The game is a draw.")
             gameOverReported = True
 
-        if gs.checkmate:
-            drawEndGameText(screen, "Checkmate! Game over.")
-        elif gs.stalemate:
-            drawEndGameText(screen, "Stalemate! Game over.")
+        endText = "Checkmate! Game over." if gs.checkmate else "Stalemate! Game over." if gs.stalemate else None
+        rects = renderer.render(gs, validMoves, sqSelected, endText)
+        if rects:
+            p.display.update(rects)
 
         clock.tick(MAX_FPS)
-        p.display.flip()
-
-def drawGameState(gs, screen, validMoves, sqSelected):
-    drawBoard(screen)
-    highlightSquares(screen, gs, validMoves, sqSelected)
-    drawPieces(gs, screen)
-
-def drawBoard(screen):
-    colors = [p.Color("white"), p.Color("blueviolet")]
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            color = colors[(r + c) % 2]
-            p.draw.rect(screen, color, p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
-
-def drawPieces(gs, screen):
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            piece = gs.board[r][c]
-            if piece != "--":
-                screen.blit(IMAGES[piece], p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
-
-def highlightSquares(screen, gs, validMoves, sqSelected):
+
+class BoardRenderer:
+    """Draws the game onto screen, repainting only the squares that changed since the last frame.
+
+    The empty board, the highlight overlays and the end-game font are built once;
+    each frame compares the pieces and highlights with what is on screen and
+    returns the rectangles it repainted, for p.display.update."""
+    def __init__(self, screen):
+        self.screen = screen
+        self.board = p.Surface((WIDTH, HEIGHT))
+        colors = [p.Color("white"), p.Color("blueviolet")]
+        for r in range(DIMENSION):
+            for c in range(DIMENSION):
+                p.draw.rect(self.board, colors[(r + c) % 2], squareRect(r, c))
+        self.overlays = {}
+        for name, color in (('selected', 'yellow'), ('target', 'lime')):
+            overlay = p.Surface((SQ_SIZE, SQ_SIZE))
+            overlay.set_alpha(100)
+            overlay.fill(p.Color(color))
+            self.overlays[name] = overlay
+        self.font = p.font.SysFont("Helvetica", 48, True, False)
+        self.texts = {}  # rendered end-game messages
+        self.shown = None  # (pieces, highlights) on screen, None forces a full repaint
+        self.shownText = None
+
+    def invalidate(self):
+        self.shown = None
+
+    def render(self, gs, validMoves, sqSelected, text=None):
+        pieces = [piece for row in gs.board for piece in row]
+        highlights = highlightedSquares(gs, validMoves, sqSelected)
+        if self.shown is None or text != self.shownText:
+            dirty = range(DIMENSION * DIMENSION)
+        else:
+            shownPieces, shownHighlights = self.shown
+            dirty = [sq for sq in range(DIMENSION * DIMENSION)
+                     if pieces[sq] != shownPieces[sq] or highlights.get(sq) != shownHighlights.get(sq)]
+        rects = []
+        for sq in dirty:
+            rect = squareRect(sq // DIMENSION, sq % DIMENSION)
+            self.screen.blit(self.board, rect, rect)
+            if sq in highlights:
+                self.screen.blit(self.overlays[highlights[sq]], rect)
+            if pieces[sq] != "--":
+                self.screen.blit(IMAGES[pieces[sq]], rect)
+            rects.append(rect)
+        if text is not None and rects:
+            if text not in self.texts:
+                self.texts[text] = self.font.render(text, 0, p.Color('Gray'))
+            textObject = self.texts[text]
+            textLocation = textObject.get_rect(center=(WIDTH // 2, HEIGHT // 2))
+            if textLocation.collidelist(rects) != -1:
+                self.screen.blit(textObject, textLocation)
+                rects.append(textLocation)
+        self.shown = (pieces, highlights)
+        self.shownText = text
+        return rects
+
+def squareRect(r, c):
+    return p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE)
+
+def highlightedSquares(gs, validMoves, sqSelected):
+    """{square: overlay name} for the selected piece and the squares it can move to."""
+    highlights = {}
     if sqSelected != ():
         r, c = sqSelected
         if gs.board[r][c][0] == ('w' if gs.whiteToMove else 'b'):
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(100)
-            s.fill(p.Color('yellow'))
-            screen.blit(s, (c*SQ_SIZE, r*SQ_SIZE))
-            s.fill(p.Color('lime'))
+            highlights[r*DIMENSION + c] = 'selected'
             for move in validMoves:
                 if move.startRow == r and move.startCol == c:
-                    screen.blit(s, (move.endCol*SQ_SIZE, move.endRow*SQ_SIZE))
+                    highlights[move.endRow*DIMENSION + move.endCol] = 'target'
+    return highlights
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,165 @@
+"""PGN and SAN reading and writing for GameState.
+
+readGames streams games out of a PGN file one at a time, so collections of any
+size can be processed without loading them. parseMove turns a SAN or
+coordinate-notation token into the legal Move it names. The engine has no
+castling and only promotes to a queen, so those moves parse to None and callers
+stop the game there.
+
+toSAN writes a Move as SAN, and writeGames streams (tags, SAN tokens, result)
+games back out as PGN text, taking them from any iterable as they come.
+"""
+import re
+
+from ChessEngine import Move
+
+RESULTS = {"1-0", "0-1", "1/2-1/2", "*"}
+TAG = re.compile(r'\[(\w+)\s+"(.*)"\]')
+MOVE_NUMBER = re.compile(r'^\d+\.+')
+COORDINATE = re.compile(r'^([a-h][1-8])([a-h][1-8])([qrbn]?)$')
+SAN = re.compile(r'^([NBRQK]?)([a-h]?)([1-8]?)x?([a-h][1-8])(?:=?([NBRQ]))?$')
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+LINE_LENGTH = 79
+
+
+def parseMove(gs, token, validMoves=None):
+    """The legal Move in gs written as token in SAN ('Nxf3', 'e8=Q+') or coordinates ('g1f3'), else None."""
+    if validMoves is None:
+        validMoves = gs.getValidMoves()
+    token = token.rstrip('+#!?')
+    match = COORDINATE.match(token)
+    if match:
+        if match.group(3) not in ('', 'q'):
+            return None
+        notation = match.group(1) + match.group(2)
+        return next((move for move in validMoves if move.getchessnotion() == notation), None)
+    match = SAN.match(token)
+    if match is None:
+        return None  # castling, or not a move
+    piece, fromFile, fromRank, target, promotion = match.groups()
+    if promotion not in (None, 'Q'):
+        return None
+    piece = piece or 'P'
+    endRow, endCol = Move.ranksToRows[target[1]], Move.filesToCols[target[0]]
+    candidates = [move for move in validMoves
+                  if move.endRow == endRow and move.endCol == endCol and move.pieceMoved[1] == piece
+                  and (not fromFile or Move.colsToFiles[move.startCol] == fromFile)
+                  and (not fromRank or Move.rowsToRanks[move.startRow] == fromRank)]
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def readGames(stream):
+    """Yield (tags, move tokens, result) for every game in a PGN text stream.
+
+    Comments, variations, NAGs and move numbers are dropped; lines are read as they come."""
+    tags, tokens = {}, []
+    comment = False  # inside {...}, which may span lines
+    variation = 0  # depth of (...)
+    for line in stream:
+        if not comment and variation == 0 and line.startswith('['):
+            if tokens:
+                yield tags, tokens, '*'
+                tags, tokens = {}, []
+            match = TAG.match(line.strip())
+            if match:
+                tags[match.group(1)] = match.group(2)
+            continue
+        if line.startswith('%'):
+            continue
+        text = []
+        for char in line:
+            if comment:
+                comment = char != '}'
+            elif char == '{':
+                comment = True
+            elif char == ';':
+                break
+            elif char == '(':
+                variation += 1
+            elif char == ')':
+                variation = max(0, variation - 1)
+            elif variation == 0:
+                text.append(char)
+        for token in ''.join(text).split():
+            token = MOVE_NUMBER.sub('', token)
+            if not token or token.startswith('$'):
+                continue
+            if token in RESULTS:
+                yield tags, tokens, token
+                tags, tokens = {}, []
+            else:
+                tokens.append(token)
+    if tokens:
+        yield tags, tokens, '*'
+
+
+def toSAN(gs, move, validMoves=None):
+    """SAN of a legal move in gs ('Nbd7', 'exd6', 'e8=Q+'), with + or # found by playing it."""
+    if validMoves is None:
+        validMoves = gs.getValidMoves()
+    piece = move.pieceMoved[1]
+    target = move.getRankFile(move.endRow, move.endCol)
+    capture = move.pieceCaptured != "--"
+    if piece == 'P':
+        san = (Move.colsToFiles[move.startCol] + 'x' if capture else '') + target
+        if move.isPawnPromotion:
+            san += '=Q'
+    else:
+        # another piece of the same kind that reaches the square: name the file, else the rank, else both
+        rivals = [other for other in validMoves if other.pieceMoved == move.pieceMoved and other != move
+                  and other.endRow == move.endRow and other.endCol == move.endCol]
+        origin = ''
+        if rivals:
+            if all(other.startCol != move.startCol for other in rivals):
+                origin = Move.colsToFiles[move.startCol]
+            elif all(other.startRow != move.startRow for other in rivals):
+                origin = Move.rowsToRanks[move.startRow]
+            else:
+                origin = move.getRankFile(move.startRow, move.startCol)
+        san = piece + origin + ('x' if capture else '') + target
+    gs.makeMove(move)
+    if gs.inCheck():
+        san += '+' if gs.getValidMoves() else '#'
+    gs.undoMove()
+    return san
+
+
+def formatGame(tags, tokens, result):
+    """PGN text of one game: the seven tag roster first, then the other tags, then wrapped movetext."""
+    tags = dict(tags, Result=result)
+    lines = [f'[{name} "{tags.get(name, "?")}"]' for name in SEVEN_TAG_ROSTER]
+    lines += [f'[{name} "{value}"]' for name, value in tags.items() if name not in SEVEN_TAG_ROSTER]
+    # numbering follows the FEN tag, so games from a set-up position count on from it
+    fields = tags.get("FEN", "").split()
+    number = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+    white = len(fields) < 2 or fields[1] == 'w'
+    words = []
+    for index, token in enumerate(tokens):
+        if white:
+            words.append(f"{number}.")
+        elif index == 0:
+            words.append(f"{number}...")
+        words.append(token)
+        if not white:
+            number += 1
+        white = not white
+    words.append(result)
+
+    movetext, line = [], ""
+    for word in words:
+        if line and len(line) + 1 + len(word) > LINE_LENGTH:
+            movetext.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    movetext.append(line)
+    return "\n".join(lines) + "\n\n" + "\n".join(movetext) + "\n\n"
+
+
+def writeGames(stream, games):
+    """Write (tags, SAN tokens, result) games to a text stream as PGN, one at a time; return the count."""
+    count = 0
+    for tags, tokens, result in games:
+        stream.write(formatGame(tags, tokens, result))
+        count += 1
+    return count
@@ -0,0 +1,276 @@
+"""Root-parallel alpha-beta search on a process pool.
+
+Each iteration of the deepening loop searches the first root move on its own,
+to get a good alpha, then hands the remaining root moves to the pool. Workers
+keep their own getAlphaBetaMove (and transposition table) between tasks and
+share the best root score found so far through a multiprocessing.Value, so a
+root move finishing late is searched against the best alpha any worker has.
+A second shared Value counts the nodes of the search, so a node limit holds
+across the workers as it does in the serial search. With tablebases each
+worker opens the same directory and probes it inside the tree.
+Positions travel as GameState.toCompact() bytes and moves as Move.code ints.
+
+The time to reach a fixed depth, serially and with each number of workers:
+
+    python ChessParallel.py --depth 4 --workers 1 2 4
+"""
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import sys
+import time
+
+import ChessEngine
+from ChessAi import getAlphaBetaMove, SearchAborted, MATE_SCORE
+from ChessTablebase import Tablebases
+
+_searcher = None
+_sharedAlpha = None
+_sharedNodes = None
+
+
+class RootMoveSearch(getAlphaBetaMove):
+    """The worker's searcher: its node limit is on the nodes of all workers together."""
+
+    def __init__(self, hash_mb, check_interval, tablebases=None):
+        super().__init__(hash_mb=hash_mb, check_interval=check_interval, tablebases=tablebases)
+        self.reported = 0  # of nodes_evaluated, those added to _sharedNodes
+
+    def reportNodes(self):
+        with _sharedNodes.get_lock():
+            _sharedNodes.value += self.nodes_evaluated - self.reported
+            total = _sharedNodes.value
+        self.reported = self.nodes_evaluated
+        return total
+
+    def checkLimits(self):
+        if self.node_limit is not None and self.reportNodes() >= self.node_limit:
+            raise SearchAborted()
+        node_limit, self.node_limit = self.node_limit, None
+        try:
+            super().checkLimits()
+        finally:
+            self.node_limit = node_limit
+
+
+def initWorker(sharedAlpha, sharedNodes, hash_mb, check_interval, stopWorkers, tablebaseDirectory=None):
+    global _searcher, _sharedAlpha, _sharedNodes
+    _sharedAlpha = sharedAlpha
+    _sharedNodes = sharedNodes
+    # the master's tables are memory-mapped files, each worker maps its own
+    tablebases = Tablebases(tablebaseDirectory) if tablebaseDirectory is not None else None
+    _searcher = RootMoveSearch(hash_mb, check_interval, tablebases)
+    _searcher.stop_event = stopWorkers  # a multiprocessing.Event, set when the master is stopped
+
+
+def searchRootMove(position, moveCode, depth, deadline, pvCodes, node_limit=None):
+    """Search one root move in a worker process, within node_limit nodes for the whole search.
+
+    Returns (move code, score or None if the deadline passed, nodes, pv codes below the move, alpha).
+    The move is searched against the best root score known when it starts, alpha: a score
+    above alpha is exact, one at or below it only bounds the move from above."""
+    gs = ChessEngine.GameState.fromCompact(position)
+    searcher = _searcher
+    searcher.nodes_evaluated = 0
+    searcher.reported = 0
+    searcher.start_time = time.time()
+    searcher.time_limit = deadline - searcher.start_time
+    searcher.node_limit = node_limit
+    searcher.next_check = 0
+    searcher.tt.newSearch()
+    searcher.root_ply = 0
+    # the previous principal variation is tried first wherever the search meets it
+    searcher.pvMoves = {}
+    for code in pvCodes:
+        searcher.pvMoves[gs.zobristKey] = ChessEngine.Move.fromCode(code).moveID
+        gs.makeMove(ChessEngine.Move.fromCode(code))
+    for _ in pvCodes:
+        gs.undoMove()
+
+    gs.makeMove(ChessEngine.Move.fromCode(moveCode))
+    alpha = _sharedAlpha.value
+    try:
+        score = searcher.alpha_beta(gs, depth - 1, alpha, float('inf'), False)
+    except SearchAborted:
+        return moveCode, None, searcher.nodes_evaluated, [], alpha
+    finally:
+        searcher.reportNodes()
+    if score <= alpha:
+        return moveCode, score, searcher.nodes_evaluated, [], alpha
+    with _sharedAlpha.get_lock():
+        if score > _sharedAlpha.value:
+            _sharedAlpha.value = score
+    pv = [move.code for move in searcher.extractPV(gs, depth - 1)]
+    return moveCode, score, searcher.nodes_evaluated, pv, alpha
+
+
+class getParallelAlphaBetaMove(getAlphaBetaMove):
+    def __init__(self, depth=4, time_limit=3.0, workers=None, hash_mb=16, soft_time_limit=None,
+                 check_interval=1024, book=None, tablebases=None, stats_out=None):
+        super().__init__(depth, time_limit, hash_mb=hash_mb, soft_time_limit=soft_time_limit,
+                         check_interval=check_interval, book=book, tablebases=tablebases,
+                         stats_out=stats_out)
+        self.workers = workers or os.cpu_count() or 1
+        self.hash_mb = hash_mb  # per worker
+        self.sharedAlpha = multiprocessing.Value('d', float('-inf'))
+        self.sharedNodes = multiprocessing.Value('q', 0)
+        self.stopWorkers = multiprocessing.Event()
+        self.pool = None
+
+    def startPool(self):
+        if self.pool is None:
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, initializer=initWorker,
+                initargs=(self.sharedAlpha, self.sharedNodes, self.hash_mb, self.check_interval, self.stopWorkers,
+                          self.tablebases.directory if self.tablebases is not None else None))
+            # start the workers now, from the calling thread, rather than from whichever thread searches first
+            concurrent.futures.wait([self.pool.submit(os.getpid) for _ in range(self.workers)])
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+    def __enter__(self):
+        self.startPool()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def search(self, gs, validMoves):
+        self.startPool()
+        self.stopWorkers.clear()
+        self.nodes_evaluated = 0
+        self.start_time = time.time()
+        self.completed_depth = 0
+        self.pv = []
+        self.iterations = []
+        self.newOrdering()
+        self.root_ply = len(gs.movelog)
+        if self.book is not None:
+            book_move = self.book.chooseMove(gs, validMoves)
+            if book_move is not None:
+                return book_move
+        if self.tablebases is not None:
+            tb_move = self.tablebases.bestMove(gs, validMoves)
+            if tb_move is not None:
+                return tb_move
+
+        root_moves = self.orderMoves(gs, validMoves)
+        if not root_moves:
+            return None
+        best_move = root_moves[0]
+        position = gs.toCompact()
+        for depth in range(1, self.max_depth + 1):
+            if self.node_limit is not None and self.nodes_evaluated >= self.node_limit:
+                break
+            # read each iteration, time_limit may be cut short meanwhile (a ponder hit)
+            result = self.searchIteration(position, root_moves, depth, self.start_time + self.time_limit)
+            if result is None:
+                break
+            best_move, self.best_score, pvCodes = result
+            self.completed_depth = depth
+            self.iterations.append((depth, best_move, self.best_score, self.nodes_evaluated,
+                                    time.time() - self.start_time))
+            self.pv = [best_move] + [ChessEngine.Move.fromCode(code) for code in pvCodes]
+            root_moves.remove(best_move)
+            root_moves.insert(0, best_move)
+            if self.on_iteration is not None:
+                self.on_iteration(self)
+            if abs(self.best_score) >= MATE_SCORE or time.time() - self.start_time > self.soft_time_limit:
+                break
+        return best_move
+
+    def searchIteration(self, position, moves, depth, deadline):
+        # None unless every root move finished before the deadline
+        self.sharedAlpha.value = float('-inf')
+        self.sharedNodes.value = self.nodes_evaluated
+        pvCodes = [move.code for move in self.pv]
+        futures = [self.pool.submit(searchRootMove, position, moves[0].code, depth, deadline, pvCodes,
+                                    self.node_limit)]
+        self.waitFor(futures)
+        if futures[0].done() and futures[0].result()[1] is not None:
+            futures += [self.pool.submit(searchRootMove, position, move.code, depth, deadline, pvCodes,
+                                         self.node_limit)
+                        for move in moves[1:]]
+            self.waitFor(futures)
+
+        best = None
+        complete = len(futures) == len(moves)
+        for future, move in zip(futures, moves):
+            if not future.done():
+                future.cancel()
+                complete = False
+                continue
+            _, score, nodes, pv, alpha = future.result()
+            self.nodes_evaluated += nodes
+            if score is None:
+                complete = False
+            # a fail low is no better than the exact score that raised the shared alpha to its alpha
+            elif score > alpha and (best is None or score > best[1]):
+                best = (move, score, pv)
+        return best if complete else None
+
+    def waitFor(self, futures):
+        # in short slices, so that a stop_event set meanwhile, or a time_limit cut below the deadline
+        # the workers were given, reaches them through stopWorkers
+        while True:
+            _, pending = concurrent.futures.wait(futures, timeout=0.05)
+            if not pending:
+                return
+            stopped = self.stop_event is not None and self.stop_event.is_set()
+            if stopped or time.time() > self.start_time + self.time_limit + 0.1:
+                self.stopWorkers.set()
+                concurrent.futures.wait(futures)  # the workers give up at their next limit check
+                return
+
+
+def timeToDepth(fen, depth, workers=None):
+    """(seconds, move, score, nodes) for searching fen to depth, with fresh tables.
+
+    Serial getAlphaBetaMove when workers is None; the pool is started before the clock."""
+    gs = ChessEngine.GameState.fromFEN(fen)
+    if workers is None:
+        searcher = getAlphaBetaMove(depth, time_limit=float('inf'))
+    else:
+        searcher = getParallelAlphaBetaMove(depth, time_limit=float('inf'), workers=workers)
+        searcher.startPool()
+    try:
+        start = time.perf_counter()
+        move = searcher(gs, gs.getValidMoves())
+        seconds = time.perf_counter() - start
+    finally:
+        if workers is not None:
+            searcher.close()
+    return seconds, move, searcher.best_score, searcher.nodes_evaluated
+
+
+def main(argv=None):
+    from ChessPerft import POSITIONS
+    parser = argparse.ArgumentParser(description="Time to depth of the root-parallel search against the serial one")
+    parser.add_argument("-d", "--depth", type=int, default=4)
+    parser.add_argument("-w", "--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("-p", "--position", action="append", choices=sorted(POSITIONS),
+                        help="position to run, may be repeated (default: all)")
+    args = parser.parse_args(argv)
+
+    print(f"depth {args.depth}, {os.cpu_count()} cpus")
+    totals = {}
+    for name in args.position or POSITIONS:
+        fen = POSITIONS[name][0]
+        for workers in [None] + args.workers:
+            seconds, move, score, nodes = timeToDepth(fen, args.depth, workers)
+            totals[workers] = totals.get(workers, 0.0) + seconds
+            label = "serial" if workers is None else f"{workers} workers"
+            print(f"{name:12} {label:10} {seconds:8.2f}s {nodes:9} nodes  "
+                  f"{move.getchessnotion() if move else '-'} {score}")
+    for workers, seconds in totals.items():
+        label = "serial" if workers is None else f"{workers} workers"
+        print(f"total {label:10} {seconds:8.2f}s  speedup {totals[None] / seconds:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""Perft and divide benchmarks for ChessEngine move generation.
+
+Counts the leaf nodes of the legal move tree to a fixed depth and checks them
+against stored values, so any change to GameState can be timed and verified:
+
+    python ChessPerft.py                      # every position, stored depths
+    python ChessPerft.py -p startpos -d 5     # one position, deeper
+    python ChessPerft.py -p italian -d 3 --divide
+    python ChessPerft.py -f "8/8/8/4k3/8/8/4P3/4K3 w - - 0 1" -d 5
+
+The engine has no castling and always promotes to a queen, so the expected
+counts are those of this rule set, not the published perft tables.
+"""
+import argparse
+import sys
+import time
+
+import ChessEngine
+
+# name -> (FEN, {depth: expected leaf count})
+POSITIONS = {
+    'startpos': ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1",
+                 {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    'italian': ("r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w - - 4 4",
+                {1: 32, 2: 901, 3: 28955, 4: 862064}),
+    'en-passant': ("rnbqkbnr/1pp1pppp/p7/3pP3/8/8/PPPP1PPP/RNBQKBNR w - d6 0 3",
+                   {1: 31, 2: 781, 3: 24166, 4: 630536}),
+    'promotion': ("rnbqk1nr/1pppppP1/p7/8/8/8/PPPPPPP1/RNBQKBNR w - - 0 5",
+                  {1: 26, 2: 532, 3: 14642, 4: 328333}),
+    'mate-in-one': ("rnbqkbnr/ppppp2p/5p2/6p1/3PP3/8/PPP2PPP/RNBQKBNR w - g6 0 3",
+                    {1: 37, 2: 715, 3: 26489, 4: 563594}),
+    'in-check': ("rnbqkbnr/ppp1pppp/8/1B1p4/4P3/8/PPPP1PPP/RNBQK1NR b - - 1 2",
+                 {1: 5, 2: 173, 3: 3980, 4: 134871}),
+}
+
+
+def playMoves(gs, moves):
+    """Play coordinate-notation moves such as 'e2e4' on gs."""
+    for notation in moves:
+        for move in gs.getValidMoves():
+            if move.getchessnotion() == notation:
+                gs.makeMove(move)
+                break
+        else:
+            raise ValueError(f"illegal move {notation}")
+    return gs
+
+
+def perft(gs, depth):
+    moves = gs.getValidMoves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+def divide(gs, depth):
+    """Leaf count below each root move, as a list of (notation, nodes)."""
+    counts = []
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        counts.append((move.getchessnotion(), perft(gs, depth - 1)))
+        gs.undoMove()
+    return counts
+
+
+def startPosition(start):
+    """A GameState from a FEN string or a list of moves played from the initial position."""
+    if isinstance(start, str):
+        return ChessEngine.GameState.fromFEN(start)
+    return playMoves(ChessEngine.GameState(), start)
+
+
+def runPosition(name, start, depths, expected, out=sys.stdout):
+    """Run perft for every depth in depths, print a table and return (nodes, seconds, failures)."""
+    gs = startPosition(start)
+    total_nodes, total_time, failures = 0, 0.0, 0
+    for depth in depths:
+        start = time.perf_counter()
+        nodes = perft(gs, depth)
+        elapsed = time.perf_counter() - start
+        total_nodes += nodes
+        total_time += elapsed
+        want = expected.get(depth)
+        if want is None:
+            status = "?"
+        elif want == nodes:
+            status = "ok"
+        else:
+            status = f"FAIL expected {want}"
+            failures += 1
+        nps = nodes / elapsed if elapsed > 0 else 0
+        print(f"{name:<12} depth {depth}  nodes {nodes:>10}  {elapsed:8.3f}s  {nps:>10.0f} nps  {status}", file=out)
+    return total_nodes, total_time, failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft benchmark for ChessEngine.GameState")
+    parser.add_argument("-p", "--position", action="append", choices=sorted(POSITIONS),
+                        help="position to run, may be repeated (default: all)")
+    parser.add_argument("-d", "--depth", type=int, help="run depths 1..DEPTH (default: stored depths)")
+    parser.add_argument("-m", "--moves", nargs="*", help="run from these moves instead of a stored position")
+    parser.add_argument("-f", "--fen", help="run from this FEN instead of a stored position")
+    parser.add_argument("--divide", action="store_true", help="print the leaf count below each root move")
+    args = parser.parse_args(argv)
+
+    if args.fen is not None:
+        positions = {'fen': (args.fen, {})}
+    elif args.moves is not None:
+        positions = {'moves': (args.moves, {})}
+    else:
+        positions = {name: POSITIONS[name] for name in (args.position or POSITIONS)}
+
+    if args.divide:
+        for name, (start, expected) in positions.items():
+            depth = args.depth or max(expected, default=1)
+            gs = startPosition(start)
+            start = time.perf_counter()
+            counts = divide(gs, depth)
+            elapsed = time.perf_counter() - start
+            for notation, nodes in counts:
+                print(f"{notation}: {nodes}")
+            total = sum(nodes for _, nodes in counts)
+            print(f"\n{name} depth {depth}: {len(counts)} moves, {total} nodes, {elapsed:.3f}s")
+        return 0
+
+    total_nodes, total_time, failures = 0, 0.0, 0
+    for name, (start, expected) in positions.items():
+        depths = range(1, (args.depth or max(expected, default=1)) + 1)
+        nodes, elapsed, failed = runPosition(name, start, depths, expected)
+        total_nodes += nodes
+        total_time += elapsed
+        failures += failed
+    nps = total_nodes / total_time if total_time > 0 else 0
+    print(f"\ntotal nodes {total_nodes}  time {total_time:.3f}s  {nps:.0f} nps  failures {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,446 @@
+"""Asyncio game server: many games against getAlphaBetaMove over one socket server.
+
+Each game is a session holding its GameState in the server process. Engine
+moves are searched on a bounded process pool whose workers each keep one
+searcher (and transposition table) for all the games they serve, so a game
+costs a GameState, not a process:
+
+    python ChessServer.py serve --port 8765 -w 8
+    python ChessServer.py bench -n 200 --plies 20      # loopback server plus 200 random players
+
+The protocol is JSON lines, one request and one reply per line:
+
+    {"op": "new", "engine": "b", "fen": "...", "budget": 60}  -> {"ok": true, "game": 1, "fen": "..."}
+    {"op": "move", "game": 1, "move": "e2e4"}                 -> the engine's answer, as for go
+    {"op": "go", "game": 1}                                   -> {"ok": true, "move": "e7e5", "status": ...}
+    {"op": "state", "game": 1}, {"op": "close", "game": 1}, {"op": "stats"}
+
+Searches queue in fair order, the game that has had the least engine time so
+far first (start-time fair queuing, so a stream of new games cannot starve
+older ones). Each game has its own clock: budget seconds for all its engine
+moves plus an increment per move, shared out as a UCI engine shares its clock.
+The queue is bounded; a request that finds it full waits up to queue_timeout
+seconds for room and then gets a busy error, so load beyond what the pool can
+serve is pushed back to the clients instead of piling up. stats reports the
+queue depth, searches in flight and wait and latency percentiles.
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import traceback
+
+import ChessEngine
+from ChessAi import getAlphaBetaMove
+from ChessPGN import parseMove
+from ChessUCI import uciMove
+
+DEFAULT_PORT = 8765
+LATENCY_WINDOW = 2000  # searches the percentiles are taken over
+MOVES_TO_GO = 30  # moves a game's remaining clock is shared between
+MIN_MOVE_TIME = 0.02
+
+_searcher = None
+
+
+def initWorker(depth, hash_mb):
+    global _searcher
+    _searcher = getAlphaBetaMove(depth=depth, hash_mb=hash_mb)
+
+
+def searchPosition(position, time_limit):
+    """Search a toCompact position in a worker: (move code or None, score, depth, nodes, seconds)."""
+    gs = ChessEngine.GameState.fromCompact(position)
+    _searcher.time_limit = time_limit
+    _searcher.soft_time_limit = time_limit / 2
+    start = time.perf_counter()
+    move = _searcher(gs, gs.getValidMoves())
+    elapsed = time.perf_counter() - start
+    return (move.code if move is not None else None, _searcher.best_score, _searcher.completed_depth,
+            _searcher.nodes_evaluated, elapsed)
+
+
+class ServerBusy(Exception):
+    pass
+
+
+def percentiles(values, points=(50, 90, 99)):
+    """Nearest-rank percentiles of values, in milliseconds."""
+    ordered = sorted(values)
+    if not ordered:
+        return {f"p{point}": 0.0 for point in points}
+    return {f"p{point}": round(1000 * ordered[min(len(ordered) - 1, len(ordered) * point // 100)], 2)
+            for point in points}
+
+
+class Session:
+    def __init__(self, gameId, gs, engineColor, budget, increment, max_move_time):
+        self.id = gameId
+        self.gs = gs
+        self.engineColor = engineColor
+        self.clock = budget  # engine seconds left for the rest of the game
+        self.increment = increment
+        self.max_move_time = max_move_time
+        self.engineSeconds = 0.0  # search time used so far, the fair-scheduling key
+        self.searching = False
+        self.lastActive = time.monotonic()
+
+    def moveTime(self):
+        return max(MIN_MOVE_TIME, min(self.max_move_time, self.clock / MOVES_TO_GO + self.increment))
+
+    def charge(self, seconds):
+        self.engineSeconds += seconds
+        self.clock = max(0.0, self.clock - seconds) + self.increment
+
+    def status(self):
+        validMoves = self.gs.getValidMoves()
+        if validMoves:
+            return 'playing', validMoves
+        return ('checkmate' if self.gs.checkmate else 'stalemate'), validMoves
+
+
+class SearchScheduler:
+    """Bounded, fair queue of searches in front of the process pool."""
+
+    def __init__(self, workers, depth=64, hash_mb=16, max_queue=256, queue_timeout=5.0):
+        self.workers = workers
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=initWorker,
+                                                           initargs=(depth, hash_mb))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.queue = []  # heap of (engine seconds used by the session, arrival order, request)
+        self.order = itertools.count()
+        # the key of the last search dispatched; a game further behind queues from here, in arrival
+        # order, so games that keep arriving with little engine time cannot starve the others
+        self.virtualTime = 0.0
+        self.changed = asyncio.Condition()  # the queue grew or shrank
+        self.inFlight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.waits = collections.deque(maxlen=LATENCY_WINDOW)
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.searchTimes = collections.deque(maxlen=LATENCY_WINDOW)
+        self.dispatcher = None
+
+    async def start(self):
+        # fork every worker before the first connection: a worker forked later inherits the open
+        # sockets and keeps them open after the server or the client has closed its end
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.pool, os.getpid) for _ in range(self.workers)))
+        self.dispatcher = asyncio.create_task(self.dispatch())
+
+    async def close(self):
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    async def search(self, session):
+        """Queue a search of the session's position and wait for its result."""
+        future = asyncio.get_running_loop().create_future()
+        request = (session.gs.toCompact(), session.moveTime(), time.perf_counter(), future)
+        async with self.changed:
+            try:
+                await asyncio.wait_for(self.changed.wait_for(lambda: len(self.queue) < self.max_queue),
+                                       self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise ServerBusy(f"search queue full ({self.max_queue}), try again later") from None
+            key = max(session.engineSeconds, self.virtualTime)
+            heapq.heappush(self.queue, (key, next(self.order), request))
+            self.changed.notify_all()
+        return await future
+
+    async def dispatch(self):
+        slots = asyncio.Semaphore(self.workers)
+        while True:
+            await slots.acquire()
+            async with self.changed:
+                await self.changed.wait_for(lambda: self.queue)
+                self.virtualTime, _, request = heapq.heappop(self.queue)
+                self.changed.notify_all()
+            if request[3].done():  # the client went away while it queued
+                slots.release()
+                continue
+            asyncio.create_task(self.run(request, slots))
+
+    async def run(self, request, slots):
+        position, time_limit, queued, future = request
+        started = time.perf_counter()
+        self.inFlight += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.pool, searchPosition, position, time_limit)
+        except Exception as error:  # a broken pool or a bug in the worker, reported to the client
+            if not future.done():
+                future.set_exception(error)
+        else:
+            finished = time.perf_counter()
+            self.completed += 1
+            self.waits.append(started - queued)
+            self.latencies.append(finished - queued)
+            self.searchTimes.append(result[4])
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self.inFlight -= 1
+            slots.release()
+
+    def stats(self):
+        return {'queue_depth': len(self.queue), 'in_flight': self.inFlight, 'workers': self.workers,
+                'completed': self.completed, 'rejected': self.rejected,
+                'wait_ms': percentiles(self.waits), 'latency_ms': percentiles(self.latencies),
+                'search_ms': percentiles(self.searchTimes)}
+
+
+class GameServer:
+    def __init__(self, scheduler, max_sessions=1000, budget=60.0, increment=0.0, max_move_time=2.0,
+                 idle_timeout=600.0):
+        self.scheduler = scheduler
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.max_sessions = max_sessions
+        self.budget = budget
+        self.increment = increment
+        self.max_move_time = max_move_time
+        self.idle_timeout = idle_timeout
+        self.connections = 0
+        self.expiry = None
+
+    async def handleClient(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await self.handle(json.loads(line))
+                except ServerBusy as error:
+                    reply = {'ok': False, 'error': str(error), 'busy': True}
+                except (ValueError, KeyError, TypeError) as error:
+                    reply = {'ok': False, 'error': str(error)}
+                except Exception as error:  # a broken pool or a bug in the worker, the connection stays up
+                    print(f"request {line[:200]!r} failed:", file=sys.stderr)
+                    traceback.print_exc(file=sys.stderr)
+                    reply = {'ok': False, 'error': f"{type(error).__name__}: {error}"}
+                # one request at a time per connection: a client that does not read its replies stops being read
+                writer.write((json.dumps(reply) + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def session(self, request):
+        session = self.sessions.get(request['game'])
+        if session is None:
+            raise KeyError(f"no game {request['game']}")
+        session.lastActive = time.monotonic()
+        return session
+
+    async def handle(self, request):
+        if not isinstance(request, dict):
+            raise ValueError("a request is a JSON object")
+        op = request.get('op')
+        if op == 'new':
+            if len(self.sessions) >= self.max_sessions:
+                raise ServerBusy(f"{self.max_sessions} games open")
+            gs = ChessEngine.GameState()
+            if request.get('fen'):
+                gs.loadFEN(request['fen'])
+            engineColor = request.get('engine', 'b')
+            if engineColor not in ('w', 'b'):
+                raise ValueError("engine must be w or b")
+            session = Session(next(self.ids), gs, engineColor, float(request.get('budget', self.budget)),
+                              float(request.get('increment', self.increment)), self.max_move_time)
+            self.sessions[session.id] = session
+            return {'ok': True, 'game': session.id, 'fen': gs.toFEN(), 'status': session.status()[0]}
+        if op == 'move':
+            session = self.session(request)
+            status, validMoves = session.status()
+            if session.searching or status != 'playing':
+                raise ValueError("the engine is thinking" if session.searching else f"game over: {status}")
+            if ('w' if session.gs.whiteToMove else 'b') == session.engineColor:
+                raise ValueError("it is the engine's move")
+            move = parseMove(session.gs, request['move'], validMoves)
+            if move is None:
+                raise ValueError(f"illegal move {request['move']}")
+            session.gs.makeMove(move)
+            try:
+                return await self.engineMove(session)
+            except BaseException:
+                session.gs.undoMove()  # the request is refused whole, the client can send it again
+                raise
+        if op == 'go':
+            return await self.engineMove(self.session(request))
+        if op == 'state':
+            session = self.session(request)
+            return {'ok': True, 'game': session.id, 'fen': session.gs.toFEN(), 'status': session.status()[0],
+                    'clock': round(session.clock, 3), 'engine_seconds': round(session.engineSeconds, 3)}
+        if op == 'close':
+            self.sessions.pop(request['game'], None)
+            return {'ok': True, 'game': request['game']}
+        if op == 'stats':
+            return dict(self.scheduler.stats(), ok=True, sessions=len(self.sessions), connections=self.connections)
+        raise ValueError(f"unknown op {op!r}")
+
+    async def engineMove(self, session):
+        status, _ = session.status()
+        if session.searching or status != 'playing':
+            raise ValueError("the engine is thinking" if session.searching else f"game over: {status}")
+        session.searching = True
+        try:
+            code, score, depth, nodes, seconds = await self.scheduler.search(session)
+        finally:
+            session.searching = False
+        session.charge(seconds)
+        move = ChessEngine.Move.fromCode(code)
+        session.gs.makeMove(move)
+        return {'ok': True, 'game': session.id, 'move': uciMove(move), 'fen': session.gs.toFEN(),
+                'status': session.status()[0], 'score': score, 'depth': depth, 'nodes': nodes,
+                'clock': round(session.clock, 3)}
+
+    async def expireSessions(self):
+        while True:
+            await asyncio.sleep(min(60.0, self.idle_timeout))
+            cutoff = time.monotonic() - self.idle_timeout
+            for gameId in [gameId for gameId, session in self.sessions.items()
+                           if session.lastActive < cutoff and not session.searching]:
+                del self.sessions[gameId]
+
+
+async def startServer(host, port, workers, depth=64, hash_mb=16, max_queue=256, queue_timeout=5.0, **options):
+    """(asyncio server, GameServer) listening on host:port, port 0 for any free port."""
+    scheduler = SearchScheduler(workers, depth, hash_mb, max_queue, queue_timeout)
+    await scheduler.start()
+    game_server = GameServer(scheduler, **options)
+    server = await asyncio.start_server(game_server.handleClient, host, port)
+    game_server.expiry = asyncio.create_task(game_server.expireSessions())
+    return server, game_server
+
+
+async def stopServer(server, game_server, grace=1.0):
+    server.close()
+    await server.wait_closed()
+    deadline = time.monotonic() + grace  # let clients that are hanging up finish
+    while game_server.connections and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    game_server.expiry.cancel()
+    await game_server.scheduler.close()
+
+
+async def request(reader, writer, message):
+    writer.write((json.dumps(message) + "\n").encode())
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def randomPlayer(host, port, plies, rng):
+    """Play random moves against the server for up to plies engine moves, returning the replies' latencies."""
+    reader, writer = await asyncio.open_connection(host, port)
+    gs = ChessEngine.GameState()
+    latencies, busy = [], 0
+    try:
+        reply = await request(reader, writer, {'op': 'new', 'engine': 'b'})
+        gameId = reply['game']
+        while plies > 0:
+            validMoves = gs.getValidMoves()
+            if not validMoves:
+                break
+            move = rng.choice(validMoves)
+            start = time.perf_counter()
+            reply = await request(reader, writer, {'op': 'move', 'game': gameId, 'move': uciMove(move)})
+            if not reply['ok']:
+                if reply.get('busy'):
+                    busy += 1
+                    await asyncio.sleep(0.1)
+                    continue
+                raise RuntimeError(reply['error'])
+            latencies.append(time.perf_counter() - start)
+            gs.makeMove(move)
+            plies -= 1
+            if reply['status'] != 'playing':
+                break
+            gs.makeMove(parseMove(gs, reply['move']))
+        await request(reader, writer, {'op': 'close', 'game': gameId})
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return latencies, busy
+
+
+async def bench(args):
+    server, game_server = await startServer('127.0.0.1', 0, args.workers, args.depth, args.hash, args.max_queue,
+                                            args.queue_timeout, max_sessions=args.games, budget=args.budget,
+                                            max_move_time=args.max_move_time)
+    port = server.sockets[0].getsockname()[1]
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(randomPlayer('127.0.0.1', port, args.plies, random.Random(rng.random()))
+                                         for _ in range(args.games)))
+        stats = game_server.scheduler.stats()
+    finally:
+        await stopServer(server, game_server)
+    elapsed = time.perf_counter() - start
+    latencies = [latency for player, _ in results for latency in player]
+    print(json.dumps(dict(stats, games=args.games, engine_moves=len(latencies),
+                          busy_replies=sum(busy for _, busy in results),
+                          moves_per_second=round(len(latencies) / elapsed, 1),
+                          client_latency_ms=percentiles(latencies), seconds=round(elapsed, 2))))
+    return 0
+
+
+async def serve(args):
+    server, game_server = await startServer(args.host, args.port, args.workers, args.depth, args.hash,
+                                            args.max_queue, args.queue_timeout, max_sessions=args.max_sessions,
+                                            budget=args.budget, max_move_time=args.max_move_time)
+    print(f"serving on {args.host}:{args.port} with {args.workers} workers", file=sys.stderr)
+    try:
+        while True:
+            await asyncio.sleep(args.report or 3600)
+            if args.report:
+                print(json.dumps(dict(game_server.scheduler.stats(), sessions=len(game_server.sessions))),
+                      file=sys.stderr)
+    finally:
+        await stopServer(server, game_server)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve many games against getAlphaBetaMove over TCP")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serveCommand = commands.add_parser("serve", help="listen for games")
+    serveCommand.add_argument("--host", default="127.0.0.1")
+    serveCommand.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serveCommand.add_argument("--max-sessions", type=int, default=1000)
+    serveCommand.add_argument("--report", type=float, help="print queue statistics every REPORT seconds")
+    benchCommand = commands.add_parser("bench", help="random players against a loopback server")
+    benchCommand.add_argument("-n", "--games", type=int, default=100)
+    benchCommand.add_argument("--plies", type=int, default=20, help="engine moves per game")
+    benchCommand.add_argument("--seed", type=int, default=0)
+    for command in (serveCommand, benchCommand):
+        command.add_argument("-w", "--workers", type=int, default=os.cpu_count())
+        command.add_argument("-d", "--depth", type=int, default=64, help="maximum search depth")
+        command.add_argument("--hash", type=float, default=16, help="transposition table MB per worker")
+        command.add_argument("--budget", type=float, default=60.0, help="engine seconds per game")
+        command.add_argument("--max-move-time", type=float, default=2.0, help="cap on one engine move, seconds")
+        command.add_argument("--max-queue", type=int, default=256, help="searches waiting before clients wait")
+        command.add_argument("--queue-timeout", type=float, default=5.0,
+                             help="seconds a request waits for queue room before a busy reply")
+    args = parser.parse_args(argv)
+    try:
+        return asyncio.run(serve(args) if args.command == 'serve' else bench(args))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
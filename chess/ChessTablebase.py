@@ -0,0 +1,371 @@
+"""Retrograde endgame tablebases for three and four pieces.
+
+A material set such as KQvK (white's pieces, then black's) gets two files:
+
+    KQvK.dtm  one signed byte per position: 0 draw, +d the side to move mates in
+              d plies, -(d + 1) the side to move is mated in d plies
+    KQvK.wdl  two bits per position (0 draw, 1 win, 2 loss), for probes in the tree
+
+A position's index is side to move * 64**n + the squares of the pieces in
+signature order as base-64 digits. Tables are stored with white as the side
+named first; positions with the colours the other way round are probed
+mirrored. Files are memory-mapped on first use.
+
+    python ChessTablebase.py generate               # KQvK KRvK KPvK
+    python ChessTablebase.py generate KQvKR -d tablebases
+
+Generation plays every position's moves with GameState.getValidMoves, then
+walks back from the mates with un-moves. Captures and promotions are resolved
+from the smaller tables, which are generated first. Like the engine there is
+no castling and promotion is to a queen; en passant is ignored, so tables with
+pawns on both sides are not probed while an en passant capture is possible.
+Three-piece sets take well under a minute; four-piece sets have 64 times as
+many positions and are a long offline job in pure Python.
+"""
+import argparse
+import array
+import collections
+import itertools
+import mmap
+import os
+import sys
+import time
+
+import ChessEngine
+from ChessBitboards import (SQUARE_BITS, SQUARE_COORDS, KNIGHT_ATTACKS, KING_ATTACKS,
+                            rookAttacks, bishopAttacks, queenAttacks)
+
+DEFAULT_DIRECTORY = "tablebases"
+DEFAULT_SETS = ("KQvK", "KRvK", "KPvK")
+ORDER = "KQRBNP"
+# material sets that cannot be won and need no table
+TRIVIAL_DRAWS = {"KvK", "KNvK", "KBvK", "KvKN", "KvKB"}
+
+ILLEGAL, UNKNOWN, DRAW, RESOLVED = 0, 1, 2, 3
+NO_LOSS = 255  # a capture or promotion draws or wins, the position can never be lost
+WDL_CODES = {0: 0, 1: 1, 2: -1, 3: 0}
+
+
+def parseSignature(signature):
+    """'KQvKR' -> ['wK', 'wQ', 'bK', 'bR']"""
+    white, black = signature.split('v')
+    pieces = ['w' + piece for piece in white] + ['b' + piece for piece in black]
+    if white[:1] != 'K' or black[:1] != 'K' or any(piece[1] not in ORDER for piece in pieces):
+        raise ValueError(f"bad material signature {signature!r}")
+    return pieces
+
+
+def sideSignature(pieces):
+    return ''.join(sorted((piece[1] for piece in pieces), key=ORDER.index))
+
+
+class Tablebases:
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.available = set()
+        if os.path.isdir(directory):
+            self.available = {name[:-4] for name in os.listdir(directory) if name.endswith(".dtm")}
+        self.max_pieces = max((len(signature) - 1 for signature in self.available), default=0)
+        self.tables = {}
+
+    def table(self, signature, kind):
+        key = (signature, kind)
+        if key not in self.tables:
+            with open(os.path.join(self.directory, f"{signature}.{kind}"), "rb") as f:
+                self.tables[key] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.tables[key]
+
+    def close(self):
+        for data in self.tables.values():
+            data.close()
+        self.tables = {}
+
+    def locate(self, pieces, whiteToMove):
+        """(signature, index) of a position given as [(piece, square)], or None without a table."""
+        white = sorted((item for item in pieces if item[0][0] == 'w'), key=lambda item: ORDER.index(item[0][1]))
+        black = sorted((item for item in pieces if item[0][0] == 'b'), key=lambda item: ORDER.index(item[0][1]))
+        signature = sideSignature(piece for piece, _ in white) + 'v' + sideSignature(piece for piece, _ in black)
+        if signature in self.available:
+            squares = [sq for _, sq in white + black]
+            side = 0 if whiteToMove else 1
+        else:
+            signature = signature.split('v')[1] + 'v' + signature.split('v')[0]
+            if signature not in self.available:
+                return None
+            squares = [sq ^ 56 for _, sq in black + white]  # colours swapped, board mirrored
+            side = 1 if whiteToMove else 0
+        index = side
+        for sq in squares:
+            index = index * 64 + sq
+        return signature, index
+
+    def lookup(self, pieces, whiteToMove):
+        """DTM value for the side to move (see the module docstring), None without a table."""
+        located = self.locate(pieces, whiteToMove)
+        if located is None:
+            signature = sideSignature(piece for piece, _ in pieces if piece[0] == 'w') + 'v' + \
+                sideSignature(piece for piece, _ in pieces if piece[0] == 'b')
+            return 0 if signature in TRIVIAL_DRAWS else None
+        value = self.table(located[0], "dtm")[located[1]]
+        return value - 256 if value > 127 else value
+
+    def probable(self, gs):
+        if len(gs.pieceSquares['w']) + len(gs.pieceSquares['b']) > self.max_pieces:
+            return False
+        # the tables know nothing about en passant, which needs pawns on both sides
+        return not gs.enPassantPossible or not (gs.bitboards['wP'] and gs.bitboards['bP'])
+
+    def probeDTM(self, gs):
+        if not self.probable(gs):
+            return None
+        pieces = [(piece, sq) for color in ('w', 'b') for sq, piece in gs.pieceSquares[color].items()]
+        return self.lookup(pieces, gs.whiteToMove)
+
+    def probeWDL(self, gs):
+        """1 if the side to move wins, 0 for a draw, -1 if it loses, None without a table."""
+        if not self.probable(gs):
+            return None
+        pieces = [(piece, sq) for color in ('w', 'b') for sq, piece in gs.pieceSquares[color].items()]
+        located = self.locate(pieces, gs.whiteToMove)
+        if located is None:
+            return None if self.lookup(pieces, gs.whiteToMove) is None else 0
+        signature, index = located
+        return WDL_CODES[(self.table(signature, "wdl")[index >> 2] >> ((index & 3) * 2)) & 3]
+
+    def bestMove(self, gs, validMoves):
+        """The move that wins fastest, keeps the draw, or loses slowest; None if gs is not in the tables."""
+        if not validMoves or not self.probable(gs):
+            return None
+        best, bestRank = None, None
+        for move in validMoves:
+            gs.makeMove(move)
+            value = self.probeDTM(gs)  # for the opponent
+            gs.undoMove()
+            if value is None:
+                return None
+            if value < 0:
+                rank = (2, value)  # the opponent is mated, sooner is better
+            elif value == 0:
+                rank = (1, 0)
+            else:
+                rank = (0, value)
+            if bestRank is None or rank > bestRank:
+                best, bestRank = move, rank
+        return best
+
+
+def predecessors(index, pieces, n):
+    """Indexes of the positions one un-move of the side that just moved before index."""
+    weights = [64 ** (n - 1 - i) for i in range(n)]
+    side = index // 64 ** n
+    squares = [(index // weight) % 64 for weight in weights]
+    occ = 0
+    for sq in squares:
+        occ |= SQUARE_BITS[sq]
+    empty = ~occ
+    mover = 'b' if side == 0 else 'w'
+    base = index % 64 ** n + (0 if side else 64 ** n)  # the other side to move
+    for i, piece in enumerate(pieces):
+        if piece[0] != mover:
+            continue
+        sq = squares[i]
+        kind = piece[1]
+        if kind == 'K':
+            targets = KING_ATTACKS[sq] & empty
+        elif kind == 'N':
+            targets = KNIGHT_ATTACKS[sq] & empty
+        elif kind == 'B':
+            targets = bishopAttacks(sq, occ) & empty
+        elif kind == 'R':
+            targets = rookAttacks(sq, occ) & empty
+        elif kind == 'Q':
+            targets = queenAttacks(sq, occ) & empty
+        else:
+            step = 8 if mover == 'w' else -8  # white pawns move towards square 0
+            targets = 0
+            if 0 <= sq + step < 64 and SQUARE_BITS[sq + step] & empty:
+                targets = SQUARE_BITS[sq + step]
+                if sq >> 3 == (4 if mover == 'w' else 3) and SQUARE_BITS[sq + 2 * step] & empty:
+                    targets |= SQUARE_BITS[sq + 2 * step]
+        while targets:
+            low = targets & -targets
+            yield base + ((low.bit_length() - 1) - sq) * weights[i]
+            targets ^= low
+
+
+def generate(signature, directory=DEFAULT_DIRECTORY, progress=sys.stderr):
+    """Write signature.dtm and signature.wdl into directory, generating missing smaller tables first."""
+    pieces = parseSignature(signature)
+    n = len(pieces)
+    span = 64 ** n
+    size = 2 * span
+    os.makedirs(directory, exist_ok=True)
+    for sub in conversions(signature):
+        tables = Tablebases(directory)
+        if sub not in tables.available and flipped(sub) not in tables.available and sub not in TRIVIAL_DRAWS:
+            generate(canonical(sub), directory, progress)
+    tables = Tablebases(directory)
+    started = time.time()
+
+    state = bytearray(size)
+    remaining = bytearray(size)  # moves within the table whose outcome is still unknown
+    longestLoss = bytearray(size)  # longest loss through a capture or promotion, or NO_LOSS
+    values = array.array('b', bytes(size))
+    buckets = collections.defaultdict(list)  # distance in plies -> positions resolved at it
+
+    gs = ChessEngine.GameState()
+    gs.moveCache = ChessEngine.MoveCache(0)  # every position is set up once, nothing to reuse
+    gs.board = [["--"] * 8 for _ in range(8)]
+    kings = (pieces.index('wK'), pieces.index('bK'))
+    for squares in itertools.product(range(64), repeat=n):
+        if len(set(squares)) < n or any(piece[1] == 'P' and squares[i] >> 3 in (0, 7)
+                                        for i, piece in enumerate(pieces)):
+            continue
+        for i, piece in enumerate(pieces):
+            r, c = SQUARE_COORDS[squares[i]]
+            gs.board[r][c] = piece
+        gs.syncFromBoard()
+        gs.enPassantPossible = ()
+        occ = gs.occupancy['w'] | gs.occupancy['b']
+        base = 0
+        for sq in squares:
+            base = base * 64 + sq
+        for side in (0, 1):
+            gs.whiteToMove = side == 0
+            gs.zobristKey = gs.computeZobristKey()  # getValidMoves is cached by key
+            color, enemy = ('w', 'b') if side == 0 else ('b', 'w')
+            if gs.isAttacked(squares[kings[1 - side]], color, occ):
+                continue  # the side that just moved is in check
+            index = side * span + base
+            state[index] = UNKNOWN
+            moves = gs.getValidMoves()
+            if not moves:
+                if gs.checkmate:
+                    buckets[0].append(index)
+                else:
+                    state[index] = DRAW
+                continue
+            quiet, win, loss, drawn = 0, None, 0, False
+            for move in moves:
+                if move.pieceCaptured == "--" and not move.isPawnPromotion:
+                    quiet += 1
+                    continue
+                gs.makeMove(move)
+                after = [(piece, sq) for c in ('w', 'b') for sq, piece in gs.pieceSquares[c].items()]
+                value = tables.lookup(after, gs.whiteToMove)
+                gs.undoMove()
+                if value is None:
+                    raise RuntimeError(f"{signature} needs a table for {after}")
+                if value < 0:
+                    win = -value if win is None else min(win, -value)
+                elif value > 0:
+                    loss = max(loss, value)
+                else:
+                    drawn = True
+            remaining[index] = quiet
+            longestLoss[index] = NO_LOSS if win is not None or drawn else loss
+            if win is not None:
+                buckets[win].append(index)
+            elif quiet == 0 and not drawn:
+                buckets[loss + 1].append(index)
+        for sq in squares:
+            r, c = SQUARE_COORDS[sq]
+            gs.board[r][c] = "--"
+    if progress is not None:
+        print(f"{signature}: positions set up in {time.time() - started:.1f}s", file=progress)
+
+    # distances grow by one ply per step, so the first time a position is reached is its shortest mate
+    distance = longest = 0
+    while buckets:
+        for index in buckets.pop(distance, ()):
+            if state[index] != UNKNOWN:
+                continue
+            state[index] = RESOLVED
+            longest = distance
+            lost = distance % 2 == 0
+            values[index] = -(distance + 1) if lost else distance
+            for previous in predecessors(index, pieces, n):
+                if state[previous] != UNKNOWN:
+                    continue
+                if lost:
+                    buckets[distance + 1].append(previous)
+                else:
+                    remaining[previous] -= 1
+                    if remaining[previous] == 0 and longestLoss[previous] != NO_LOSS:
+                        buckets[max(distance, longestLoss[previous]) + 1].append(previous)
+        distance += 1
+
+    wdl = bytearray((size + 3) // 4)
+    for index, value in enumerate(values):
+        if value:
+            wdl[index >> 2] |= (1 if value > 0 else 2) << ((index & 3) * 2)
+    with open(os.path.join(directory, f"{signature}.dtm"), "wb") as out:
+        out.write(values.tobytes())
+    with open(os.path.join(directory, f"{signature}.wdl"), "wb") as out:
+        out.write(wdl)
+    if progress is not None:
+        wins = sum(1 for value in values if value > 0)
+        losses = sum(1 for value in values if value < 0)
+        print(f"{signature}: {wins} wins, {losses} losses, longest mate {longest} plies, "
+              f"{time.time() - started:.1f}s", file=progress)
+
+
+def flipped(signature):
+    white, black = signature.split('v')
+    return black + 'v' + white
+
+
+def canonical(signature):
+    """The orientation tables are generated in: more pieces for white, then the stronger pieces."""
+    white, black = signature.split('v')
+    strength = lambda side: (len(side), [-ORDER.index(piece) for piece in side])
+    return signature if strength(white) >= strength(black) else flipped(signature)
+
+
+def conversions(signature):
+    """Material sets reachable from signature by one capture or promotion."""
+    white, black = signature.split('v')
+    sets = set()
+    for side, other, isWhite in ((white, black, True), (black, white, False)):
+        for i, piece in enumerate(side):
+            if piece == 'K':
+                continue
+            rest = side[:i] + side[i + 1:]
+            # captured, or for a pawn also promoted
+            for option in [rest] + ([''.join(sorted(rest + 'Q', key=ORDER.index))] if piece == 'P' else []):
+                sets.add(option + 'v' + other if isWhite else other + 'v' + option)
+    return sets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate or probe endgame tablebases")
+    commands = parser.add_subparsers(dest="command", required=True)
+    gen = commands.add_parser("generate", help="generate tables for material sets like KQvK")
+    gen.add_argument("signatures", nargs="*", default=list(DEFAULT_SETS))
+    gen.add_argument("-d", "--directory", default=DEFAULT_DIRECTORY)
+    probe = commands.add_parser("probe", help="probe a position given as pieces, e.g. wKe1 wQd1 bKe8")
+    probe.add_argument("pieces", nargs="+")
+    probe.add_argument("-b", "--black", action="store_true", help="black to move")
+    probe.add_argument("-d", "--directory", default=DEFAULT_DIRECTORY)
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        for signature in args.signatures:
+            parseSignature(signature)
+            generate(signature, args.directory)
+        return 0
+
+    gs = ChessEngine.GameState()
+    gs.board = [["--"] * 8 for _ in range(8)]
+    for item in args.pieces:
+        gs.board[ChessEngine.Move.ranksToRows[item[3]]][ChessEngine.Move.filesToCols[item[2]]] = item[:2]
+    gs.whiteToMove = not args.black
+    gs.syncFromBoard()
+    tables = Tablebases(args.directory)
+    best = tables.bestMove(gs, gs.getValidMoves())
+    print(f"dtm {tables.probeDTM(gs)}  wdl {tables.probeWDL(gs)}  best {best.getchessnotion() if best else None}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
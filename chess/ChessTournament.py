@@ -0,0 +1,248 @@
+"""Headless self-play matches between the ChessAi engines.
+
+Games run on a process pool with colours alternating every game. Each
+finished game is appended to a JSON-lines file as soon as it completes, and a
+summary with win/draw/loss, an Elo estimate with a 95% interval, average nodes
+per move, nodes per second and the share of beta cutoffs made by the first
+move searched is printed (and written as the last line) at the end:
+
+    python ChessTournament.py alphabeta:depth=3,time_limit=0.5 simple:depth=2 -n 1000 -w 16
+    python ChessTournament.py pvs:profile=1 alphabeta -n 10 --stats moves.jsonl
+    python ChessTournament.py pvs alphabeta -n 1000 --archive games.chs
+
+Engine specs are name[:key=value,...] with the keyword arguments passed to the
+searcher's constructor. Names: random, simple, alphabeta, pvs.
+"""
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import random
+import sys
+import time
+
+import ChessEngine
+from ChessAi import getRandomMove, getSimpleAlphaBetaMove, getAlphaBetaMove, getPVSMove
+from ChessArchive import ArchiveWriter
+from ChessBook import OpeningBook
+from ChessPGN import parseMove
+from ChessTablebase import Tablebases
+
+ENGINES = {
+    'random': None,
+    'simple': getSimpleAlphaBetaMove,
+    'alphabeta': getAlphaBetaMove,
+    'pvs': getPVSMove,
+}
+
+
+def parseEngine(spec):
+    """'alphabeta:depth=3,time_limit=0.5' -> ('alphabeta', {'depth': 3, 'time_limit': 0.5})"""
+    name, _, args = spec.partition(':')
+    if name not in ENGINES:
+        raise ValueError(f"unknown engine {name!r}, expected one of {', '.join(ENGINES)}")
+    kwargs = {}
+    for item in filter(None, args.split(',')):
+        key, _, value = item.partition('=')
+        kwargs[key] = float(value) if '.' in value else int(value)
+    return name, kwargs
+
+
+def makeEngine(spec, book=None, tablebases=None):
+    name, kwargs = parseEngine(spec)
+    if ENGINES[name] is None:
+        return lambda gs, validMoves: getRandomMove(gs)
+    if tablebases is not None and name != 'simple':
+        kwargs['tablebases'] = tablebases
+    return ENGINES[name](book=book, **kwargs)
+
+
+def insufficientMaterial(gs):
+    # bare kings, or a single minor piece against a bare king
+    pieces = [piece for color in ('w', 'b') for piece in gs.pieceSquares[color].values() if piece[1] != 'K']
+    return not pieces or (len(pieces) == 1 and pieces[0][1] in 'NB')
+
+
+def playGame(index, whiteSpec, blackSpec, maxPlies, seed, bookPath=None, tablebasePath=None, keepStats=False):
+    """Play one game and return its record as a dict; result is '1-0', '0-1' or '1/2-1/2'.
+
+    With keepStats the record's 'searches' holds the ChessAi.searchStats of every search."""
+    random.seed(seed)
+    book = OpeningBook(bookPath) if bookPath else None
+    tablebases = Tablebases(tablebasePath) if tablebasePath else None
+    engines = {'w': makeEngine(whiteSpec, book, tablebases), 'b': makeEngine(blackSpec, book, tablebases)}
+    stats = {color: {'nodes': 0, 'time': 0.0, 'moves': 0, 'cutoffs': 0, 'first_move_cutoffs': 0}
+             for color in ('w', 'b')}
+    gs = ChessEngine.GameState()
+    seen = {gs.zobristKey: 1}
+    quietPlies = 0  # since the last capture or pawn move
+    moves = []
+    searches = []
+    result, reason = '1/2-1/2', 'max plies'
+    while len(moves) < maxPlies:
+        validMoves = gs.getValidMoves()
+        if gs.checkmate:
+            result, reason = ('0-1' if gs.whiteToMove else '1-0'), 'checkmate'
+            break
+        if gs.stalemate:
+            reason = 'stalemate'
+            break
+        color = 'w' if gs.whiteToMove else 'b'
+        engine = engines[color]
+        start = time.perf_counter()
+        move = engine(gs, validMoves)
+        stats[color]['time'] += time.perf_counter() - start
+        stats[color]['nodes'] += getattr(engine, 'nodes_evaluated', 0)
+        stats[color]['cutoffs'] += getattr(engine, 'cutoffs', 0)
+        stats[color]['first_move_cutoffs'] += getattr(engine, 'first_move_cutoffs', 0)
+        stats[color]['moves'] += 1
+        if keepStats and getattr(engine, 'last_stats', None) is not None:
+            searches.append(dict(engine.last_stats, game=index, color=color))
+        gs.makeMove(move)
+        moves.append(move.getchessnotion())
+        quietPlies = 0 if move.pieceCaptured != "--" or move.pieceMoved[1] == 'P' else quietPlies + 1
+        seen[gs.zobristKey] = seen.get(gs.zobristKey, 0) + 1
+        if seen[gs.zobristKey] >= 3:
+            reason = 'repetition'
+            break
+        if quietPlies >= 100:
+            reason = 'fifty moves'
+            break
+        if insufficientMaterial(gs):
+            reason = 'insufficient material'
+            break
+    if book is not None:
+        book.close()
+    if tablebases is not None:
+        tablebases.close()
+    record = {'game': index, 'white': whiteSpec, 'black': blackSpec, 'result': result, 'reason': reason,
+              'plies': len(moves), 'moves': ' '.join(moves), 'stats': stats}
+    if keepStats:
+        record['searches'] = searches
+    return record
+
+
+def eloEstimate(points, games):
+    """Elo difference and 95% interval from a score of points out of games."""
+    if games == 0:
+        return 0.0, (0.0, 0.0)
+
+    def elo(score):
+        score = min(max(score, 1e-6), 1 - 1e-6)
+        return 400 * math.log10(score / (1 - score))
+
+    score = points / games
+    margin = 1.96 * math.sqrt(max(score * (1 - score), 1e-12) / games)
+    return elo(score), (elo(score - margin), elo(score + margin))
+
+
+class Summary:
+    def __init__(self, engines):
+        self.results = {spec: {'wins': 0, 'draws': 0, 'losses': 0, 'nodes': 0, 'time': 0.0, 'moves': 0,
+                               'cutoffs': 0, 'first_move_cutoffs': 0} for spec in engines}
+
+    def add(self, record):
+        points = {'1-0': (1, 0), '0-1': (0, 1), '1/2-1/2': (0.5, 0.5)}[record['result']]
+        for spec, color, score in ((record['white'], 'w', points[0]), (record['black'], 'b', points[1])):
+            entry = self.results[spec]
+            entry['wins' if score == 1 else 'losses' if score == 0 else 'draws'] += 1
+            for field in ('nodes', 'time', 'moves', 'cutoffs', 'first_move_cutoffs'):
+                entry[field] += record['stats'][color][field]
+
+    def report(self):
+        """Per-engine totals; elo is each engine's rating difference against its opponent."""
+        report = {}
+        for spec, entry in self.results.items():
+            games = entry['wins'] + entry['draws'] + entry['losses']
+            elo, (low, high) = eloEstimate(entry['wins'] + entry['draws'] / 2, games)
+            report[spec] = dict(entry, games=games,
+                                avg_nodes=entry['nodes'] / entry['moves'] if entry['moves'] else 0,
+                                nps=entry['nodes'] / entry['time'] if entry['time'] else 0,
+                                cutoff_rate=entry['first_move_cutoffs'] / entry['cutoffs'] if entry['cutoffs'] else 0,
+                                elo=elo, elo_low=low, elo_high=high)
+        return report
+
+
+def archiveGame(writer, record):
+    gs = ChessEngine.GameState()
+    for notation in record['moves'].split():
+        gs.makeMove(parseMove(gs, notation))
+    writer.append(gs.movelog, record['result'], {'Event': 'ChessTournament', 'Round': str(record['game'] + 1),
+                                                 'White': record['white'], 'Black': record['black'],
+                                                 'Termination': record['reason']})
+
+
+def runMatch(first, second, games, workers, maxPlies, out, seed=0, bookPath=None, tablebasePath=None,
+             progress=sys.stderr, statsPath=None, archive=None):
+    """Play the match and return the summary report; archive is an ArchiveWriter that gets every game.
+
+    The per-move statistics for statsPath come back with each game and are written here, one game
+    at a time, so the workers never share the file."""
+    summary = Summary([first, second])
+    statsOut = open(statsPath, "a") if statsPath else None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for index in range(games):
+            white, black = (first, second) if index % 2 == 0 else (second, first)
+            futures.append(pool.submit(playGame, index, white, black, maxPlies, seed + index, bookPath,
+                                       tablebasePath, statsOut is not None))
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            record = future.result()
+            if statsOut is not None:
+                for search in record.pop('searches'):
+                    statsOut.write(json.dumps(search) + "\n")
+                statsOut.flush()
+            summary.add(record)
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            if archive is not None:
+                archiveGame(archive, record)
+            if progress is not None:
+                print(f"\r{done}/{games} games", end="", file=progress, flush=True)
+    if statsOut is not None:
+        statsOut.close()
+    if progress is not None:
+        print(file=progress)
+    return summary.report()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless self-play between ChessAi engines")
+    parser.add_argument("first", help="engine spec, e.g. alphabeta:depth=3,time_limit=0.5")
+    parser.add_argument("second", help="engine spec, e.g. simple:depth=2")
+    parser.add_argument("-n", "--games", type=int, default=100)
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-plies", type=int, default=300, help="adjudicate as a draw after this many plies")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--book", help="opening book both engines play from, varies the openings")
+    parser.add_argument("--tablebases", help="tablebase directory for the alphabeta and pvs engines")
+    parser.add_argument("-o", "--out", default="tournament.jsonl", help="JSON-lines file for the game records")
+    parser.add_argument("--stats", help="JSON-lines file for per-move search statistics, add profile=1 to "
+                                        "an engine spec for its time split")
+    parser.add_argument("--archive", help="game archive (ChessArchive) to append every game to")
+    args = parser.parse_args(argv)
+    if args.first == args.second:
+        parser.error("the two engine specs must differ")
+    parseEngine(args.first)
+    parseEngine(args.second)
+
+    archive = ArchiveWriter(args.archive) if args.archive else None
+    try:
+        with open(args.out, "a") as out:
+            report = runMatch(args.first, args.second, args.games, args.workers, args.max_plies, out, args.seed,
+                              args.book, args.tablebases, statsPath=args.stats, archive=archive)
+            out.write(json.dumps({'summary': report}) + "\n")
+    finally:
+        if archive is not None:
+            archive.close()
+    for spec, entry in report.items():
+        print(f"{spec:<40} +{entry['wins']} ={entry['draws']} -{entry['losses']}  "
+              f"elo {entry['elo']:+.0f} [{entry['elo_low']:+.0f}, {entry['elo_high']:+.0f}]  "
+              f"avg nodes {entry['avg_nodes']:.0f}  nps {entry['nps']:.0f}  "
+              f"first-move cutoffs {entry['cutoff_rate']:.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Fixed-size transposition table shared by the alpha-beta searchers."""
+
+EXACT, LOWER, UPPER = 0, 1, 2
+FLIPPED_BOUND = {EXACT: EXACT, LOWER: UPPER, UPPER: LOWER}  # bound seen from the other side
+
+# rough cost of one slot: list pointer + 6-tuple + 64-bit key object
+ENTRY_BYTES = 136
+
+
+class TranspositionTable:
+    def __init__(self, size_mb=16):
+        self.resize(size_mb)
+
+    def resize(self, size_mb):
+        # the slot count is the largest power of two that fits the memory budget
+        slots = max(1, int(size_mb * 1024 * 1024) // ENTRY_BYTES)
+        self.size = 1 << (slots.bit_length() - 1)
+        self.mask = self.size - 1
+        self.size_mb = size_mb
+        self.clear()
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.used = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def newSearch(self):
+        # entries from earlier searches become the first candidates for replacement
+        self.generation += 1
+
+    def probe(self, key):
+        """Return (depth, flag, score, move) stored for key, or None."""
+        self.probes += 1
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1:5]
+        return None
+
+    def getMove(self, key):
+        """Best move stored for key, without counting a probe."""
+        entry = self.entries[key & self.mask]
+        return entry[4] if entry is not None and entry[0] == key else None
+
+    def store(self, key, depth, flag, score, move):
+        # replace when the slot is empty, holds this position, is stale, or was searched less deep
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None:
+            self.used += 1
+        elif entry[0] != key and entry[5] == self.generation and entry[1] > depth:
+            return
+        elif entry[0] != key:
+            self.replacements += 1
+        elif move is None:
+            move = entry[4]  # keep the best move of a previous search of this position
+        self.stores += 1
+        self.entries[index] = (key, depth, flag, score, move, self.generation)
+
+    def stats(self):
+        return {
+            'size_mb': self.size_mb,
+            'slots': self.size,
+            'used': self.used,
+            'occupancy': self.used / self.size,
+            'probes': self.probes,
+            'hits': self.hits,
+            'hit_rate': self.hits / self.probes if self.probes else 0.0,
+            'stores': self.stores,
+            'replacements': self.replacements,
+        }
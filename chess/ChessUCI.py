@@ -0,0 +1,327 @@
+"""UCI front-end for the searchers, for GUIs and match runners such as cutechess-cli.
+
+Reads UCI commands on stdin and answers on stdout:
+
+    python ChessUCI.py
+    python ChessUCI.py --book book.bin --tablebases tb/
+
+One GameState and one searcher live for the whole session. A position command
+that extends the previous one plays only the new moves, and the searcher keeps
+its transposition table and history between moves, so every go starts from
+what the last one learned. The search runs on its own thread so stop and
+isready are answered while it thinks; an info line is written after each
+completed depth. Threads above 1 switches to the root-parallel searcher.
+go ponder searches without a time limit until ponderhit, which gives it the
+budget of the clock times sent with the go, counted from the ponderhit.
+
+The engine has no castling and always promotes to a queen: castling moves are
+rejected and a promotion is written with a q. Nothing here imports pygame.
+"""
+import argparse
+import sys
+import threading
+import time
+
+import ChessEngine
+from ChessAi import getPVSMove, MATE_SCORE, MAX_PLY
+from ChessPGN import parseMove
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1"
+DEFAULT_HASH = 16
+MAX_HASH = 1024
+MAX_THREADS = 64
+MOVES_TO_GO = 30  # moves the remaining clock time is shared between when the GUI does not say
+MOVE_OVERHEAD = 0.05  # seconds kept back per move for the GUI and the pipe
+
+
+def uciMove(move):
+    return move.getchessnotion() + ('q' if move.isPawnPromotion else '')
+
+
+def uciScore(searcher):
+    score = searcher.best_score
+    if abs(score) < MATE_SCORE:
+        return f"cp {int(score)}"
+    plies = MATE_SCORE + MAX_PLY - abs(score)  # from the root to the mate, see ChessAi.mateScore
+    return f"mate {(plies + 1) // 2 if score > 0 else -(plies // 2)}"
+
+
+class UCIEngine:
+    def __init__(self, out=sys.stdout, book=None, tablebases=None):
+        self.out = out
+        self.outLock = threading.Lock()
+        self.book = book
+        self.tablebases = tablebases
+        self.hash_mb = DEFAULT_HASH
+        self.threads = 1
+        self.searcher = None
+        self.gs = ChessEngine.GameState()
+        self.positionFen = START_FEN
+        self.positionMoves = []  # the moves of the last position command, played on self.gs
+        self.thread = None
+        self.infinite = False
+        self.stopEvent = threading.Event()
+        self.release = threading.Event()  # set when the bestmove may be sent: at once, on stop or on ponderhit
+        self.ponderLimits = None  # (hard, soft) seconds a ponder search gets on ponderhit
+        self.lock = threading.Lock()
+
+    def send(self, line):
+        with self.outLock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    def getSearcher(self):
+        if self.searcher is None:
+            if self.threads > 1:
+                from ChessParallel import getParallelAlphaBetaMove  # starts a process pool, only when asked
+                self.searcher = getParallelAlphaBetaMove(workers=self.threads, hash_mb=self.hash_mb,
+                                                         book=self.book, tablebases=self.tablebases)
+                # forked from the search thread, a worker would hang on the stdin lock the reader holds
+                self.searcher.startPool()
+            else:
+                self.searcher = getPVSMove(hash_mb=self.hash_mb, book=self.book, tablebases=self.tablebases)
+            self.searcher.on_iteration = self.sendInfo
+        return self.searcher
+
+    def dropSearcher(self):
+        if self.searcher is not None and hasattr(self.searcher, 'close'):
+            self.searcher.close()
+        self.searcher = None
+
+    def handle(self, line):
+        """Run one command line, returning False on quit."""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send("id name ChessAi PVS")
+            self.send("id author fkamalo")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH} min 1 max {MAX_HASH}")
+            self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self.send("option name Ponder type check default false")
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'setoption':
+            self.stop()
+            self.setOption(args)
+        elif command == 'ucinewgame':
+            self.stop()
+            if self.searcher is not None:
+                self.searcher.tt.clear()
+                for table in self.searcher.history.values():
+                    table[:] = [0] * len(table)
+            self.gs.moveCache.clear()
+        elif command == 'position':
+            self.stop()
+            self.setPosition(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'ponderhit':
+            self.ponderHit()
+        elif command == 'quit':
+            self.stop()
+            self.dropSearcher()
+            return False
+        elif command != 'debug':
+            self.send(f"info string unknown command {command}")
+        return True
+
+    def setOption(self, args):
+        # setoption name <name...> [value <value...>]
+        text = ' '.join(args)
+        if not text.startswith('name '):
+            return
+        name, _, value = text[5:].partition(' value ')
+        name = name.strip().lower()
+        try:
+            if name == 'hash':
+                self.hash_mb = max(1, min(MAX_HASH, int(value)))
+                if self.searcher is not None and self.threads == 1:
+                    self.searcher.tt.resize(self.hash_mb)
+                else:
+                    self.dropSearcher()  # the workers size their tables when the pool starts
+            elif name == 'ponder':
+                pass  # the GUI decides when to send go ponder, there is nothing to set up
+            elif name == 'threads':
+                threads = max(1, min(MAX_THREADS, int(value)))
+                if threads != self.threads:
+                    self.threads = threads
+                    self.dropSearcher()
+            else:
+                self.send(f"info string unknown option {name}")
+        except ValueError:
+            self.send(f"info string bad value {value!r} for {name}")
+
+    def setPosition(self, args):
+        if 'moves' in args:
+            index = args.index('moves')
+            spec, moves = args[:index], args[index + 1:]
+        else:
+            spec, moves = args, []
+        if spec[:1] == ['startpos']:
+            fen = START_FEN
+        elif spec[:1] == ['fen']:
+            fen = ' '.join(spec[1:])
+        else:
+            self.send("info string position needs startpos or fen")
+            return
+
+        # the same game a few moves on: keep the position and play only what is new
+        known = len(self.positionMoves)
+        if fen != self.positionFen or moves[:known] != self.positionMoves:
+            try:
+                self.gs.loadFEN(fen)
+            except (ValueError, KeyError, IndexError):
+                self.send(f"info string bad fen {fen}")
+                self.gs.loadFEN(START_FEN)
+                fen, moves = START_FEN, []
+            self.positionFen, self.positionMoves, known = fen, [], 0
+        for token in moves[known:]:
+            move = parseMove(self.gs, token)
+            if move is None:
+                self.send(f"info string illegal move {token}")
+                break
+            self.gs.makeMove(move)
+            self.positionMoves.append(token)
+
+    def go(self, args):
+        params = {}
+        infinite = ponder = False
+        index = 0
+        while index < len(args):
+            name = args[index]
+            if name in ('infinite', 'ponder'):
+                infinite = infinite or name == 'infinite'
+                ponder = ponder or name == 'ponder'
+                index += 1
+            elif name == 'searchmoves':
+                index = len(args)  # restricting the root is not supported, search everything
+            else:
+                if index + 1 < len(args):
+                    try:
+                        params[name] = int(args[index + 1])
+                    except ValueError:
+                        pass
+                index += 2
+
+        searcher = self.getSearcher()
+        searcher.max_depth = min(params.get('depth', MAX_PLY), MAX_PLY)
+        searcher.node_limit = params.get('nodes')
+        hard, soft = self.timeBudget(params, infinite)
+        self.ponderLimits = (hard, soft) if ponder else None
+        if ponder:
+            hard = soft = float('inf')
+        searcher.time_limit, searcher.soft_time_limit = hard, soft
+        self.stopEvent = threading.Event()
+        self.release = threading.Event()
+        if not (infinite or ponder):
+            self.release.set()
+        self.infinite = infinite or ponder
+        searcher.stop_event = self.stopEvent
+        self.thread = threading.Thread(target=self.search, args=(searcher,), daemon=True)
+        self.thread.start()
+
+    def ponderHit(self):
+        """The move pondered on was played: the search runs on, now within its clock budget."""
+        with self.lock:
+            if self.thread is None or self.ponderLimits is None:
+                return
+            searcher = self.searcher
+            hard, soft = self.ponderLimits
+            elapsed = time.time() - searcher.start_time
+            searcher.soft_time_limit = elapsed + soft
+            searcher.time_limit = elapsed + hard
+            self.ponderLimits = None
+            self.infinite = False
+            self.release.set()
+
+    def timeBudget(self, params, infinite):
+        """(hard, soft) seconds for a go command."""
+        if infinite:
+            return float('inf'), float('inf')
+        if 'movetime' in params:
+            seconds = max(0.001, params['movetime'] / 1000 - MOVE_OVERHEAD)
+            return seconds, seconds
+        remaining = params.get('wtime' if self.gs.whiteToMove else 'btime')
+        if remaining is None:
+            return float('inf'), float('inf')  # depth or nodes only, or nothing at all
+        remaining = max(0.0, remaining / 1000 - MOVE_OVERHEAD)
+        increment = params.get('winc' if self.gs.whiteToMove else 'binc', 0) / 1000
+        movesToGo = params.get('movestogo') or MOVES_TO_GO
+        soft = min(remaining / movesToGo + increment, remaining / 2)
+        hard = min(3 * soft, remaining / 2)
+        return max(0.001, hard), max(0.001, soft)
+
+    def search(self, searcher):
+        validMoves = self.gs.getValidMoves()
+        move = searcher(self.gs, validMoves) if validMoves else None
+        self.release.wait()  # under go infinite or go ponder the answer waits for stop or ponderhit
+        searcher.stop_event = None
+        if move is None:
+            self.send("bestmove 0000")
+            return
+        pv = searcher.pv
+        if len(pv) > 1 and pv[0] == move:
+            self.send(f"bestmove {uciMove(move)} ponder {uciMove(pv[1])}")
+        else:
+            self.send(f"bestmove {uciMove(move)}")
+
+    def sendInfo(self, searcher):
+        elapsed = time.time() - searcher.start_time
+        nodes = searcher.nodes_evaluated
+        self.send(f"info depth {searcher.completed_depth} score {uciScore(searcher)} nodes {nodes} "
+                  f"nps {int(nodes / elapsed) if elapsed > 0 else 0} time {int(elapsed * 1000)} "
+                  f"pv {' '.join(uciMove(move) for move in searcher.pv)}")
+
+    def stop(self):
+        """Stop a running search and wait for its bestmove."""
+        if self.thread is not None:
+            self.stopEvent.set()
+            self.release.set()
+            self.thread.join()
+            with self.lock:
+                self.thread = None
+                self.ponderLimits = None
+
+    def finish(self):
+        """Let a timed search run to its bestmove, as when input ends without quit."""
+        if self.thread is not None and not self.infinite:
+            self.thread.join()
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="UCI engine over stdin/stdout")
+    parser.add_argument("--book", help="opening book to play from")
+    parser.add_argument("--tablebases", help="tablebase directory probed in the search")
+    args = parser.parse_args(argv)
+    book = tablebases = None
+    if args.book:
+        from ChessBook import OpeningBook
+        book = OpeningBook(args.book)
+    if args.tablebases:
+        from ChessTablebase import Tablebases
+        tablebases = Tablebases(args.tablebases)
+
+    engine = UCIEngine(book=book, tablebases=tablebases)
+    try:
+        for line in sys.stdin:
+            if not engine.handle(line):
+                break
+    finally:
+        engine.finish()
+        engine.dropSearcher()
+        if book is not None:
+            book.close()
+        if tablebases is not None:
+            tablebases.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
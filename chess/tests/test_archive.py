@@ -0,0 +1,95 @@
+import io
+import random
+
+import pytest
+
+import ChessEngine
+from ChessArchive import ArchiveWriter, GameArchive, pgnRecords, recordsFromPGN
+from ChessPGN import writeGames
+from ChessPerft import playMoves
+
+PROMOTION_FEN = "rnbqk1nr/1pppppP1/p7/8/8/8/PPPPPPP1/RNBQKBNR w - - 0 5"
+EN_PASSANT_FEN = "rnbqkbnr/1pp1pppp/p7/3pP3/8/8/PPPP1PPP/RNBQKBNR w - d6 0 3"
+
+
+def randomGame(seed, fen=None, first=(), plies=80):
+    rng = random.Random(seed)
+    gs = playMoves(ChessEngine.GameState.fromFEN(fen) if fen else ChessEngine.GameState(), first)
+    for _ in range(plies):
+        validMoves = gs.getValidMoves()
+        if not validMoves:
+            break
+        gs.makeMove(rng.choice(validMoves))
+    return gs.movelog
+
+
+GAMES = [({'White': 'a', 'Black': 'b'}, randomGame(1), '1-0'),
+         ({}, randomGame(2), '1/2-1/2'),
+         ({'FEN': PROMOTION_FEN}, randomGame(3, PROMOTION_FEN, ['g7h8']), '*'),
+         ({'FEN': EN_PASSANT_FEN, 'Round': '2'}, randomGame(6, EN_PASSANT_FEN, ['e5d6']), '1-0'),
+         ({'Event': 'empty'}, [], '0-1')]
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "games.chs")
+    with ArchiveWriter(path) as writer:
+        assert writer.extend(GAMES) == len(GAMES)
+    return path
+
+
+def codes(moves):
+    return [move.code for move in moves]
+
+
+def test_round_trip(path):
+    with GameArchive(path) as archive:
+        assert len(archive) == len(GAMES)
+        for number, (tags, moves, result) in enumerate(GAMES):
+            assert archive.entry(number)[1:] == (len(moves), result)
+            readTags, readMoves, readResult = archive[number]
+            assert readTags == tags and readResult == result
+            assert codes(readMoves) == codes(moves)
+        with pytest.raises(IndexError):
+            archive.entry(len(GAMES))
+
+
+def test_append_reopened(path):
+    with ArchiveWriter(path) as writer:
+        assert len(writer) == len(GAMES)
+        assert writer.append(randomGame(4), '0-1') == len(GAMES)
+    with GameArchive(path) as archive:
+        assert codes(archive[len(GAMES)][1]) == codes(randomGame(4))
+
+
+def test_torn_record_dropped(path):
+    with open(path, "ab") as data:
+        data.write(b"\x05\x00\x01\x00\x00\x12")  # the start of a record the index never got
+    with ArchiveWriter(path) as writer:
+        assert len(writer) == len(GAMES)
+        writer.append(randomGame(5), '1-0')
+    with GameArchive(path) as archive:
+        assert [codes(moves) for _, moves, _ in archive] == [codes(moves) for _, moves, _ in GAMES] + \
+            [codes(randomGame(5))]
+
+
+def test_pgn_round_trip(path):
+    out = io.StringIO()
+    with GameArchive(path) as archive:
+        writeGames(out, pgnRecords(archive))
+    games = list(recordsFromPGN(io.StringIO(out.getvalue())))
+    assert len(games) == len(GAMES)
+    for (tags, moves, result), (readTags, readMoves, readResult) in zip(GAMES, games):
+        assert readResult == result
+        assert codes(readMoves) == codes(moves)
+        assert all(readTags[name] == value for name, value in tags.items())
+
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / "games.chs"
+    path.write_bytes(b"CHSBOOK1")
+    (tmp_path / "games.chs.idx").write_bytes(b"CHSGIDX1")
+    with pytest.raises(ValueError):
+        GameArchive(str(path))
+    with pytest.raises(ValueError):
+        ArchiveWriter(str(path))
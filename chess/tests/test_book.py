@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+import ChessEngine
+from ChessBook import OpeningBook, buildBook
+from ChessEngine import SQUARES_MASK
+from ChessPerft import playMoves
+
+GAMES = [["e4", "e5", "Nf3"], ["e2e4", "c7c5"], ["e4", "e5", "Bc4"], ["d4", "d5"]]
+
+
+def squares(gs, notation):
+    return next(move.code & SQUARES_MASK for move in gs.getValidMoves() if move.getchessnotion() == notation)
+
+
+@pytest.fixture
+def book(tmp_path):
+    path = str(tmp_path / "book.bin")
+    assert buildBook(GAMES, path) == 7
+    with OpeningBook(path) as book:
+        yield book
+
+
+def test_lookup(book):
+    gs = ChessEngine.GameState()
+    assert sorted(book.lookup(gs.zobristKey)) == sorted([(squares(gs, 'e2e4'), 3), (squares(gs, 'd2d4'), 1)])
+    playMoves(gs, ['e2e4'])
+    assert sorted(book.lookup(gs.zobristKey)) == sorted([(squares(gs, 'e7e5'), 2), (squares(gs, 'c7c5'), 1)])
+    playMoves(gs, ['e7e5'])
+    assert len(book.lookup(gs.zobristKey)) == 2
+    playMoves(gs, ['g1f3'])
+    assert book.lookup(gs.zobristKey) == []
+
+
+def test_choose_move(book):
+    gs = ChessEngine.GameState()
+    rng = random.Random(1)
+    picks = [book.chooseMove(gs, gs.getValidMoves(), rng).getchessnotion() for _ in range(200)]
+    assert set(picks) == {'e2e4', 'd2d4'}
+    assert picks.count('e2e4') > picks.count('d2d4')
+    playMoves(gs, ['a2a3'])
+    assert book.chooseMove(gs, gs.getValidMoves(), rng) is None
+
+
+def test_min_count_and_plies(tmp_path):
+    path = str(tmp_path / "book.bin")
+    assert buildBook(GAMES, path, plies=1, min_count=2) == 1
+    with OpeningBook(path) as book:
+        assert len(book) == 1
+        gs = ChessEngine.GameState()
+        assert book.lookup(gs.zobristKey) == [(squares(gs, 'e2e4'), 3)]
+
+
+def test_not_a_book(tmp_path):
+    path = tmp_path / "book.bin"
+    path.write_bytes(b"not a book at all")
+    with pytest.raises(ValueError):
+        OpeningBook(str(path))
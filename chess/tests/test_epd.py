@@ -0,0 +1,35 @@
+from ChessEPD import parseEPD, runSuite, solvePosition, initWorker
+
+LINES = [
+    'rnbqkbnr/ppppp2p/5p2/6p1/3PP3/8/PPP2PPP/RNBQKBNR w - g6 bm Qh5+; id "mate";',
+    'rnbqkbnr/ppppp2p/5p2/6p1/3PP3/8/PPP2PPP/RNBQKBNR w - -',  # no bm or am
+    'garbage',
+    '4k3/8/8/8/8/8/8/P3K3 w - - bm Kd2; id "pawn on the first rank";',
+    '7k/6Q1/6K1/8/8/8/8/8 b - - bm Kg8; id "mated";',
+    '# a comment',
+    '',
+    'rnbqkbnr/ppppp2p/5p2/6p1/3PP3/8/PPP2PPP/RNBQKBNR w - g6 am Qh5; id "avoid";',
+]
+
+
+def test_parse_epd():
+    fen, operations = parseEPD('4k3/8/8/8/8/8/8/4K2R w K - bm Rh8+; id "WAC.001"; c0 "two words";')
+    assert fen == "4k3/8/8/8/8/8/8/4K2R w K - 0 1"
+    assert operations == {'bm': ['Rh8+'], 'id': ['WAC.001'], 'c0': ['two words']}
+
+
+def test_bad_lines_do_not_stop_the_suite():
+    records = {record['line']: record for record in runSuite(LINES, depth=2, time_limit=5, workers=1)}
+    assert sorted(records) == [1, 2, 3, 4, 5, 8]
+    assert records[1]['solved'] and records[1]['move'] == 'd1h5'
+    assert records[8]['solved'] is False
+    assert records[2]['skipped'] == 'no playable bm/am'
+    assert 'bad EPD line' in records[3]['skipped'] and records[3]['id'] == '3'
+    assert 'first or last rank' in records[4]['skipped'] and records[4]['id'] == 'pawn on the first rank'
+    assert records[5]['skipped'] == 'no legal moves'
+
+
+def test_solve_in_process():
+    initWorker('pvs', 2, 5, 1)
+    record = solvePosition(1, LINES[0])
+    assert record['solved'] and record['nodes_to_solution'] <= record['nodes']
@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+import ChessEngine
+from ChessPerft import POSITIONS
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1"
+
+
+@pytest.mark.parametrize("fen", [fen for fen, _ in POSITIONS.values()], ids=list(POSITIONS))
+def test_round_trip(fen):
+    gs = ChessEngine.GameState.fromFEN(fen)
+    assert gs.toFEN() == fen
+    assert gs.zobristKey == gs.computeZobristKey()
+
+
+def test_initial_position():
+    gs = ChessEngine.GameState()
+    assert gs.toFEN() == START_FEN
+    assert ChessEngine.GameState.fromFEN(START_FEN).zobristKey == gs.zobristKey
+
+
+def test_castling_rights_are_dropped():
+    gs = ChessEngine.GameState.fromFEN("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    assert gs.toFEN() == START_FEN
+
+
+def test_round_trip_through_a_game():
+    rng = random.Random(7)
+    gs = ChessEngine.GameState()
+    for _ in range(120):
+        validMoves = gs.getValidMoves()
+        if not validMoves:
+            break
+        gs.makeMove(rng.choice(validMoves))
+        fen = gs.toFEN()
+        loaded = ChessEngine.GameState.fromFEN(fen)
+        assert loaded.toFEN() == fen
+        assert loaded.zobristKey == gs.zobristKey
+        assert sorted(move.code for move in loaded.getValidMoves()) == \
+            sorted(move.code for move in gs.getValidMoves())
+
+
+@pytest.mark.parametrize("fen", [
+    "",
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w - - 0 1",  # seven ranks
+    "rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1",  # nine files
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x - - 0 1",
+    "rnbqkbnr/ppppxppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1",
+    "8/8/8/8/8/8/8/4K3 w - - 0 1",  # no black king
+    "4k3/8/8/8/8/8/8/P3K3 w - - 0 1",  # pawn on the first rank
+    "p3k3/8/8/8/8/8/8/4K3 b - - 0 1",  # pawn on the last rank
+    "rnbqkbnr/1pp1pppp/p7/3pP3/8/8/PPPP1PPP/RNBQKBNR b - d6 0 3",  # en passant square for the wrong side
+    "rnbqkbnr/1pp1pppp/p7/3pP3/8/8/PPPP1PPP/RNBQKBNR w - d3 0 3",
+    "rnbqkbnr/1pp1pppp/p7/3pP3/8/8/PPPP1PPP/RNBQKBNR w - e6 0 3",  # no pawn that has just moved two
+    "rnbqkbnr/1pp1pppp/p7/3pP3/8/8/PPPP1PPP/RNBQKBNR w - z6 0 3",
+])
+def test_bad_fen(fen):
+    with pytest.raises(ValueError):
+        ChessEngine.GameState.fromFEN(fen)
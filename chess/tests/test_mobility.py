@@ -0,0 +1,81 @@
+import pytest
+
+import ChessEngine
+from ChessAi import MOBILITY_WEIGHTS
+from ChessPerft import POSITIONS
+
+FENS = [fen for fen, _ in POSITIONS.values()] + [
+    "4k3/8/8/8/8/8/8/4K3 w - - 0 1",
+    "r3k2r/1b2qppp/p1n1pn2/1pb5/3P4/P1NBPN2/1PQ2PPP/R1B1K2R b - - 0 11",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "4k3/P7/8/8/8/8/7p/4K3 w - - 0 1",  # pawns one step from promotion
+]
+STEPS = {'N': [(1, 2), (2, 1), (-1, 2), (-2, 1), (1, -2), (2, -1), (-1, -2), (-2, -1)],
+         'B': [(1, 1), (1, -1), (-1, 1), (-1, -1)], 'R': [(1, 0), (-1, 0), (0, 1), (0, -1)]}
+STEPS['Q'] = STEPS['K'] = STEPS['B'] + STEPS['R']
+
+
+def directCount(board, color, letter):
+    """Squares the pieces of one kind reach, walked square by square on the board."""
+    count = 0
+    for r in range(8):
+        for c in range(8):
+            if board[r][c] != color + letter:
+                continue
+            if letter == 'P':
+                forward = -1 if color == 'w' else 1
+                if 0 <= r + forward < 8 and board[r + forward][c] == "--":
+                    count += 1
+                    if r == (6 if color == 'w' else 1) and board[r + 2 * forward][c] == "--":
+                        count += 1
+                for dc in (-1, 1):
+                    if 0 <= r + forward < 8 and 0 <= c + dc < 8 and board[r + forward][c + dc][0] not in (color, '-'):
+                        count += 1
+                continue
+            for dr, dc in STEPS[letter]:
+                rr, cc = r + dr, c + dc
+                while 0 <= rr < 8 and 0 <= cc < 8:
+                    if board[rr][cc][0] != color:
+                        count += 1
+                    if board[rr][cc] != "--" or letter in 'NK':
+                        break
+                    rr, cc = rr + dr, cc + dc
+    return count
+
+
+def flipped(fen):
+    placement, side, castling, enPassant = fen.split()[:4]
+    placement = '/'.join(reversed(placement.split('/'))).swapcase()
+    enPassant = enPassant if enPassant == '-' else enPassant[0] + str(9 - int(enPassant[1]))
+    return f"{placement} {'b' if side == 'w' else 'w'} {castling} {enPassant} 0 1"
+
+
+@pytest.mark.parametrize("fen", FENS)
+def test_counts_per_piece(fen):
+    gs = ChessEngine.GameState.fromFEN(fen)
+    for letter in 'PNBRQK':
+        weights = {other: int(other == letter) for other in 'PNBRQK'}
+        assert gs.mobility(weights) == (directCount(gs.board, 'w', letter), directCount(gs.board, 'b', letter))
+    white = sum(MOBILITY_WEIGHTS[letter] * directCount(gs.board, 'w', letter) for letter in 'PNBRQK')
+    black = sum(MOBILITY_WEIGHTS[letter] * directCount(gs.board, 'b', letter) for letter in 'PNBRQK')
+    assert gs.mobility(MOBILITY_WEIGHTS) == (white, black)
+
+
+@pytest.mark.parametrize("fen", FENS)
+def test_colour_flip(fen):
+    white, black = ChessEngine.GameState.fromFEN(fen).mobility(MOBILITY_WEIGHTS)
+    assert ChessEngine.GameState.fromFEN(flipped(fen)).mobility(MOBILITY_WEIGHTS) == (black, white)
+    white, black = ChessEngine.GameState.fromFEN(fen).mobility()
+    assert ChessEngine.GameState.fromFEN(flipped(fen)).mobility() == (black, white)
+
+
+def test_updates_with_moves():
+    gs = ChessEngine.GameState()
+    assert gs.mobility() == (20, 20)  # 16 pawn pushes and 4 knight moves each
+    for notation in ('e2e4', 'e7e5'):
+        gs.makeMove(next(move for move in gs.getValidMoves() if move.getchessnotion() == notation))
+    assert gs.mobility() == tuple(sum(directCount(gs.board, color, letter) for letter in 'PNBRQK')
+                                  for color in ('w', 'b'))
+    gs.undoMove()
+    gs.undoMove()
+    assert gs.mobility() == (20, 20)
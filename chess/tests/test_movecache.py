@@ -0,0 +1,67 @@
+import random
+
+import ChessEngine
+from ChessAi import getAlphaBetaMove
+from ChessBackground import BackgroundSearch
+from ChessEngine import MoveCache
+
+
+def codes(moves):
+    return sorted(move.code for move in moves)
+
+
+def test_hits_on_a_repeated_position():
+    gs = ChessEngine.GameState()
+    gs.getValidMoves()
+    assert (gs.moveCache.hits, gs.moveCache.misses) == (0, 1)
+    gs.getValidMoves()
+    assert gs.moveCache.hits == 1
+    move = gs.getValidMoves()[0]
+    gs.makeMove(move)
+    gs.getValidMoves()
+    gs.undoMove()
+    gs.getValidMoves()  # back where it started, served from the cache
+    assert (gs.moveCache.hits, gs.moveCache.misses) == (3, 2)
+    assert gs.moveCache.stats()['entries'] == 2
+
+
+def test_no_stale_moves():
+    rng = random.Random(11)
+    gs = ChessEngine.GameState()
+    gs.moveCache = MoveCache(size=64)  # small, so entries are evicted along the way
+    for _ in range(300):
+        moves = gs.getValidMoves()
+        fresh = ChessEngine.GameState.fromFEN(gs.toFEN())
+        fresh.moveCache = MoveCache(size=0)
+        assert codes(moves) == codes(fresh.getValidMoves())
+        assert (gs.checkmate, gs.stalemate) == (fresh.checkmate, fresh.stalemate)
+        if not moves or rng.random() < 0.3 and gs.movelog:
+            gs.undoMove()
+        else:
+            gs.makeMove(rng.choice(moves))
+    assert gs.moveCache.hits and len(gs.moveCache.entries) <= 64
+
+
+def test_lru_eviction():
+    cache = MoveCache(size=2)
+    for key in (1, 2, 3):
+        cache.put((key, (), False, False))
+    assert cache.get(1) is None and cache.get(2) is not None
+    cache.put((4, (), False, False))  # 3 was used least recently
+    assert cache.get(3) is None and cache.get(2) is not None and cache.get(4) is not None
+    cache.clear()
+    assert cache.stats() == {'size': 2, 'entries': 0, 'hits': 0, 'misses': 0, 'hit_rate': 0.0}
+
+
+def test_background_search_shares_the_cache():
+    gs = ChessEngine.GameState()
+    search = BackgroundSearch(getAlphaBetaMove(depth=2, time_limit=10), gs).start()
+    search.finished.wait(30)
+    assert search.position.moveCache is gs.moveCache
+    misses = gs.moveCache.misses
+    for move in gs.getValidMoves():  # every reply was generated by the search
+        gs.makeMove(move)
+        gs.getValidMoves()
+        gs.undoMove()
+    assert gs.moveCache.misses == misses
+    assert search.move() in gs.getValidMoves()
@@ -0,0 +1,21 @@
+import pytest
+
+from ChessPerft import POSITIONS, divide, perft, playMoves, startPosition
+
+CASES = [(name, depth, count) for name, (_, expected) in POSITIONS.items() for depth, count in expected.items()]
+
+
+@pytest.mark.parametrize("name, depth, count", CASES, ids=[f"{name}-{depth}" for name, depth, _ in CASES])
+def test_perft(name, depth, count):
+    gs = startPosition(POSITIONS[name][0])
+    key, fen = gs.zobristKey, gs.toFEN()
+    assert perft(gs, depth) == count
+    assert gs.zobristKey == key and gs.toFEN() == fen  # every move was taken back
+
+
+def test_divide_adds_up_to_perft():
+    fen, expected = POSITIONS['en-passant']
+    counts = dict(divide(startPosition(fen), 3))
+    assert len(counts) == expected[1]
+    assert sum(counts.values()) == expected[3]
+    assert counts['e5d6'] == perft(playMoves(startPosition(fen), ['e5d6']), 2)  # the en passant capture
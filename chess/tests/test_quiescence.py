@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+import ChessEngine
+from ChessAi import captureGains, getAlphaBetaMove, getPVSMove, getSimpleAlphaBetaMove
+
+XRAY = "1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1"
+POISONED_PAWN = "4k3/2p5/3p4/8/8/8/8/3QK3 w - - 0 1"  # Qxd6 cxd6
+HANGING_QUEEN = "4k3/8/8/3q4/8/8/8/3RK3 w - - 0 1"
+
+
+def findMove(gs, notation):
+    return next(move for move in gs.getValidMoves() if move.getchessnotion() == notation)
+
+
+@pytest.mark.parametrize("fen, notation, gain", [
+    ("4k3/8/8/3p4/8/8/8/3RK3 w - - 0 1", "d1d5", 100),  # an undefended pawn
+    ("4k3/8/8/3q4/8/8/8/3RK3 w - - 0 1", "d1d5", 900),
+    ("4k3/8/2p5/3n4/8/8/8/3RK3 w - - 0 1", "d1d5", 320 - 500),  # defended knight
+    (POISONED_PAWN, "d1d6", 100 - 900),
+    ("3rk3/3r4/8/3p4/8/8/3R4/3RK3 w - - 0 1", "d2d5", -400),  # stacked rooks on both sides
+    (XRAY, "d3e5", -220),  # Nxe5 Nxe5 Rxe5 Bxe5 Qxe5 Qxe5, the queens and rooks behind each other
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6", 100),  # en passant
+    ("rnbqkbnr/1pp1pppp/p7/3pP3/8/8/PPPP1PPP/RNBQKBNR w - d6 0 3", "e5d6", 0),  # exd6 cxd6
+    ("4k3/6P1/8/8/8/8/8/4K3 w - - 0 1", "g7g8", 800),  # promotion
+])
+def test_static_exchange(fen, notation, gain):
+    gs = ChessEngine.GameState.fromFEN(fen)
+    assert gs.staticExchange(findMove(gs, notation)) == gain
+
+
+def test_capture_gains_drops_losing_captures():
+    gs = ChessEngine.GameState.fromFEN(XRAY)
+    notations = [move.getchessnotion() for _, move in captureGains(gs, gs.getValidMoves())]
+    assert "d3e5" not in notations
+    gs = ChessEngine.GameState.fromFEN("4k3/8/2p5/3n4/8/7p/8/3RK2R w - - 0 1")
+    assert [(gain, move.getchessnotion()) for gain, move in captureGains(gs, gs.getValidMoves())] == \
+        [(100, "h1h3")]
+
+
+@pytest.mark.parametrize("searcher", [getSimpleAlphaBetaMove, getAlphaBetaMove, getPVSMove])
+def test_depth_one_sees_past_the_horizon(searcher):
+    engine = searcher(depth=1, time_limit=10)
+    gs = ChessEngine.GameState.fromFEN(POISONED_PAWN)
+    assert engine(gs, gs.getValidMoves()).getchessnotion() != "d1d6"
+    gs = ChessEngine.GameState.fromFEN(HANGING_QUEEN)
+    assert engine(gs, gs.getValidMoves()).getchessnotion() == "d1d5"
+
+
+def quiescence(fen, alpha=float('-inf'), beta=float('inf')):
+    searcher = getAlphaBetaMove()
+    searcher.start_time = time.time()
+    searcher.next_check = searcher.check_interval
+    gs = ChessEngine.GameState.fromFEN(fen)
+    searcher.root_ply = len(gs.zobristLog)
+    return searcher, gs, searcher.quiescence(gs, alpha, beta)
+
+
+def test_quiescence_resolves_captures():
+    searcher, gs, score = quiescence(HANGING_QUEEN)
+    assert score >= searcher.evaluatePosition(gs) + 800  # Rxd5 is found
+    searcher, gs, score = quiescence(POISONED_PAWN)
+    assert score == searcher.evaluatePosition(gs)  # standing pat beats the losing Qxd6
+
+
+def test_delta_pruning():
+    searcher, gs, _ = quiescence(HANGING_QUEEN)
+    static = searcher.evaluatePosition(gs)
+    searcher, _, score = quiescence(HANGING_QUEEN, static + 2000, static + 3000)
+    assert score == static and searcher.qnodes == 1  # winning the queen cannot reach alpha
@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+from ChessServer import request, startServer, stopServer
+
+
+def withServer(client, **options):
+    """Run client(reader, writer, game_server) against a loopback server with one worker."""
+    async def main():
+        server, game_server = await startServer('127.0.0.1', 0, 1, depth=2, max_move_time=0.2, **options)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            try:
+                await client(reader, writer, game_server)
+            finally:
+                writer.close()
+                await writer.wait_closed()
+        finally:
+            await stopServer(server, game_server)
+    asyncio.run(main())
+
+
+def test_game():
+    async def client(reader, writer, game_server):
+        reply = await request(reader, writer, {'op': 'new', 'engine': 'b', 'budget': 5})
+        assert reply['ok'] and reply['status'] == 'playing'
+        game = reply['game']
+        reply = await request(reader, writer, {'op': 'move', 'game': game, 'move': 'e2e4'})
+        assert reply['ok'] and reply['fen'].split()[1] == 'w'
+        assert reply['depth'] >= 1 and reply['clock'] < 5
+        state = await request(reader, writer, {'op': 'state', 'game': game})
+        assert state['fen'] == reply['fen'] and state['engine_seconds'] > 0
+        stats = await request(reader, writer, {'op': 'stats'})
+        assert stats['ok'] and stats['completed'] == 1 and stats['sessions'] == 1
+        assert (await request(reader, writer, {'op': 'close', 'game': game}))['ok']
+        assert not game_server.sessions
+    withServer(client)
+
+
+def test_engine_plays_white():
+    async def client(reader, writer, game_server):
+        game = (await request(reader, writer, {'op': 'new', 'engine': 'w'}))['game']
+        reply = await request(reader, writer, {'op': 'move', 'game': game, 'move': 'e2e4'})
+        assert reply == {'ok': False, 'error': "it is the engine's move"}
+        reply = await request(reader, writer, {'op': 'go', 'game': game})
+        assert reply['ok'] and reply['fen'].split()[1] == 'b'
+    withServer(client)
+
+
+def test_bad_requests():
+    async def client(reader, writer, game_server):
+        game = (await request(reader, writer, {'op': 'new'}))['game']
+        for message in ({'op': 'move', 'game': game, 'move': 'e2e5'}, {'op': 'move', 'game': 99, 'move': 'e2e4'},
+                        {'op': 'dance'}, ['not', 'an', 'object'],
+                        {'op': 'new', 'fen': '4k3/8/8/8/8/8/8/P3K3 w - - 0 1'}):
+            reply = await request(reader, writer, message)
+            assert reply['ok'] is False and reply['error']
+        writer.write(b"not json\n")
+        await writer.drain()
+        assert json.loads(await reader.readline())['ok'] is False
+        assert (await request(reader, writer, {'op': 'state', 'game': game}))['ok']  # still connected
+    withServer(client)
+
+
+def test_failed_search_takes_the_move_back():
+    async def client(reader, writer, game_server):
+        reply = await request(reader, writer, {'op': 'new'})
+        game, fen = reply['game'], reply['fen']
+
+        async def broken(session):
+            raise RuntimeError("worker died")
+        search, game_server.scheduler.search = game_server.scheduler.search, broken
+        reply = await request(reader, writer, {'op': 'move', 'game': game, 'move': 'e2e4'})
+        assert reply == {'ok': False, 'error': "RuntimeError: worker died"}
+        assert (await request(reader, writer, {'op': 'state', 'game': game}))['fen'] == fen
+        game_server.scheduler.search = search
+        assert (await request(reader, writer, {'op': 'move', 'game': game, 'move': 'e2e4'}))['ok']
+    withServer(client)
+
+
+def test_session_limit():
+    async def client(reader, writer, game_server):
+        assert (await request(reader, writer, {'op': 'new'}))['ok']
+        reply = await request(reader, writer, {'op': 'new'})
+        assert reply['ok'] is False and reply['busy']
+    withServer(client, max_sessions=1)
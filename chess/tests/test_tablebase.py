@@ -0,0 +1,92 @@
+import random
+
+import pytest
+
+import ChessEngine
+from ChessAi import TB_WIN, getPVSMove
+from ChessParallel import getParallelAlphaBetaMove
+from ChessTablebase import Tablebases, generate
+
+
+@pytest.fixture(scope="module")
+def tables(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("tablebases"))
+    generate("KQvK", directory, progress=None)
+    tables = Tablebases(directory)
+    yield tables
+    tables.close()
+
+
+def load(fen):
+    return ChessEngine.GameState.fromFEN(fen)
+
+
+def test_known_values(tables):
+    assert tables.probeDTM(load("k7/1Q6/1K6/8/8/8/8/8 b - - 0 1")) == -1  # mated
+    assert tables.probeDTM(load("k7/8/1K6/8/8/8/8/6Q1 w - - 0 1")) == 1  # mates with Qg8
+    assert tables.probeDTM(load("kQ6/8/1K6/8/8/8/8/8 b - - 0 1")) == 0  # the queen hangs
+    assert tables.probeWDL(load("k7/8/1K6/8/8/8/8/6Q1 w - - 0 1")) == 1
+    assert tables.probeWDL(load("kQ6/8/1K6/8/8/8/8/8 b - - 0 1")) == 0
+
+
+def test_colours_mirrored(tables):
+    assert tables.probeDTM(load("K7/8/1k6/8/8/8/8/6q1 b - - 0 1")) == 1
+    assert tables.probeWDL(load("k7/8/1K6/8/8/8/8/6q1 w - - 0 1")) == -1
+    assert tables.probeDTM(load("4k3/4r3/8/8/8/8/8/4K3 w - - 0 1")) is None  # KRvK was not generated
+
+
+def test_values_agree_with_one_ply_search(tables):
+    # +d: the fastest mate leaves the opponent mated in d - 1 plies (-d); -(d + 1): the slowest defence
+    # leaves the opponent a mate in d - 1 plies; 0: some move keeps the draw and none loses
+    rng = random.Random(3)
+    checked = 0
+    while checked < 300:
+        squares = rng.sample(range(64), 3)
+        board = [["--"] * 8 for _ in range(8)]
+        for piece, sq in zip(("wK", "wQ", "bK"), squares):
+            board[sq // 8][sq % 8] = piece
+        placement = "/".join("".join(piece[1] if piece[0] == 'w' else piece[1].lower() if piece != "--" else "1"
+                                     for piece in row) for row in board)
+        side, other = ("w", "b") if rng.random() < 0.5 else ("b", "w")
+        kingsApart = max(abs(squares[0] // 8 - squares[2] // 8), abs(squares[0] % 8 - squares[2] % 8)) > 1
+        if not kingsApart or load(f"{placement} {other} - - 0 1").inCheck():
+            continue  # the side that has just moved would be in check
+        gs = load(f"{placement} {side} - - 0 1")
+        moves = gs.getValidMoves()
+        if not moves:
+            continue
+        value = tables.probeDTM(gs)
+        children = []
+        for move in moves:
+            gs.makeMove(move)
+            children.append(tables.probeDTM(gs) if len(gs.pieceSquares['w']) + len(gs.pieceSquares['b']) == 3
+                            else 0)  # the queen was taken
+            gs.undoMove()
+        if value > 0:
+            assert max(child for child in children if child < 0) == -value
+        elif value < 0:
+            assert min(children) > 0 and max(children) == -value - 2
+        else:
+            assert 0 in children and min(children) >= 0
+        checked += 1
+
+
+def test_best_move_mates_in_time(tables):
+    gs = load("8/8/3k4/8/8/8/8/Q3K3 w - - 0 1")
+    plies = tables.probeDTM(gs)
+    assert plies > 0
+    for _ in range(plies):
+        gs.makeMove(tables.bestMove(gs, gs.getValidMoves()))
+    gs.getValidMoves()
+    assert gs.checkmate
+
+
+def test_probed_in_the_search(tables):
+    # Qxd4 reaches KQvK, which only the tables score as a win
+    gs = load("8/8/3k4/8/3n4/8/8/Q3K3 w - - 0 1")
+    searcher = getPVSMove(depth=3, time_limit=30, tablebases=tables)
+    assert searcher(gs, gs.getValidMoves()).getchessnotion() == "a1d4"
+    assert searcher.best_score == TB_WIN
+    with getParallelAlphaBetaMove(depth=3, time_limit=30, workers=2, tablebases=tables) as searcher:
+        assert searcher(gs, gs.getValidMoves()).getchessnotion() == "a1d4"
+        assert searcher.best_score == TB_WIN
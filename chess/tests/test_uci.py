@@ -0,0 +1,98 @@
+import io
+import time
+
+from ChessPGN import parseMove
+from ChessUCI import UCIEngine
+
+MATE_IN_ONE = "rnbqkbnr/ppppp2p/5p2/6p1/3PP3/8/PPP2PPP/RNBQKBNR w - g6 0 3"
+
+
+def run(*lines):
+    out = io.StringIO()
+    engine = UCIEngine(out=out)
+    for line in lines:
+        assert engine.handle(line)
+    engine.finish()
+    return engine, out.getvalue().splitlines()
+
+
+def bestmove(lines):
+    assert lines[-1].startswith("bestmove ")
+    return lines[-1].split()[1]
+
+
+def test_handshake():
+    _, lines = run("uci", "isready")
+    assert lines[0].startswith("id name ")
+    assert "option name Hash type spin default 16 min 1 max 1024" in lines
+    assert lines[-2:] == ["uciok", "readyok"]
+    engine = UCIEngine(out=io.StringIO())
+    assert engine.handle("quit") is False
+
+
+def test_go_depth():
+    engine, lines = run("position startpos moves e2e4 e7e5", "go depth 3")
+    assert [line.split()[2] for line in lines if line.startswith("info depth")] == ["1", "2", "3"]
+    assert parseMove(engine.gs, bestmove(lines)) is not None
+    assert engine.gs.toFEN() == "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w - e6 0 2"
+
+
+def test_threads():
+    engine, lines = run("setoption name Threads value 2", f"position fen {MATE_IN_ONE}", "go depth 3")
+    try:
+        assert " score mate 1 " in lines[-2]
+        assert bestmove(lines) == "d1h5"
+    finally:
+        engine.dropSearcher()
+
+
+def test_mate_score():
+    _, lines = run(f"position fen {MATE_IN_ONE}", "go depth 4")
+    assert " score mate 1 " in lines[-2]
+    assert bestmove(lines) == "d1h5"
+
+
+def test_node_limit():
+    for threads in (1, 2):
+        start = time.time()
+        engine, lines = run(f"setoption name Threads value {threads}", "position startpos", "go nodes 2000")
+        try:
+            assert time.time() - start < 10
+            assert parseMove(engine.gs, bestmove(lines)) is not None
+            # the workers report their nodes every check_interval, the total can pass the limit by that much each
+            assert engine.searcher.nodes_evaluated < 2000 + threads * engine.searcher.check_interval
+        finally:
+            engine.dropSearcher()
+
+
+def test_infinite_waits_for_stop():
+    out = io.StringIO()
+    engine = UCIEngine(out=out)
+    engine.handle("position startpos")
+    engine.handle("go infinite depth 2")
+    time.sleep(0.3)
+    assert "bestmove" not in out.getvalue()  # the search is over but the answer waits
+    engine.handle("stop")
+    assert out.getvalue().splitlines()[-1].startswith("bestmove ")
+
+
+def test_ponderhit():
+    out = io.StringIO()
+    engine = UCIEngine(out=out)
+    engine.handle("position startpos moves e2e4")
+    engine.handle("go ponder movetime 200")
+    time.sleep(0.3)
+    assert "bestmove" not in out.getvalue()
+    start = time.time()
+    engine.handle("ponderhit")
+    engine.finish()
+    assert time.time() - start < 2
+    assert out.getvalue().splitlines()[-1].startswith("bestmove ")
+
+
+def test_bad_input():
+    engine, lines = run("position fen 4k3/8/8/8/8/8/8/P3K3 w - - 0 1", "position startpos moves e2e5", "frobnicate")
+    assert lines[0].startswith("info string bad fen")
+    assert lines[1] == "info string illegal move e2e5"
+    assert lines[2] == "info string unknown command frobnicate"
+    assert engine.positionMoves == []